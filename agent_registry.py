@@ -0,0 +1,96 @@
+# agent_registry.py
+"""
+Config-driven agent construction for the MultiAgentSystem classes.
+
+Each orchestrator module keeps an AgentRegistry that maps agent names (the keys of its
+agents config) to agent classes; names without an entry get the registry's default class.
+MultiAgentSystem.agents is a LazyAgents mapping over the config: membership and listing
+only read the config, and an agent is built the first time it is looked up and then reused
+by every later run of the same MultiAgentSystem.
+
+New agent types plug in without touching the orchestrators, either by registering a class
+    mlace_main.AGENT_CLASSES.register("PatentAgent", PatentAgent)
+or by naming it in the agents config, imported on first use:
+    "PatentAgent": {"role": "...", "prompt_template": "...", "class": "my_agents:PatentAgent"}
+"""
+import importlib
+import threading
+
+
+class AgentRegistry:
+    def __init__(self, default, classes=None):
+        self.default = default
+        self.classes = dict(classes or {})
+
+    def register(self, name, cls=None):
+        """register(name, cls), or @registry.register("Name") as a class decorator."""
+        if cls is None:
+            return lambda decorated: self.register(name, decorated)
+        self.classes[name] = cls
+        return cls
+
+    def resolve(self, name, details):
+        spec = details.get("class")
+        if spec is None:
+            return self.classes.get(name, self.default)
+        if spec in self.classes:
+            return self.classes[spec]
+        module_name, _, class_name = spec.replace(":", ".").rpartition(".")
+        if not module_name:
+            raise ValueError(f"Agent '{name}': unknown class '{spec}' (register it or use 'module:Class')")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def create(self, name, details):
+        return self.resolve(name, details)(name, details["role"], details.get("prompt_template"))
+
+
+class LazyAgents:
+    """name → agent, built from its config entry on first access."""
+    def __init__(self, registry, configs=None):
+        self.registry = registry
+        self.configs = dict(configs or {})
+        self.instances = {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, name):
+        agent = self.instances.get(name)
+        if agent is not None:
+            return agent
+        if name not in self.configs:
+            raise KeyError(name)
+        with self.lock:
+            if name not in self.instances:
+                self.instances[name] = self.registry.create(name, self.configs[name])
+            return self.instances[name]
+
+    def __setitem__(self, name, agent):
+        """Adds a ready-made agent (e.g. a test double or an agent built outside the config)."""
+        with self.lock:
+            self.configs.setdefault(name, {"role": getattr(agent, "role", name)})
+            self.instances[name] = agent
+
+    def __contains__(self, name):
+        return name in self.configs
+
+    def __iter__(self):
+        return iter(list(self.configs))
+
+    def __len__(self):
+        return len(self.configs)
+
+    def get(self, name, default=None):
+        return self[name] if name in self.configs else default
+
+    def keys(self):
+        return list(self.configs)
+
+    def items(self):
+        """Builds every configured agent; prefer lookups by name on hot paths."""
+        return [(name, self[name]) for name in list(self.configs)]
+
+    def values(self):
+        return [agent for _, agent in self.items()]
+
+    def built(self):
+        """Names of the agents constructed so far."""
+        return list(self.instances)
@@ -0,0 +1,86 @@
+# checkpoints.py
+import os
+import json
+import hashlib
+import datetime
+import threading
+from colorama import Fore, Style
+
+
+def hash_inputs(*inputs):
+    """Content hash of a stage's inputs; any JSON-serializable values (others via str())."""
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Stage outputs of one run, stored as <run_dir>/<session_id>/<stage>.json together with
+    the hash of the inputs they were computed from. A resumed run replays a stage from disk
+    when its inputs hash the same and executes it otherwise. stages.cached() drives it.
+    """
+    def __init__(self, session_id, run_dir="runs", enabled=True):
+        self.session_id = session_id
+        self.enabled = enabled and bool(run_dir)
+        self.directory = os.path.join(run_dir, session_id) if run_dir else None
+        self.lock = threading.Lock()
+        self.stats = {"replayed": 0, "executed": 0}
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, stage):
+        safe_stage = "".join(c if c.isalnum() or c in "._-" else "_" for c in stage)
+        if len(safe_stage) > 120:  # stage names built from LLM output (role names) can exceed file name limits
+            safe_stage = f"{safe_stage[:100]}_{hashlib.sha256(stage.encode('utf-8')).hexdigest()[:16]}"
+        return os.path.join(self.directory, f"{safe_stage}.json")
+
+    def load(self, stage, input_hash):
+        """The stored output of stage, or None when it is missing, unreadable or stale."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path(stage), "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if checkpoint.get("input_hash") != input_hash:
+            return None
+        return checkpoint
+
+    def save(self, stage, input_hash, output):
+        if not self.enabled:
+            return
+        checkpoint = {
+            "session_id": self.session_id,
+            "stage": stage,
+            "input_hash": input_hash,
+            "saved_at": datetime.datetime.now().isoformat(),
+            "output": output,
+        }
+        path = self.path(stage)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, path)  # atomic, so a crash never leaves half a checkpoint behind
+
+    def replay(self, stage, input_hash):
+        """The checkpoint of stage for input_hash, counted as replayed, or None."""
+        checkpoint = self.load(stage, input_hash)
+        if checkpoint is not None:
+            with self.lock:
+                self.stats["replayed"] += 1
+            print(f"{Fore.CYAN}[Checkpoint] Replaying '{stage}' from {checkpoint['saved_at']}{Style.RESET_ALL}")
+        return checkpoint
+
+    def record(self, stage, input_hash, output, save=True):
+        """Counts stage as executed and stores its output unless save is False."""
+        if save:
+            self.save(stage, input_hash, output)
+        with self.lock:
+            self.stats["executed"] += 1
+
+    def report(self):
+        if self.enabled:
+            print(f"{Fore.CYAN}[Checkpoint] {self.stats['replayed']} stages replayed, {self.stats['executed']} executed "
+                  f"→ {self.directory}{Style.RESET_ALL}")
+        return dict(self.stats, directory=self.directory if self.enabled else None)
@@ -0,0 +1,128 @@
+# deadline.py
+"""
+Time budgets for runs: run(problem, deadline=120) aims to finish within 120 seconds by
+skipping optional work (further refinement attempts, peer review rounds, critique
+iterations, pre-screen retries) once the remaining time can no longer cover it.
+
+A run opens its Deadline with `with deadline.activate(budget):`. The deadline lives in a
+contextvar, so work handed to a thread pool through llm_usage.propagate() sees it too.
+Loops ask before every optional step:
+
+    if not deadline.allows("refine.attempt", agent=self.name):
+        break
+
+allows() compares the time left with the step's estimated cost plus a reserve for the
+mandatory calls of the stages still ahead (reserve_calls, keyed by the checkpoint stage the
+caller runs in). Per-call costs come from the run's own LLM calls once there are some and
+from the calibration of earlier runs' traces (planner.py) before that. Every skipped step is
+recorded; report() returns them for the run metadata. Without an active deadline allows()
+is always True.
+"""
+import time
+import threading
+import contextlib
+import contextvars
+from colorama import Fore, Style
+
+import llm_usage
+import metrics
+import planner
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+DEGRADED_STEPS = metrics.Counter("mlace_degraded_steps_total", "Optional steps skipped to meet a run deadline", ["step"])
+
+
+class Deadline:
+    def __init__(self, seconds, reserve_calls=None, call_seconds=planner.DEFAULT_CALL["seconds"], usage=None):
+        self.budget_s = seconds
+        self.started = time.time()
+        self.at = self.started + seconds
+        self.reserve_calls = dict(reserve_calls or {})  # stage → mandatory LLM round trips after it
+        self.call_seconds = call_seconds  # per-call estimate until the run has made calls of its own
+        self.usage = usage
+        self.degraded = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_run(cls, seconds, reserve_calls, usage, trace_dir=None):
+        """seconds=None → no deadline (returns None)."""
+        if seconds is None:
+            return None
+        return cls(seconds, reserve_calls, planner.load_model(trace_dir).cost([])["seconds"], usage)
+
+    def remaining(self):
+        return self.at - time.time()
+
+    def seconds_per_call(self, agent=None):
+        events = []
+        if self.usage is not None:
+            with self.usage.lock:
+                events = [event for event in self.usage.events if not event["error"]]
+        own = [event["wall_s"] for event in events if event["agent"] == agent]
+        pool = own if len(own) >= 2 else [event["wall_s"] for event in events]
+        return sum(pool) / len(pool) if pool else self.call_seconds
+
+    def allows(self, step, calls=1, agent=None, detail=None):
+        """True when calls more LLM round trips still fit before the deadline; records the skip otherwise."""
+        _, stage = llm_usage.current()
+        reserve = self.reserve_calls.get((stage or "").split(".")[0], 0)
+        needed = (calls + reserve) * self.seconds_per_call(agent)
+        remaining = self.remaining()
+        if remaining >= needed:
+            return True
+        entry = {"step": step, "stage": stage, "remaining_s": round(remaining, 2), "needed_s": round(needed, 2)}
+        if detail is not None:
+            entry["detail"] = detail
+        with self.lock:
+            self.degraded.append(entry)
+        DEGRADED_STEPS.labels(step=step).inc()
+        print(f"{Fore.YELLOW}[Deadline] Skipping {step}{f' ({detail})' if detail else ''}: {max(remaining, 0):.1f}s left, "
+              f"~{needed:.1f}s needed with the remaining stages{Style.RESET_ALL}")
+        return False
+
+    def report(self):
+        elapsed = time.time() - self.started
+        with self.lock:
+            degraded = list(self.degraded)
+        summary = {"budget_s": self.budget_s, "elapsed_s": round(elapsed, 2), "met": elapsed <= self.budget_s,
+                   "degraded": degraded}
+        colour = Fore.CYAN if summary["met"] else Fore.RED
+        print(f"{colour}[Deadline] {elapsed:.1f}s of a {self.budget_s:g}s budget, "
+              f"{len(degraded)} optional steps skipped{Style.RESET_ALL}")
+        return summary
+
+
+@contextlib.contextmanager
+def activate(deadline):
+    """Makes deadline (or None: no deadline) the budget of LLM work started in this block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def allows(step, calls=1, agent=None, detail=None):
+    deadline = _current.get()
+    return True if deadline is None else deadline.allows(step, calls, agent, detail)
+
+
+def degraded_count(stage=None):
+    """
+    Steps the current deadline has skipped so far (0 without one). With stage, only the steps
+    skipped inside that stage or its sub-stages ("team" also counts "team.review"), so stages
+    running side by side in one deadline do not see each other's skips.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return 0
+    with deadline.lock:
+        if stage is None:
+            return len(deadline.degraded)
+        return sum(1 for entry in deadline.degraded
+                   if entry["stage"] == stage or (entry["stage"] or "").startswith(stage + "."))
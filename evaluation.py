@@ -0,0 +1,157 @@
+# evaluation.py
+"""
+Evaluation steps shared by the orchestrators (mlace_main, mlace_main_agile, mlace_dreamteam):
+the local pre-screen in front of the batched LLM grading, the critique loop for low scorers
+(sequential iterations or concurrent tournaments) and the end-of-run trace export.
+
+The orchestrators keep what differs between them: which outputs are graded, how a rejected
+output is re-executed (retry) and where evaluator feedback goes (on_feedback).
+"""
+import datetime
+import concurrent.futures
+from colorama import Fore, Style
+
+import deadline
+import llm_usage
+import metrics
+import settings
+import tracing
+from pre_evaluator import BORDERLINE, FAIL
+
+
+def prescreen(pre_evaluator, outputs, problem_statement):
+    """
+    Screens every output locally. Returns (scores, verdicts, borderline): scores of the outputs
+    the pre-screen decided, and the borderline outputs that still need the LLM evaluator.
+    """
+    scores, verdicts, borderline = {}, {}, {}
+    for name, output in outputs.items():
+        verdict, score, reasons = pre_evaluator.screen(output, problem_statement)
+        verdicts[name] = verdict
+        if verdict == BORDERLINE:
+            borderline[name] = output
+        else:
+            scores[name] = score
+            print(f"{Fore.CYAN}[PreEvaluator] {name}: {verdict} ({'; '.join(reasons)}) → LLM evaluation skipped{Style.RESET_ALL}")
+    return scores, verdicts, borderline
+
+
+def screen_and_evaluate(evaluator, pre_evaluator, outputs, problem_statement):
+    """
+    Pre-screens every output locally and sends only the borderline ones to the LLM
+    evaluator in one batched call. Returns (score_map, verdicts, evaluation_output).
+    """
+    scores, verdicts, borderline = prescreen(pre_evaluator, outputs, problem_statement)
+    evaluation_output = ""
+    if borderline:
+        llm_scores, evaluation_output = evaluator.evaluate_many(borderline, problem_statement)
+        scores.update(llm_scores)
+    return scores, verdicts, evaluation_output
+
+
+def run_critique_tournament(agents, agent_name, best_output, best_score, problem_statement, k=settings.CONFIG,
+                            on_feedback=None):
+    """
+    Launches k critiques of the current best output at once, grades them all in one
+    batched evaluator call and keeps the winner. Two round trips instead of up to
+    three sequential critique → evaluate iterations. on_feedback(agent_name, winner,
+    evaluation_output) is called when a candidate beats the current output.
+    """
+    k = settings.value("critique_candidates", k)
+    print(f"{Fore.YELLOW}[{datetime.datetime.now()}] 🏆 Critique tournament with {k} candidates (current confidence {best_score}%)...{Style.RESET_ALL}")
+    candidates = agents["ResponseCritiqueAgent"].critique_candidates(agent_name, best_output, k)
+    if not candidates:
+        return best_output, best_score
+
+    scores, evaluation_output = agents["EvaluatorAgent"].evaluate_candidates(agent_name, candidates, problem_statement)
+    winner = max(range(len(candidates)), key=lambda i: scores[i])
+    if scores[winner] > best_score:
+        print(f"{Fore.GREEN}✅ Candidate {winner+1} wins the tournament ({scores[winner]}%){Style.RESET_ALL}")
+        if on_feedback:
+            on_feedback(agent_name, candidates[winner], evaluation_output)
+        return candidates[winner], scores[winner]
+    print(f"{Fore.CYAN}ℹ️ No candidate beat the current output ({best_score}%).{Style.RESET_ALL}")
+    return best_output, best_score
+
+
+def evaluate_and_refine_outputs(agents, pre_evaluator, outputs, problem_statement, threshold, critique_mode, system,
+                                retry=None, on_feedback=None):
+    """
+    Grades all outputs in one batched evaluator call and sends only those below the
+    threshold into critique. Each critique iteration re-grades the remaining low scorers
+    together, so there is one evaluation call per iteration instead of one per agent per
+    iteration. Outputs the pre-screen rejects outright (e.g. "ERROR") are re-executed once
+    through retry(name) instead of being critiqued. outputs is updated in place with the
+    refined responses; returns the final score map.
+    """
+    evaluator = agents["EvaluatorAgent"]
+    scores, verdicts, evaluation_output = screen_and_evaluate(evaluator, pre_evaluator, outputs, problem_statement)
+
+    retried = [name for name, verdict in verdicts.items() if verdict == FAIL and name in agents]
+    if retry and retried and deadline.allows("evaluate.retry", calls=2, detail=", ".join(retried)):
+        print(f"{Fore.YELLOW}[{datetime.datetime.now()}] 🔁 Retrying {retried} rejected by the pre-screen...{Style.RESET_ALL}")
+        for name in retried:
+            outputs[name] = retry(name)
+        retry_scores, _, retry_evaluation = screen_and_evaluate(
+            evaluator, pre_evaluator, {name: outputs[name] for name in retried}, problem_statement
+        )
+        scores.update(retry_scores)
+        evaluation_output = "\n".join(filter(None, [evaluation_output, retry_evaluation]))
+
+    low_scores = {name: score for name, score in scores.items() if score < threshold}
+    print(f"{Fore.CYAN}[EvaluatorAgent] Scores: {scores} → {len(low_scores)} below {threshold}%{Style.RESET_ALL}")
+
+    if low_scores and "ResponseCritiqueAgent" in agents:
+        if critique_mode == "tournament":
+            # Independent tournaments per low-scoring agent run side by side
+            tournaments = low_scores if deadline.allows("evaluate.tournament", calls=2) else {}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(tournaments))) as executor:
+                futures = {
+                    name: executor.submit(llm_usage.propagate(run_critique_tournament), agents, name, outputs[name], score,
+                                          problem_statement, settings.CONFIG, on_feedback)
+                    for name, score in tournaments.items()
+                }
+                for name, future in futures.items():
+                    outputs[name], scores[name] = future.result()
+        else:
+            iteration = 0
+            while low_scores and iteration < 3:
+                if not deadline.allows("evaluate.critique", calls=len(low_scores) + 1, detail=f"iteration {iteration + 1}"):
+                    break
+                print(f"{Fore.YELLOW}[{datetime.datetime.now()}] 🔄 Refining {list(low_scores)} due to low confidence...{Style.RESET_ALL}")
+                for name in low_scores:
+                    refined_response = agents["ResponseCritiqueAgent"].execute(name, outputs[name])
+                    # Hand the evaluator's feedback to the originating agent
+                    if on_feedback and evaluation_output:
+                        on_feedback(name, refined_response, evaluation_output)
+                    outputs[name] = refined_response
+                # Re-grade only the refined outputs, still in a single call
+                new_scores, _, evaluation_output = screen_and_evaluate(
+                    evaluator, pre_evaluator, {name: outputs[name] for name in low_scores}, problem_statement
+                )
+                scores.update(new_scores)
+                low_scores = {name: score for name, score in new_scores.items() if score < threshold}
+                iteration += 1
+
+    for score in scores.values():
+        metrics.CONFIDENCE_SCORES.labels(system=system, source="evaluation").observe(score)
+    print(f"{Fore.GREEN}[{datetime.datetime.now()}] ✅ Final Confidence Scores: {scores}{Style.RESET_ALL}")
+    return scores
+
+
+def score_summary(scores):
+    """The evaluator's response as stored in the run outputs: one confidence line per agent."""
+    return "\n".join(f"**{name} Confidence Score:** {score / 10:g}/10" for name, score in scores.items())
+
+
+def finish_trace(tracer, trace_dir, quiet=False):
+    """
+    Closes the run's spans, prints the critical path (unless quiet, as in pipeline mode
+    where many runs interleave) and exports the trace when trace_dir is set.
+    """
+    tracer.finish()
+    analysis = {} if quiet else tracing.analyze(tracer)
+    if trace_dir:
+        analysis["file"] = tracer.export(trace_dir)
+        print(f"{Fore.CYAN}[Trace] Written to {analysis['file']} (open in chrome://tracing or ui.perfetto.dev){Style.RESET_ALL}")
+    return analysis
@@ -0,0 +1,236 @@
+# event_log.py
+"""
+Structured event log for the hot paths (LLM calls, evaluations, confidence parsing).
+
+Callers only build a small dict and put it on a bounded queue; a listener thread writes
+one JSON object per line to a size-rotated file and, optionally, renders a short coloured
+line on the console (the old "[LLM Query] ..." output). A full queue drops the event and
+counts it instead of blocking the agent that logged it. Console lines are rendered by the
+listener too, so they can trail the orchestrators' own prints by a few milliseconds. A
+stdout that sets render_events_inline (mlace_service's JobProgressStdout, which attributes
+lines to the job of the printing thread) gets its console lines rendered synchronously by
+the caller instead.
+
+Prompt and response bodies are large, so events carry 200-character previews and only a
+sampled fraction of LLM calls keep the full texts.
+
+Configure in code with configure(...) or through the environment (read on first use):
+    MLACE_LOG_FILE=logs/mlace.jsonl   ("" → no file)
+    MLACE_LOG_LEVEL=INFO              (file level: DEBUG adds raw evaluator output)
+    MLACE_LOG_CONSOLE=INFO            ("off" → no console lines)
+    MLACE_LOG_SAMPLE=0.1              (fraction of LLM calls logged with full prompt and response)
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import datetime
+import threading
+import logging.handlers
+from colorama import Fore, Style
+
+import llm_usage
+
+LOGGER = logging.getLogger("mlace")
+LOGGER.propagate = False
+LOGGER.setLevel(logging.CRITICAL + 1)  # nothing is built until configure() runs
+
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+PREVIEW_CHARS = 200
+
+# Console templates per event; fields missing from an event render as "".
+CONSOLE_FORMATS = {
+    "llm.call": (Fore.MAGENTA, "[LLM Query] {prompt_preview}...\n[LLM Response] {response_preview}..."),
+    "llm.error": (Fore.RED, "[ERROR in OllamaInterface] {error}"),
+    "evaluation": (Fore.YELLOW, "[{agent}] Evaluation for {subject}:\n{text_preview}..."),
+    "evaluation.raw": ("", "[{agent}] Raw evaluation for {subject}:\n{text}"),
+    "confidence.raw": ("", "Raw evaluation output:\n{text}"),
+    "confidence.parsed": ("", "✅ Extracted confidence score: {score}"),
+    "confidence.missing": (Fore.YELLOW, "⚠️ Failed to extract confidence score. Defaulting to {score}%."),
+    "confidence.error": (Fore.RED, "❌ Error extracting confidence score: {error}"),
+}
+
+_listener = None
+_queue = None
+_console_level = None  # level of the console renderer; None when it is off
+_sample_rate = 0.1
+_configured = False
+_config_lock = threading.RLock()
+_lock = threading.Lock()
+dropped = 0
+
+
+class Fields(dict):
+    def __missing__(self, key):
+        return ""
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: a full queue drops the record and counts it."""
+    def enqueue(self, record):
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock:
+                dropped += 1
+
+    def prepare(self, record):
+        return record  # fields are already plain data; formatting happens on the listener thread
+
+
+class Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # may wait for room; the listener is draining the queue
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "event": record.msg,
+            "thread": record.threadName,
+        }
+        event.update(record.fields)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+def render(record):
+    colour, template = CONSOLE_FORMATS.get(record.msg, ("", "[{event}] {fields}"))
+    fields = Fields(record.fields, event=record.msg, fields=record.fields)
+    return f"{colour}{template.format_map(fields)}{Style.RESET_ALL if colour else ''}\n"
+
+
+class ConsoleHandler(logging.Handler):
+    """Human renderer; writes to the stdout that was current when the event was logged."""
+    def emit(self, record):
+        if getattr(record, "rendered", False):
+            return  # already written by the caller (render_events_inline)
+        try:
+            stream = getattr(record, "stream", None) or sys.stdout
+            stream.write(render(record))
+        except Exception:
+            self.handleError(record)
+
+
+def level_number(level):
+    return level if isinstance(level, int) else logging.getLevelName(str(level).upper())
+
+
+def configure(path="logs/mlace.jsonl", level="INFO", console="INFO", sample_rate=0.1,
+              max_bytes=10 * 1024 * 1024, backups=5, queue_size=10000):
+    """(Re)starts the listener. path=None disables the file, console=None the console renderer."""
+    global _listener, _queue, _sample_rate, _configured, _console_level
+    with _config_lock:
+        shutdown()
+        _configured = True
+        _listener, _queue, _sample_rate = start(path, level, console, sample_rate, max_bytes, backups, queue_size)
+        _console_level = level_number(console) if console else None
+
+
+def start(path, level, console, sample_rate, max_bytes, backups, queue_size):
+    handlers = []
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+        file_handler.setLevel(level_number(level))
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = ConsoleHandler()
+        console_handler.setLevel(level_number(console))
+        handlers.append(console_handler)
+
+    events = queue.Queue(maxsize=queue_size)
+    listener = None
+    if handlers:
+        listener = Listener(events, *handlers, respect_handler_level=True)
+        listener.start()
+    LOGGER.handlers = [DroppingQueueHandler(events)] if handlers else []
+    LOGGER.setLevel(min((h.level for h in handlers), default=logging.CRITICAL + 1))
+    return listener, events, sample_rate
+
+
+def configure_from_env():
+    console = os.environ.get("MLACE_LOG_CONSOLE", "INFO")
+    configure(
+        path=os.environ.get("MLACE_LOG_FILE", "logs/mlace.jsonl") or None,
+        level=os.environ.get("MLACE_LOG_LEVEL", "INFO"),
+        console=None if console.lower() in ("off", "0", "") else console,
+        sample_rate=float(os.environ.get("MLACE_LOG_SAMPLE", "0.1")),
+    )
+
+
+def shutdown():
+    """Writes out every queued event and stops the listener thread."""
+    global _listener, _console_level, dropped
+    with _config_lock:
+        listener, _listener = _listener, None
+        _console_level = None
+        LOGGER.handlers = []
+        LOGGER.setLevel(logging.CRITICAL + 1)
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+    if dropped:
+        print(f"{Fore.YELLOW}[EventLog] {dropped} events dropped because the log queue was full{Style.RESET_ALL}")
+        dropped = 0
+
+
+def flush():
+    """Blocks until the listener has handled every event logged so far."""
+    if _queue is not None and _listener is not None:
+        _queue.join()
+
+
+def ensure_configured():
+    with _config_lock:
+        if not _configured:
+            configure_from_env()
+
+
+atexit.register(shutdown)
+
+
+def event(name, level=INFO, **fields):
+    """Logs one event; returns at once (the cost of a disabled level is a single comparison)."""
+    if not _configured:
+        ensure_configured()
+    level = level_number(level)
+    if not LOGGER.isEnabledFor(level):
+        return
+    run_id, stage = llm_usage.current()
+    if run_id is not None:
+        fields.setdefault("run_id", run_id)
+        fields.setdefault("stage", stage)
+    record = LOGGER.makeRecord(LOGGER.name, level, "", 0, name, None, None, extra={"fields": fields})
+    record.stream = sys.stdout  # honours contextlib.redirect_stdout around the caller
+    if getattr(record.stream, "render_events_inline", False) and _console_level is not None and level >= _console_level:
+        record.stream.write(render(record))
+        record.rendered = True
+    LOGGER.handle(record)
+
+
+def preview(text):
+    text = "" if text is None else str(text)
+    return text[:PREVIEW_CHARS]
+
+
+def llm_call(agent, model, prompt, response, seconds, error=None):
+    """One OllamaInterface.query; full prompt and response only for a sampled fraction of calls."""
+    if error is not None:
+        event("llm.error", ERROR, agent=agent, model=model, seconds=round(seconds, 4),
+              error=f"{type(error).__name__}: {error}", prompt_preview=preview(prompt))
+        return
+    fields = {"agent": agent, "model": model, "seconds": round(seconds, 4),
+              "prompt_chars": len(prompt), "response_chars": len(response),
+              "prompt_preview": preview(prompt), "response_preview": preview(response)}
+    if _sample_rate >= 1 or (_sample_rate > 0 and random.random() < _sample_rate):
+        fields.update(sampled=True, prompt=prompt, response=response)
+    event("llm.call", **fields)
@@ -0,0 +1,264 @@
+# llm_backend.py
+"""
+Pluggable chat backends behind OllamaInterface.
+
+    live    → ollama.chat (default)
+    record  → ollama.chat, and every prompt → response pair is appended with its latency to a trace file
+    replay  → answers from a recorded trace; no model (or ollama package) needed
+
+Select the backend in code with set_backend(...) or through the environment:
+    MLACE_LLM_BACKEND=record MLACE_LLM_TRACE=traces/dreamteam.jsonl python mlace_dreamteam.py
+    MLACE_LLM_BACKEND=replay MLACE_LLM_TRACE=traces/dreamteam.jsonl MLACE_REPLAY_LATENCY=original python mlace_dreamteam.py
+MLACE_REPLAY_LATENCY is "original", "none", "fixed:<seconds>" or "lognormal:<median seconds>:<sigma>";
+MLACE_REPLAY_SPEED divides every replayed latency (e.g. 10 replays ten times faster).
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import datetime
+import threading
+from colorama import Fore, Style
+
+
+def prompt_key(model, messages):
+    payload = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def response_to_dict(response):
+    """ollama returns a pydantic ChatResponse in recent versions and a plain dict in older ones."""
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json", exclude_none=True)
+    return json.loads(json.dumps(dict(response), default=str))
+
+
+class OllamaBackend:
+    """Live backend: a real ollama.chat call, against host when given (else OLLAMA_HOST / localhost)."""
+    name = "live"
+
+    def __init__(self, host=None):
+        self.host = host
+        self.client = None
+
+    def chat(self, model, messages):
+        import ollama  # imported lazily so replay runs need no ollama package
+        if self.host is None:
+            return ollama.chat(model=model, messages=messages)
+        if self.client is None:
+            self.client = ollama.Client(host=self.host)
+        return self.client.chat(model=model, messages=messages)
+
+
+class RecordingBackend:
+    """Passes every call to inner and appends the prompt, response and latency to trace_path (JSONL)."""
+    name = "record"
+
+    def __init__(self, trace_path, inner=None):
+        self.trace_path = trace_path
+        self.inner = inner or OllamaBackend()
+        self.lock = threading.Lock()
+        directory = os.path.dirname(trace_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def chat(self, model, messages):
+        started = time.time()
+        response = self.inner.chat(model=model, messages=messages)
+        latency = time.time() - started
+        entry = {
+            "key": prompt_key(model, messages),
+            "model": model,
+            "messages": messages,
+            "response": response_to_dict(response),
+            "latency_s": round(latency, 4),
+            "recorded_at": datetime.datetime.now().isoformat(),
+        }
+        with self.lock, open(self.trace_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return response
+
+
+class ReplayBackend:
+    """
+    Serves responses from a trace written by RecordingBackend.
+
+    Calls are matched on model + messages. Prompts recorded more than once are replayed in
+    recording order. A prompt that isn't in the trace (e.g. because an orchestration change
+    altered it) falls back to a recording that starts with the same text, then to the
+    recordings in order; strict=True raises KeyError instead.
+
+    latency: "original" sleeps for the recorded latency, "none" answers immediately,
+    ("fixed", seconds) or ("lognormal", median_seconds, sigma) sleep for a synthetic latency.
+    speed divides every latency.
+    """
+    name = "replay"
+
+    def __init__(self, trace_path, latency="original", speed=1.0, strict=False, seed=0, prefix_chars=120):
+        self.trace_path = trace_path
+        self.latency = latency
+        self.speed = speed
+        self.strict = strict
+        self.prefix_chars = prefix_chars
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.by_key, self.by_prefix, self.entries = {}, {}, []
+        with open(trace_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.add(json.loads(line))
+        self.cursors = {}
+        self.stats = {"exact": 0, "prefix": 0, "fallback": 0}
+        print(f"{Fore.CYAN}[ReplayBackend] Loaded {len(self.entries)} recorded calls from {trace_path}{Style.RESET_ALL}")
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.by_key.setdefault(entry["key"], []).append(entry)
+        self.by_prefix.setdefault(self.prefix(entry["model"], entry["messages"]), []).append(entry)
+
+    def prefix(self, model, messages):
+        text = " ".join(str(messages[-1].get("content", "")).split()) if messages else ""
+        return (model, text[:self.prefix_chars])
+
+    def next_entry(self, bucket, candidates):
+        cursor = self.cursors.get(bucket, 0)
+        self.cursors[bucket] = cursor + 1
+        return candidates[cursor % len(candidates)]
+
+    def lookup(self, model, messages):
+        with self.lock:
+            key = prompt_key(model, messages)
+            if key in self.by_key:
+                self.stats["exact"] += 1
+                return self.next_entry(("key", key), self.by_key[key])
+            if self.strict:
+                raise KeyError(f"Prompt not in trace {self.trace_path}: {str(messages[-1].get('content', ''))[:120]!r}")
+            prefix = self.prefix(model, messages)
+            if prefix in self.by_prefix:
+                self.stats["prefix"] += 1
+                return self.next_entry(("prefix", prefix), self.by_prefix[prefix])
+            if not self.entries:
+                raise KeyError(f"Trace {self.trace_path} is empty")
+            self.stats["fallback"] += 1
+            return self.next_entry("any", self.entries)
+
+    def replay_latency(self, entry):
+        if self.latency == "original":
+            latency = entry.get("latency_s", 0.0)
+        elif self.latency in ("none", None):
+            latency = 0.0
+        elif self.latency[0] == "fixed":
+            latency = float(self.latency[1])
+        elif self.latency[0] == "lognormal":
+            median, sigma = float(self.latency[1]), float(self.latency[2])
+            with self.lock:
+                latency = median * self.random.lognormvariate(0.0, sigma)
+        else:
+            raise ValueError(f"Unknown replay latency {self.latency!r}")
+        return latency / self.speed if self.speed else 0.0
+
+    def chat(self, model, messages):
+        entry = self.lookup(model, messages)
+        latency = self.replay_latency(entry)
+        if latency > 0:
+            time.sleep(latency)
+        return entry["response"]
+
+    def report(self):
+        print(f"{Fore.CYAN}[ReplayBackend] {self.stats['exact']} exact, {self.stats['prefix']} prefix, "
+              f"{self.stats['fallback']} fallback matches{Style.RESET_ALL}")
+        return dict(self.stats)
+
+
+class MeteringBackend:
+    """
+    Wraps another backend and records every call: start/end time, thread, model and the
+    token counts Ollama reports (prompt_eval_count / eval_count). When a response carries
+    no counts (older ollama versions, synthetic traces) tokens are estimated at 4 chars each.
+    """
+    name = "metering"
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def chat(self, model, messages):
+        started = time.time()
+        response = self.inner.chat(model=model, messages=messages)
+        finished = time.time()
+        data = response if isinstance(response, dict) else response_to_dict(response)
+        prompt_text = "".join(str(message.get("content", "")) for message in messages)
+        completion_text = str(data.get("message", {}).get("content", ""))
+        estimated = data.get("prompt_eval_count") is None or data.get("eval_count") is None
+        call = {
+            "model": model,
+            "started": started,
+            "finished": finished,
+            "thread": threading.get_ident(),
+            "prompt_tokens": data.get("prompt_eval_count") or len(prompt_text) // 4,
+            "completion_tokens": data.get("eval_count") or len(completion_text) // 4,
+            "tokens_estimated": estimated,
+        }
+        with self.lock:
+            self.calls.append(call)
+        return response
+
+    def reset(self):
+        with self.lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+
+def parse_latency(spec):
+    """"original", "none", "fixed:0.5" or "lognormal:2.0:0.4" → ReplayBackend latency argument."""
+    if spec in ("original", "none"):
+        return spec
+    kind, *params = spec.split(":")
+    if kind == "fixed" and len(params) == 1:
+        return ("fixed", float(params[0]))
+    if kind == "lognormal" and len(params) == 2:
+        return ("lognormal", float(params[0]), float(params[1]))
+    raise ValueError(f"Invalid replay latency '{spec}'")
+
+
+def backend_from_env():
+    mode = os.environ.get("MLACE_LLM_BACKEND", "live")
+    trace_path = os.environ.get("MLACE_LLM_TRACE", "traces/llm_trace.jsonl")
+    if mode == "live":
+        return OllamaBackend()
+    if mode == "record":
+        return RecordingBackend(trace_path)
+    if mode == "replay":
+        return ReplayBackend(
+            trace_path,
+            latency=parse_latency(os.environ.get("MLACE_REPLAY_LATENCY", "original")),
+            speed=float(os.environ.get("MLACE_REPLAY_SPEED", "1")),
+            strict=os.environ.get("MLACE_REPLAY_STRICT", "0") == "1",
+        )
+    raise ValueError(f"Unknown MLACE_LLM_BACKEND '{mode}'; expected live, record or replay")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backend_from_env()
+        return _backend
+
+
+def set_backend(backend):
+    """Swaps the backend used by every OllamaInterface; returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+def chat(model, messages):
+    return get_backend().chat(model=model, messages=messages)
@@ -0,0 +1,144 @@
+# llm_usage.py
+"""
+Per-call token and timing accounting for LLM queries.
+
+OllamaInterface.query records every call (agent, stage, model, token counts and the
+durations Ollama reports) into the UsageLog of the run it belongs to. A run opens its log
+with `with llm_usage.track(log):`; stages.cached names the stage. Both live in a
+contextvar, so work handed to a thread pool has to be wrapped with propagate(fn) to stay
+attributed to the run.
+"""
+import time
+import datetime
+import threading
+import contextlib
+import contextvars
+from colorama import Fore, Style
+
+_current = contextvars.ContextVar("llm_usage", default=(None, None))  # (UsageLog, stage)
+
+NANOSECONDS = 1e9
+
+
+class UsageLog:
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+        self.events = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def breakdown(self, key="agent"):
+        """Totals per agent (or per stage / model): calls, tokens and seconds."""
+        rows = {}
+        with self.lock:
+            events = list(self.events)
+        for event in events:
+            row = rows.setdefault(event[key] or "-", {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                      "wall_s": 0.0, "prompt_eval_s": 0.0, "eval_s": 0.0, "load_s": 0.0})
+            row["calls"] += 1
+            row["errors"] += 1 if event["error"] else 0
+            row["prompt_tokens"] += event["prompt_tokens"] or 0
+            row["completion_tokens"] += event["completion_tokens"] or 0
+            for field in ("wall_s", "prompt_eval_s", "eval_s", "load_s"):
+                row[field] = round(row[field] + (event[field] or 0.0), 4)
+        return rows
+
+    def summary(self):
+        by_agent = self.breakdown("agent")
+        return {
+            "run_id": self.run_id,
+            "calls": sum(row["calls"] for row in by_agent.values()),
+            "prompt_tokens": sum(row["prompt_tokens"] for row in by_agent.values()),
+            "completion_tokens": sum(row["completion_tokens"] for row in by_agent.values()),
+            "llm_wall_s": round(sum(row["wall_s"] for row in by_agent.values()), 4),
+            "run_wall_s": round(time.time() - self.started, 4),
+            "by_agent": by_agent,
+            "by_stage": self.breakdown("stage"),
+        }
+
+    def report(self):
+        """Prints where the run's tokens and seconds went, per agent; returns summary()."""
+        summary = self.summary()
+        print(f"{Fore.CYAN}[LLM Usage] {summary['calls']} calls, {summary['prompt_tokens']} prompt + "
+              f"{summary['completion_tokens']} completion tokens, {summary['llm_wall_s']:.1f}s in LLM calls "
+              f"over a {summary['run_wall_s']:.1f}s run{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}{'agent':<28} {'calls':>5} {'prompt':>8} {'compl.':>8} {'wall s':>8} {'eval s':>8} {'tok/s':>6}{Style.RESET_ALL}")
+        ranked = sorted(summary["by_agent"].items(), key=lambda item: item[1]["wall_s"], reverse=True)
+        for agent, row in ranked:
+            rate = row["completion_tokens"] / row["eval_s"] if row["eval_s"] else 0.0
+            colour = Fore.RED if row["errors"] else ""
+            print(f"{colour}{agent[:28]:<28} {row['calls']:>5} {row['prompt_tokens']:>8} {row['completion_tokens']:>8} "
+                  f"{row['wall_s']:>8.1f} {row['eval_s']:>8.1f} {rate:>6.1f}{Style.RESET_ALL if colour else ''}")
+        return summary
+
+
+@contextlib.contextmanager
+def track(log):
+    """Attributes every LLM call made in this block (and in propagate()d work) to log."""
+    token = _current.set((log, None))
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name):
+    log, _ = _current.get()
+    token = _current.set((log, name))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def current():
+    """(run_id, stage) of the calling context; (None, None) outside track()."""
+    log, stage_name = _current.get()
+    return (log.run_id if log is not None else None), stage_name
+
+
+def propagate(fn):
+    """Wraps fn so it runs with the caller's log and stage when executed in another thread."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def field(response, name):
+    if response is None:
+        return None
+    if isinstance(response, dict):
+        return response.get(name)
+    return getattr(response, name, None)
+
+
+def seconds(nanoseconds):
+    return round(nanoseconds / NANOSECONDS, 4) if nanoseconds is not None else None
+
+
+def record(agent, model, response, wall_s, error=None):
+    """Records one call into the current run's log; a no-op outside track()."""
+    log, stage_name = _current.get()
+    if log is None:
+        return None
+    event = {
+        "time": datetime.datetime.now().isoformat(),
+        "run_id": log.run_id,
+        "agent": agent,
+        "stage": stage_name,
+        "model": model,
+        "prompt_tokens": field(response, "prompt_eval_count"),
+        "completion_tokens": field(response, "eval_count"),
+        "prompt_eval_s": seconds(field(response, "prompt_eval_duration")),
+        "eval_s": seconds(field(response, "eval_duration")),
+        "load_s": seconds(field(response, "load_duration")),
+        "total_s": seconds(field(response, "total_duration")),
+        "wall_s": round(wall_s, 4),
+        "error": error,
+    }
+    log.add(event)
+    return event
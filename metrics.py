@@ -0,0 +1,236 @@
+# metrics.py
+"""
+Process-wide metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are defined once below and updated from the LLM client,
+the agents and the orchestrators; a label set's child is created on first use and then
+only costs a dict lookup and a locked add. Expose them with start_http_server(port) (or
+GET /metrics on mlace_service) and scrape with Prometheus:
+
+    scrape_configs:
+      - job_name: mlace
+        static_configs: [{targets: ["127.0.0.1:9464"]}]
+"""
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from colorama import Fore, Style
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+RUN_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+SCORE_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 80, 85, 90, 95, 100)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if any(m.name == metric.name for m in self.metrics):
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self.metrics.append(metric)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.new_child())
+        return child
+
+    def label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {escape(self.help_text)}\n", f"# TYPE {self.name} {self.kind}\n"]
+        for key, child in sorted(self.children.items()):
+            lines.extend(self.render_child(key, child))
+        return "".join(lines)
+
+
+class CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render_child(self, key, child):
+        return [f"{self.name}{self.label_text(key)} {format_value(child.value)}\n"]
+
+
+class GaugeChild(CounterChild):
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def new_child(self):
+        return GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames, registry)
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render_child(self, key, child):
+        with child.lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self.label_text(key, [('le', format_value(bound))])} {cumulative}\n")
+        lines.append(f"{self.name}_bucket{self.label_text(key, [('le', '+Inf')])} {count}\n")
+        lines.append(f"{self.name}_sum{self.label_text(key)} {format_value(total)}\n")
+        lines.append(f"{self.name}_count{self.label_text(key)} {count}\n")
+        return lines
+
+
+# --- MLACE metrics ---
+
+LLM_CALLS = Counter("mlace_llm_calls_total", "LLM calls by agent, model and outcome", ["agent", "model", "status"])
+LLM_TOKENS = Counter("mlace_llm_tokens_total", "Tokens reported by Ollama", ["agent", "model", "kind"])
+LLM_LATENCY = Histogram("mlace_llm_call_seconds", "Client-side latency of LLM calls", ["model"], LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter("mlace_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+REFINEMENT_ITERATIONS = Histogram("mlace_refinement_iterations", "Refinement rounds per refined problem",
+                                  ["agent"], ITERATION_BUCKETS)
+CONFIDENCE_SCORES = Histogram("mlace_confidence_score", "Confidence scores (0-100) by system and source",
+                              ["system", "source"], SCORE_BUCKETS)
+JSON_PARSE_FAILURES = Counter("mlace_json_parse_failures_total",
+                              "LLM responses without parseable delimited JSON", ["reason"])
+MARKET_DATA_FAILURES = Counter("mlace_market_data_failures_total", "Failed market/macro data fetches", ["source"])
+RUNS = Counter("mlace_runs_total", "Completed MultiAgentSystem runs", ["system", "status"])
+RUN_DURATION = Histogram("mlace_run_seconds", "Wall time of MultiAgentSystem runs", ["system"], RUN_BUCKETS)
+
+
+def record_llm_call(agent, model, response, seconds, error=None):
+    """Hot path: one call per LLM query."""
+    agent = agent or "-"
+    LLM_CALLS.labels(agent=agent, model=model, status="error" if error else "ok").inc()
+    LLM_LATENCY.labels(model=model).observe(seconds)
+    if response is not None:
+        LLM_TOKENS.labels(agent=agent, model=model, kind="prompt").inc(response.get("prompt_eval_count") or 0)
+        LLM_TOKENS.labels(agent=agent, model=model, kind="completion").inc(response.get("eval_count") or 0)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_run(system, started, status="ok"):
+    RUNS.labels(system=system, status=status).inc()
+    RUN_DURATION.labels(system=system).observe(time.time() - started)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would drown the agents' output
+
+
+def start_http_server(port=9464, host="127.0.0.1"):
+    """Serves /metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"{Fore.CYAN}[Metrics] Serving http://{host}:{server.server_address[1]}/metrics{Style.RESET_ALL}")
+    return server
+
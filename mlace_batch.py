@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Batch runner: solves many problems from a JSONL file with a worker pool.
+
+Each input line is a JSON object such as
+    {"id": "p1", "problem": "Develop a ...", "domain": "Wealth Management", "system": "dreamteam"}
+"id" defaults to a hash of problem + domain, "domain" to "General" and "system" to --system.
+An optional "deadline_s" bounds the run's time; the result then lists the skipped steps.
+Results are appended to the output JSONL as soon as each problem completes, so an interrupted
+batch can be resumed by re-running the same command: problems already recorded with
+status "ok" are skipped. Batch runs write no per-run traces or checkpoints unless --trace-dir
+or --checkpoint-dir asks for them.
+
+Usage:
+    python mlace_batch.py problems.jsonl results.jsonl --system dreamteam --workers 4 --executor process
+    python mlace_batch.py problems.jsonl results.jsonl --system dreamteam --executor pipeline --stage-workers team=3,evaluate=2
+"""
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+import datetime
+import threading
+import importlib
+import traceback
+import concurrent.futures
+from colorama import Fore, Style
+
+import metrics
+
+# system name → (module, agent config file)
+SYSTEMS = {
+    "main": ("mlace_main", "agents_config.json"),
+    "dreamteam": ("mlace_dreamteam", "agents_config.json"),
+    "agile": ("mlace_main_agile", "agents_config_agile.json"),
+}
+
+# One MultiAgentSystem per worker (process or thread), reused across the problems it handles
+_worker_state = threading.local()
+
+# Where the systems built by get_system() write traces and checkpoints; None writes nothing, since
+# a batch or a long-running service would otherwise leave files behind for every problem
+OUTPUT_DIRS = {"trace_dir": None, "checkpoint_dir": None}
+
+
+def configure_outputs(trace_dir=None, checkpoint_dir=None):
+    """Sets OUTPUT_DIRS for the systems built from now on (also the initializer of process workers)."""
+    OUTPUT_DIRS.update(trace_dir=trace_dir, checkpoint_dir=checkpoint_dir)
+
+
+def record_id(record):
+    if record.get("id") is not None:
+        return str(record["id"])
+    key = f"{record.get('problem', '')}\n{record.get('domain', 'General')}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def load_records(input_path, default_system):
+    records = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"{Fore.RED}[Batch] Skipping malformed line {line_no}: {e}{Style.RESET_ALL}")
+                continue
+            if not record.get("problem"):
+                print(f"{Fore.RED}[Batch] Skipping line {line_no}: no 'problem' field{Style.RESET_ALL}")
+                continue
+            record.setdefault("domain", "General")
+            record.setdefault("system", default_system)
+            record["id"] = record_id(record)
+            records.append(record)
+    return records
+
+
+def load_completed_ids(output_path):
+    """IDs already recorded with status "ok" in a previous (partial) run of the batch."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if result.get("status") == "ok":
+                completed.add(str(result.get("id")))
+    return completed
+
+
+def get_system(system_name):
+    systems = getattr(_worker_state, "systems", None)
+    if systems is None:
+        systems = _worker_state.systems = {}
+    if system_name not in systems:
+        module_name, config_file = SYSTEMS[system_name]
+        module = importlib.import_module(module_name)
+        options = {"trace_dir": OUTPUT_DIRS["trace_dir"]}
+        if system_name != "agile":  # agile keeps role artifacts per workspace instead of checkpoints
+            options["checkpoint_dir"] = OUTPUT_DIRS["checkpoint_dir"]
+        system = module.MultiAgentSystem(config_file=config_file, **options)
+        system.clear_console_on_run = False
+        systems[system_name] = system
+    return systems[system_name]
+
+
+def solve(record):
+    """Runs one problem. Executed inside a pool worker; never raises."""
+    started = time.time()
+    result = {
+        "id": record["id"],
+        "system": record["system"],
+        "problem": record["problem"],
+        "domain": record["domain"],
+        "started_at": datetime.datetime.now().isoformat(),
+    }
+    try:
+        system = get_system(record["system"])
+        if record["system"] == "agile":
+            report = system.run_with_report(record["problem"], deadline=record.get("deadline_s"))
+        else:
+            report = system.run_with_report(record["problem"], record["domain"], deadline=record.get("deadline_s"))
+        result.update(status="ok", result=report["output"], llm_usage=report["llm_usage"], prescreen=report["prescreen"])
+        if report["deadline"] is not None:
+            result["deadline"] = report["deadline"]
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+        metrics.record_run(record["system"], started, "error")
+    result["latency_s"] = round(time.time() - started, 3)
+    result["finished_at"] = datetime.datetime.now().isoformat()
+    return result
+
+
+def run_pipelined(records, on_result, stage_workers=None):
+    """
+    Feeds all records through MultiAgentSystem.run_pipeline, which overlaps the stages of
+    different problems instead of running each problem end to end in its own worker.
+    """
+    systems = {r["system"] for r in records}
+    if len(systems) > 1:
+        raise ValueError(f"--executor pipeline runs one system at a time, got {sorted(systems)}")
+    if not records:
+        return
+    system = get_system(records[0]["system"])
+    if not hasattr(system, "run_pipeline"):
+        raise ValueError(f"System '{records[0]['system']}' has no pipeline mode")
+
+    def on_complete(index, job):
+        record = records[index]
+        result = {
+            "id": record["id"],
+            "system": record["system"],
+            "problem": record["problem"],
+            "domain": record["domain"],
+            "latency_s": round(job["latency"], 3),
+            "stage_times_s": {stage: round(t, 3) for stage, t in job["stage_times"].items()},
+            "llm_usage": job["usage"].summary(),
+            "prescreen": job["prescreen"],
+            "finished_at": datetime.datetime.now().isoformat(),
+        }
+        if "error" in job:
+            result.update(status="error", error=job["error"])
+        else:
+            result.update(status="ok", result=job["final_output"])
+        if job["deadline_report"] is not None:
+            result["deadline"] = job["deadline_report"]
+        on_result(result)
+
+    system.run_pipeline([(r["problem"], r["domain"], r.get("deadline_s")) for r in records], stage_workers, on_complete)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(results, wall_time):
+    latencies = [r["latency_s"] for r in results]
+    failures = sum(1 for r in results if r["status"] != "ok")
+    return {
+        "completed": len(results),
+        "failures": failures,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_per_min": round(len(results) / wall_time * 60, 3) if wall_time > 0 else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+    }
+
+
+def run_batch(input_path, output_path, system="dreamteam", workers=2, executor="thread", resume=True,
+              stage_workers=None, trace_dir=None, checkpoint_dir=None):
+    """
+    Solves every record of input_path with a pool of workers, streaming each result to
+    output_path as it completes. executor "pipeline" pipelines the stages of the problems
+    through one system instead (stage_workers sets the per-stage concurrency).
+    trace_dir and checkpoint_dir enable the per-run trace export and checkpoints.
+    Returns the summary dict.
+    """
+    configure_outputs(trace_dir, checkpoint_dir)
+    records = load_records(input_path, system)
+    unknown = {r["system"] for r in records} - set(SYSTEMS)
+    if unknown:
+        raise ValueError(f"Unknown system(s) {sorted(unknown)}; expected one of {sorted(SYSTEMS)}")
+
+    skipped = 0
+    if resume:
+        completed_ids = load_completed_ids(output_path)
+        skipped = sum(1 for r in records if r["id"] in completed_ids)
+        records = [r for r in records if r["id"] not in completed_ids]
+    else:
+        open(output_path, "w").close()
+    if executor == "pipeline":
+        print(f"{Fore.CYAN}[Batch] {len(records)} problems to run, {skipped} already completed, "
+              f"stage-pipelined{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.CYAN}[Batch] {len(records)} problems to run, {skipped} already completed, "
+              f"{workers} {executor} workers{Style.RESET_ALL}")
+
+    results = []
+    start = time.time()
+    with open(output_path, "a", encoding="utf-8") as out:
+        def on_result(result):
+            out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            results.append(result)
+            colour = Fore.GREEN if result["status"] == "ok" else Fore.RED
+            print(f"{colour}[Batch] {len(results)}/{len(records)} {result['id']} {result['status']} "
+                  f"in {result['latency_s']:.1f}s{Style.RESET_ALL}")
+
+        if executor == "pipeline":
+            run_pipelined(records, on_result, stage_workers)
+        else:
+            if executor == "process":
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=configure_outputs,
+                                                              initargs=(trace_dir, checkpoint_dir))
+            else:
+                pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+            with pool:
+                futures = [pool.submit(solve, record) for record in records]
+                for future in concurrent.futures.as_completed(futures):
+                    on_result(future.result())
+
+    summary = summarize(results, time.time() - start)
+    summary["skipped"] = skipped
+    print(f"{Fore.CYAN}[Batch] Completed {summary['completed']} ({summary['failures']} failed, {skipped} skipped) "
+          f"in {summary['wall_time_s']:.1f}s → {summary['throughput_per_min']:.2f} problems/min, "
+          f"p50 {summary['latency_p50_s']:.1f}s, p95 {summary['latency_p95_s']:.1f}s{Style.RESET_ALL}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run MLACE over a JSONL file of problems.")
+    parser.add_argument("input", help="JSONL file with one {problem, domain, system, id} record per line")
+    parser.add_argument("output", help="JSONL file results are appended to as they complete")
+    parser.add_argument("--system", choices=sorted(SYSTEMS), default="dreamteam",
+                        help="orchestrator for records that don't name one")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--executor", choices=["thread", "process", "pipeline"], default="thread")
+    parser.add_argument("--stage-workers", default="",
+                        help="pipeline executor only: per-stage worker counts, e.g. team=3,evaluate=2")
+    parser.add_argument("--no-resume", action="store_true", help="truncate the output file and rerun everything")
+    parser.add_argument("--trace-dir", help="write each run's span trace here (off by default)")
+    parser.add_argument("--checkpoint-dir", help="checkpoint each run's stages here (off by default)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on this port while the batch runs (thread/pipeline executors)")
+    args = parser.parse_args(argv)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    stage_workers = {}
+    for item in filter(None, args.stage_workers.split(",")):
+        stage, _, count = item.partition("=")
+        stage_workers[stage.strip()] = int(count)
+
+    summary = run_batch(args.input, args.output, args.system, args.workers, args.executor,
+                        resume=not args.no_resume, stage_workers=stage_workers,
+                        trace_dir=args.trace_dir, checkpoint_dir=args.checkpoint_dir)
+    return 1 if summary["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
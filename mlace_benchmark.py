@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the three orchestrators on a fixed problem corpus.
+
+For every scenario and problem it measures LLM call count, prompt/completion tokens,
+wall-clock time, LLM busy time (the time at least one LLM call was in flight, i.e. the run
+time left with zero orchestration overhead at the same concurrency) and peak Python memory.
+The peak comes from a second run of the problem under tracemalloc, so tracing allocations
+does not slow down the timed run. Results are written as JSON and compared against a stored
+baseline.
+
+Run it against a recorded trace so the numbers are reproducible without a model:
+    MLACE_LLM_BACKEND=record MLACE_LLM_TRACE=traces/bench.jsonl python mlace_benchmark.py   # once, with Ollama
+    python mlace_benchmark.py --trace traces/bench.jsonl --latency original --save-baseline benchmark_baseline.json
+    python mlace_benchmark.py --trace traces/bench.jsonl --latency original --baseline benchmark_baseline.json
+
+--startup instead measures cold start: for each scenario a fresh interpreter imports the
+orchestrator, builds the MultiAgentSystem and starts a run, and the time to the first LLM call
+is reported (the process exits there), together with the heavy packages loaded by then:
+    python mlace_benchmark.py --startup --repeat 5
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import importlib
+import statistics
+import subprocess
+import tracemalloc
+import contextlib
+from colorama import Fore, Style
+
+import llm_backend
+
+DEFAULT_CORPUS = [
+    {
+        "id": "wealth",
+        "problem": "Develop a portfolio investment strategy yielding 8-10% annual return with minimal risk exposure "
+                   "for a 68 year old conservative investor with $65,000 annual income and $0.4M net worth.",
+        "domain": "Wealth Management",
+    },
+    {
+        "id": "lightbulb",
+        "problem": "Develop a H1 style light bulb which never breaks, consumes close to no power.",
+        "domain": "Industrial Engineering",
+    },
+    {
+        "id": "upload",
+        "problem": "As a user, I want to upload large files securely and quickly, so that I can share data with "
+                   "collaborators without risking data breaches.",
+        "domain": "Software Engineering",
+    },
+]
+
+# Metrics compared against the baseline; for all of them lower is better
+COMPARED_METRICS = ["calls", "prompt_tokens", "completion_tokens", "wall_s", "llm_busy_s", "peak_mem_mb"]
+
+
+def build_main():
+    import mlace_main
+    return mlace_main.MultiAgentSystem(config_file="agents_config.json", checkpoint_dir=None, trace_dir=None)
+
+
+def build_dreamteam(peer_review):
+    import mlace_dreamteam
+    return mlace_dreamteam.MultiAgentSystem(checkpoint_dir=None, peer_review=peer_review, trace_dir=None)
+
+
+def build_agile():
+    import mlace_main_agile
+    return mlace_main_agile.MultiAgentSystem(config_file="agents_config_agile.json", trace_dir=None)
+
+
+# scenario name → (builder, runner)
+SCENARIOS = {
+    "main": (build_main, lambda system, item: system.run(item["problem"], item["domain"])),
+    "dreamteam": (lambda: build_dreamteam(True), lambda system, item: system.run(item["problem"], item["domain"])),
+    "dreamteam_no_peer_review": (lambda: build_dreamteam(False), lambda system, item: system.run(item["problem"], item["domain"])),
+    "agile": (build_agile, lambda system, item: system.run(item["problem"])),
+}
+
+
+# scenario → orchestrator module, imported separately by the startup benchmark to time the import alone
+SCENARIO_MODULES = {
+    "main": "mlace_main",
+    "dreamteam": "mlace_dreamteam",
+    "dreamteam_no_peer_review": "mlace_dreamteam",
+    "agile": "mlace_main_agile",
+}
+# Packages whose presence in sys.modules at the first LLM call is reported by --startup
+HEAVY_MODULES = ["yfinance", "pandas", "numpy", "requests", "ollama", "httpx"]
+STARTUP_MARKER = "MLACE_STARTUP "
+STARTUP_METRICS = ["process_s", "import_s", "setup_s", "client_import_s", "first_call_s"]
+
+
+def busy_time(calls):
+    """Length of the union of the calls' [started, finished] intervals."""
+    total, current_start, current_end = 0.0, None, None
+    for call in sorted(calls, key=lambda c: c["started"]):
+        if current_end is None or call["started"] > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = call["started"], call["finished"]
+        else:
+            current_end = max(current_end, call["finished"])
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def run_once(run, quiet):
+    """Runs run() once; returns the error message or None."""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            run()
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def measure(meter, run, quiet=True, memory=True):
+    """
+    Times one run of run() and meters its LLM calls. With memory, the problem is run a second
+    time under tracemalloc for the peak; that pass's calls and time are not counted.
+    """
+    meter.reset()
+    started = time.time()
+    error = run_once(run, quiet)
+    wall = time.time() - started
+    calls = meter.reset()
+
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        run_once(run, quiet)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        meter.reset()
+    return {
+        "calls": len(calls),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+        "completion_tokens": sum(c["completion_tokens"] for c in calls),
+        "tokens_estimated": any(c["tokens_estimated"] for c in calls),
+        "wall_s": round(wall, 4),
+        "llm_busy_s": round(busy_time(calls), 4),
+        "llm_time_s": round(sum(c["finished"] - c["started"] for c in calls), 4),
+        "peak_mem_mb": round(peak / 2**20, 3),
+        "error": error,
+    }
+
+
+def run_benchmark(scenarios, corpus, quiet=True, memory=True):
+    meter = llm_backend.MeteringBackend(llm_backend.get_backend())
+    previous = llm_backend.set_backend(meter)
+    results = {}
+    try:
+        for name in scenarios:
+            builder, runner = SCENARIOS[name]
+            print(f"{Fore.CYAN}[Benchmark] {name}{Style.RESET_ALL}")
+            setup_started = time.time()
+            with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+                system = builder()
+            system.clear_console_on_run = False
+            setup = time.time() - setup_started
+
+            problems = {}
+            for item in corpus:
+                problems[item["id"]] = measure(meter, lambda: runner(system, item), quiet, memory)
+                m = problems[item["id"]]
+                colour = Fore.RED if m["error"] else Fore.GREEN
+                print(f"{colour}  {item['id']:<12} {m['calls']:4d} calls {m['prompt_tokens']:8d}+{m['completion_tokens']:<7d} tokens "
+                      f"{m['wall_s']:8.2f}s wall {m['llm_busy_s']:8.2f}s LLM busy {m['peak_mem_mb']:8.1f} MB"
+                      f"{'  ' + m['error'] if m['error'] else ''}{Style.RESET_ALL}")
+
+            totals = {metric: round(sum(p[metric] for p in problems.values()), 4) for metric in COMPARED_METRICS + ["llm_time_s"]}
+            totals["peak_mem_mb"] = max(p["peak_mem_mb"] for p in problems.values()) if problems else 0.0
+            totals["errors"] = sum(1 for p in problems.values() if p["error"])
+            results[name] = {"setup_s": round(setup, 4), "totals": totals, "problems": problems}
+    finally:
+        llm_backend.set_backend(previous)
+    return {
+        "created_at": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "backend": getattr(meter.inner, "name", type(meter.inner).__name__),
+        "corpus": [item["id"] for item in corpus],
+        "scenarios": results,
+    }
+
+
+def compare(results, baseline, tolerance=0.10):
+    """Prints per-scenario deltas against baseline; returns the list of regressions beyond tolerance."""
+    regressions = []
+    print(f"\n{Fore.CYAN}=== Comparison with baseline from {baseline.get('created_at', '?')} ==={Style.RESET_ALL}")
+    for name, scenario in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            print(f"{Fore.YELLOW}{name}: not in baseline{Style.RESET_ALL}")
+            continue
+        cells = []
+        for metric in COMPARED_METRICS:
+            new, old = scenario["totals"][metric], base["totals"].get(metric)
+            if old is None:
+                cells.append(f"{metric} new {new:g}")
+                continue
+            if old:
+                change = (new - old) / old
+                regressed = change > tolerance
+                delta = f"{change:+.0%}"
+            else:
+                # Any increase from zero (e.g. errors or calls that used to be skipped) is a regression
+                change = float(new > 0)
+                regressed = new > 0
+                delta = "was 0"
+            if regressed:
+                regressions.append((name, metric, old, new))
+            colour = Fore.RED if regressed else Fore.GREEN if change < -tolerance else ""
+            cells.append(f"{colour}{metric} {old:g}→{new:g} ({delta}){Style.RESET_ALL if colour else ''}")
+        print(f"{name}: " + ", ".join(cells))
+    if regressions:
+        print(f"{Fore.RED}{len(regressions)} regression(s) beyond {tolerance:.0%}{Style.RESET_ALL}")
+    return regressions
+
+
+class FirstCallBackend:
+    """Ends the process at the first LLM call and reports how long it took to get there."""
+    name = "first-call"
+
+    def __init__(self, started, timings):
+        self.started = started
+        self.timings = timings
+
+    def chat(self, model, messages):
+        client_started = time.perf_counter()
+        if os.environ.get("MLACE_LLM_BACKEND", "live") != "replay":
+            try:
+                import ollama  # the live backend's first call pays for this import too
+            except ImportError:
+                pass
+        self.timings["client_import_s"] = round(time.perf_counter() - client_started, 4)
+        self.timings["first_call_s"] = round(time.perf_counter() - self.started, 4)
+        self.timings["heavy_modules"] = [name for name in HEAVY_MODULES if name in sys.modules]
+        self.timings["modules"] = len(sys.modules)
+        sys.__stdout__.write(STARTUP_MARKER + json.dumps(self.timings) + "\n")
+        sys.__stdout__.flush()
+        os._exit(0)
+
+
+def startup_child(scenario):
+    """Runs in the fresh interpreter started by measure_startup()."""
+    started = time.perf_counter()
+    timings = {}
+    llm_backend.set_backend(FirstCallBackend(started, timings))
+    importlib.import_module(SCENARIO_MODULES[scenario])
+    timings["import_s"] = round(time.perf_counter() - started, 4)
+    builder, runner = SCENARIOS[scenario]
+    system = builder()
+    system.clear_console_on_run = False
+    timings["setup_s"] = round(time.perf_counter() - started - timings["import_s"], 4)
+    runner(system, DEFAULT_CORPUS[0])
+    print(f"{Fore.RED}[Startup] {scenario} finished without an LLM call{Style.RESET_ALL}")
+    return 1
+
+
+def measure_startup(scenarios, repeat=3):
+    """Median cold-start timings per scenario, each from `repeat` fresh interpreters."""
+    results = {}
+    env = dict(os.environ, MLACE_LOG_CONSOLE="off", MLACE_LOG_FILE="")
+    for name in scenarios:
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), "--startup-child", name],
+                                     capture_output=True, text=True, env=env)
+            elapsed = time.perf_counter() - started
+            marker = next((line for line in process.stdout.splitlines() if line.startswith(STARTUP_MARKER)), None)
+            if marker is None:
+                print(f"{Fore.RED}[Startup] {name} failed (exit {process.returncode}): "
+                      f"{(process.stderr or process.stdout).strip()[-500:]}{Style.RESET_ALL}")
+                break
+            run = json.loads(marker[len(STARTUP_MARKER):])
+            run["process_s"] = round(elapsed, 4)
+            runs.append(run)
+        if not runs:
+            results[name] = {"error": "no LLM call reached"}
+            continue
+        result = {metric: round(statistics.median(run[metric] for run in runs), 4) for metric in STARTUP_METRICS}
+        result.update(runs=len(runs), heavy_modules=runs[-1]["heavy_modules"], modules=runs[-1]["modules"])
+        results[name] = result
+        print(f"{Fore.GREEN}  {name:<26} {result['process_s']:7.3f}s to first LLM call  (import {result['import_s']:.3f}s, "
+              f"setup {result['setup_s']:.3f}s, client {result['client_import_s']:.3f}s, {result['modules']} modules"
+              f"{', ' + ', '.join(result['heavy_modules']) if result['heavy_modules'] else ''}){Style.RESET_ALL}")
+    return {
+        "created_at": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "startup": results,
+    }
+
+
+def load_corpus(path):
+    if not path:
+        return DEFAULT_CORPUS
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    for index, item in enumerate(corpus):
+        item.setdefault("id", f"problem_{index}")
+        item.setdefault("domain", "General")
+    return corpus
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MLACE orchestrators end to end.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable); all by default")
+    parser.add_argument("--corpus", help="JSONL file of {id, problem, domain}; a built-in corpus by default")
+    parser.add_argument("--trace", help="replay this recorded trace instead of the backend set by MLACE_LLM_BACKEND")
+    parser.add_argument("--latency", default="original", help="replay latency: original, none, fixed:S or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up factor")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--save-baseline", help="also write the results to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative increase counted as a regression")
+    parser.add_argument("--verbose", action="store_true", help="keep the agents' console output")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass (halves the run time, no peak_mem_mb)")
+    parser.add_argument("--startup", action="store_true", help="measure cold import-to-first-LLM-call time instead")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per scenario for --startup")
+    parser.add_argument("--startup-child", choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.startup_child:
+        return startup_child(args.startup_child)
+    if args.startup:
+        print(f"{Fore.CYAN}[Benchmark] Cold start, median of {args.repeat} runs{Style.RESET_ALL}")
+        results = measure_startup(args.scenario or list(SCENARIOS), args.repeat)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"{Fore.CYAN}[Benchmark] Results written to {args.output}{Style.RESET_ALL}")
+        return 1 if any("error" in r for r in results["startup"].values()) else 0
+
+    if args.trace:
+        llm_backend.set_backend(llm_backend.ReplayBackend(args.trace, llm_backend.parse_latency(args.latency), args.speed))
+    results = run_benchmark(args.scenario or list(SCENARIOS), load_corpus(args.corpus), quiet=not args.verbose,
+                            memory=not args.no_memory)
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"{Fore.CYAN}[Benchmark] Results written to {path}{Style.RESET_ALL}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        return 1 if compare(results, baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,9 +4,37 @@ import json
 import time
 import datetime
 import re
+import math
 import hashlib
-import requests
+import uuid
+import zlib
+import queue
+import threading
+import concurrent.futures
 from colorama import Fore, Style
+import settings  # config.json, loaded on first use
+from pre_evaluator import HeuristicPreEvaluator, BORDERLINE
+from checkpoints import CheckpointStore
+from agent_registry import AgentRegistry, LazyAgents
+
+# Pipeline mode: each stage has its own queue and worker threads, so problems flow through
+# refine → team → synthesize → evaluate → communicate like an assembly line.
+PIPELINE_STAGES = ["refine", "team", "synthesize", "evaluate", "communicate"]
+# Workers per stage; the team stage issues the most LLM calls per problem so it gets the most slots.
+# Keep the total close to the number of requests the Ollama backend serves in parallel (OLLAMA_NUM_PARALLEL).
+PIPELINE_STAGE_WORKERS = {"refine": 1, "team": 2, "synthesize": 1, "evaluate": 1, "communicate": 1}
+# run(..., deadline=...): mandatory LLM round trips still ahead once a stage is done (two role
+# calls and a first pass by ~4 experts, synthesis, evaluation, summary), kept in reserve
+DEADLINE_RESERVE_CALLS = {"refine": 9, "team": 3, "synthesize": 2, "evaluate": 1, "communicate": 0}
+
+# Job fields each stage reads and writes; the reads are hashed to decide whether a checkpoint can be replayed
+PIPELINE_STAGE_IO = {
+    "refine": (["problem"], ["refined_problem"]),
+    "team": (["refined_problem"], ["dynamic_output"]),
+    "synthesize": (["refined_problem", "dynamic_output"], ["synthesized"]),
+    "evaluate": (["refined_problem", "dynamic_output", "synthesized"], ["best_output", "best_score"]),
+    "communicate": (["refined_problem", "best_output"], ["final_output"]),
+}
 
 # --- Helper Functions for JSON Extraction ---
 
@@ -27,6 +55,7 @@ def extract_json_between_delimiters(text, start_delim="<<<JSON>>>", end_delim="<
         if match:
             json_text = match.group(0).strip()
         else:
+            metrics.JSON_PARSE_FAILURES.labels(reason="missing").inc()
             return None
 
     try:
@@ -35,6 +64,7 @@ def extract_json_between_delimiters(text, start_delim="<<<JSON>>>", end_delim="<
         json_text = re.sub(r'\s+', ' ', json_text)
         return json.loads(json_text)
     except Exception as e:
+        metrics.JSON_PARSE_FAILURES.labels(reason="invalid").inc()
         print(f"{Fore.RED}Error parsing JSON between delimiters or fallback: {e}{Style.RESET_ALL}")
         return None
 
@@ -104,6 +134,81 @@ def extract_json(text):
             return None
     return None
 
+# --- Near-Duplicate Detection (MinHash over word shingles) ---
+
+MINHASH_PRIME = (1 << 61) - 1
+MINHASH_SEEDS = [((i * 0x9E3779B1) % MINHASH_PRIME | 1, (i * 0x85EBCA6B + 1) % MINHASH_PRIME) for i in range(1, 65)]
+
+def shingle_text(text, k=3):
+    """Returns the set of k-word shingles of text (lowercased, punctuation stripped)."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def minhash_signature(shingles):
+    """64-permutation MinHash signature of a shingle set."""
+    hashed = [zlib.crc32(shingle.encode()) for shingle in shingles] or [0]
+    return [min((a * h + b) % MINHASH_PRIME for h in hashed) for a, b in MINHASH_SEEDS]
+
+def estimate_jaccard(signature_a, signature_b):
+    return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / len(signature_a)
+
+def merge_similar_roles(required_roles, expert_definitions, threshold=0.4):
+    """
+    Folds roles whose title + definition overlap heavily (word-level Jaccard >= threshold)
+    into the first similar role, so overlapping experts don't produce redundant work.
+    Returns (roles, definitions, merged) where merged maps each dropped role to its keeper.
+    """
+    kept_roles, kept_words, merged = [], [], {}
+    definitions = dict(expert_definitions)
+    for role in required_roles:
+        # Single-word shingles without short filler words ("and", "the", ...)
+        words = {word for word in shingle_text(f"{role} {definitions.get(role, '')}", k=1) if len(word) > 3}
+        match = None
+        for keeper, keeper_words in zip(kept_roles, kept_words):
+            union = words | keeper_words
+            if union and len(words & keeper_words) / len(union) >= threshold:
+                match = keeper
+                break
+        if match is None:
+            kept_roles.append(role)
+            kept_words.append(words)
+            continue
+        merged[role] = match
+        definitions[match] = f"{definitions.get(match, 'General expert responsibilities.')} Also covers the '{role}' perspective: {definitions.get(role, '')}".strip()
+        print(f"{Fore.CYAN}[Dedup] Merged near-duplicate role '{role}' into '{match}'.{Style.RESET_ALL}")
+    return kept_roles, definitions, merged
+
+def deduplicate_contributions(team_outputs, threshold=0.6, min_paragraph_chars=80):
+    """
+    Drops paragraphs that are near-duplicates (estimated Jaccard >= threshold) of a paragraph
+    already kept from an earlier role. Short paragraphs such as headers are always kept.
+    Returns (deduplicated team_outputs, stats).
+    """
+    kept_signatures = []
+    deduplicated = {}
+    stats = {"chars_before": 0, "chars_after": 0, "paragraphs_removed": 0}
+    for role, output in team_outputs.items():
+        output = str(output)
+        stats["chars_before"] += len(output)
+        kept_paragraphs = []
+        for paragraph in re.split(r"\n\s*\n", output):
+            if len(paragraph.strip()) >= min_paragraph_chars:
+                signature = minhash_signature(shingle_text(paragraph))
+                if any(estimate_jaccard(signature, kept) >= threshold for kept in kept_signatures):
+                    stats["paragraphs_removed"] += 1
+                    continue
+                kept_signatures.append(signature)
+            kept_paragraphs.append(paragraph)
+        deduplicated[role] = "\n\n".join(kept_paragraphs)
+        stats["chars_after"] += len(deduplicated[role])
+    removed = stats["chars_before"] - stats["chars_after"]
+    stats["removed_ratio"] = removed / stats["chars_before"] if stats["chars_before"] else 0.0
+    print(f"{Fore.CYAN}[Dedup] Removed {stats['paragraphs_removed']} redundant paragraphs "
+          f"({removed} chars, {stats['removed_ratio']:.0%} of team output).{Style.RESET_ALL}")
+    return deduplicated, stats
+
 # --- Session and Context Setup ---
 
 class Session:
@@ -117,25 +222,42 @@ def reset_context(session):
     print(f"{Fore.YELLOW}[Context reset for session {session.session_id} in domain {session.domain}]{Style.RESET_ALL}")
 
 # --- Ollama Interface (Actual API Calls) ---
-import ollama  # make sure you have `ollama` package installed
+import llm_backend  # live Ollama by default; record/replay via MLACE_LLM_BACKEND
+import event_log
+import llm_usage
+import metrics
+import tracing
+import planner
+import deadline
+import evaluation
+import stages
+from deadline import Deadline
 
 class OllamaInterface:
-    def __init__(self, model="llama3.2", temperature=0.1):
+    def __init__(self, model="llama3.2", temperature=0.1, agent=None):
         self.model = model
         self.temperature = temperature  # Not used by ollama.chat yet, but retained for future
+        self.agent = agent  # recorded with each call's token counts and timings
 
     def query(self, prompt):
+        started = time.time()
         try:
-            response = ollama.chat(
+            response = llm_backend.chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}]
             )
+            llm_usage.record(self.agent, self.model, response, time.time() - started)
+            metrics.record_llm_call(self.agent, self.model, response, time.time() - started)
+            tracing.add_span(f"llm {self.agent}", started, agent=self.agent, model=self.model,
+                             prompt_tokens=response.get("prompt_eval_count"), completion_tokens=response.get("eval_count"))
             raw_content = response.get("message", {}).get("content", "")
-            print(f"{Fore.MAGENTA}[LLM Query] {prompt[:200]}...{Style.RESET_ALL}")
-            print(f"{Fore.MAGENTA}[LLM Response] {raw_content[:200]}...{Style.RESET_ALL}")
+            event_log.llm_call(self.agent, self.model, prompt, raw_content, time.time() - started)
             return raw_content
         except Exception as e:
-            print(f"{Fore.RED}[ERROR in OllamaInterface] {e}{Style.RESET_ALL}")
+            llm_usage.record(self.agent, self.model, None, time.time() - started, error=f"{type(e).__name__}: {e}")
+            metrics.record_llm_call(self.agent, self.model, None, time.time() - started, error=e)
+            tracing.add_span(f"llm {self.agent}", started, agent=self.agent, model=self.model, error=str(e))
+            event_log.llm_call(self.agent, self.model, prompt, None, time.time() - started, error=e)
             return "ERROR"
 
 # --- Base Agent Class ---
@@ -145,21 +267,35 @@ class Agent:
         self.name = name
         self.role = role
         self.prompt_template = prompt_template
-        self.interface = OllamaInterface()
+        self.interface = OllamaInterface(agent=name)
         self.output = None
         self.improvement_history = []
     
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", job=None):
         prompt = self.prompt_template.format(problem=problem_statement, context=context)
         try:
-            self.output = self.interface.query(prompt)
+            output = self.interface.query(prompt)
         except Exception as e:
             print(f"{Fore.RED}[{self.name} ERROR] {e}{Style.RESET_ALL}")
-            self.output = "ERROR"
-        return self.output
+            output = "ERROR"
+        # Within a run the output belongs to the job; self.output only serves standalone calls
+        if job is not None:
+            job["outputs"][self.name] = output
+        else:
+            self.output = output
+        return output
     
-    def update_from_feedback(self, refined_response, evaluator_feedback):
+    def update_from_feedback(self, refined_response, evaluator_feedback, job=None):
+        """Within a run the note is kept in job["feedback"] and the shared agent is left untouched."""
         feedback_note = f"\n\n[Feedback Update]: {evaluator_feedback.strip()}"
+        if job is not None:
+            notes = job["feedback"].setdefault(self.name, [])
+            if feedback_note not in notes:
+                notes.append(feedback_note)
+                print(f"{Fore.GREEN}[{self.name}] Feedback recorded for this run.{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.CYAN}[{self.name}] Feedback already integrated.{Style.RESET_ALL}")
+            return
         if feedback_note not in self.prompt_template:
             self.prompt_template += feedback_note
             self.improvement_history.append(feedback_note)
@@ -169,23 +305,98 @@ class Agent:
 
 # --- Supporting Agents ---
 
+# Each best-of-N candidate is steered towards a different quality so the candidates don't collapse into one answer
+REFINEMENT_FOCI = [
+    "clarity (remove ambiguity and vague wording)",
+    "specificity (measurable targets, constraints and deadlines)",
+    "completeness (missing context, scope and assumptions)",
+    "actionability (concrete, time-bound next steps)",
+]
+
+# Tournament critique candidates each attack a different weakness of the current best output
+CRITIQUE_FOCI = [
+    "clarity and structure",
+    "completeness and missing details",
+    "actionability with specific, measurable recommendations",
+]
+
 class PromptRefinerAgent(Agent):
-    def refine_problem_statement(self, original_problem, max_attempts=4):
+    def refine_problem_statement(self, original_problem, max_attempts=settings.CONFIG):
+        max_attempts = settings.value("max_refinement_attempts", max_attempts)
         refined_problem = original_problem
         confidence_score = 50  # Default value if extraction fails.
         for attempt in range(max_attempts):
+            if not deadline.allows("refine.attempt", agent=self.name, detail=f"attempt {attempt+1}"):
+                return refined_problem, confidence_score
             print(f"{Fore.YELLOW}[PromptRefinerAgent] Refinement Attempt {attempt+1}/{max_attempts}{Style.RESET_ALL}")
-            prompt = f"""
+            prompt = self.build_refinement_prompt(refined_problem)
+
+            llm_response = self.interface.query(prompt)
+            data = extract_json_between_delimiters(llm_response)
+            if data is not None:
+                refined_objective, extracted_confidence = self.parse_refinement(data)
+                if refined_objective and extracted_confidence >= settings.value("confidence_threshold"):
+                    print(f"{Fore.GREEN}[PromptRefinerAgent] Confidence {extracted_confidence}% → Final Refinement Achieved.{Style.RESET_ALL}")
+                    metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(attempt + 1)
+                    return refined_objective, extracted_confidence
+                else:
+                    refined_problem = refined_objective if refined_objective else refined_problem
+                    confidence_score = extracted_confidence
+            else:
+                print(f"{Fore.YELLOW}[PromptRefinerAgent] Failed to extract JSON on attempt {attempt+1}.{Style.RESET_ALL}")
+        print(f"{Fore.RED}[PromptRefinerAgent] Max Refinement Attempts Reached. Using Best Version.{Style.RESET_ALL}")
+        metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(max_attempts)
+        return refined_problem, confidence_score
+
+    def refine_problem_statement_best_of_n(self, original_problem, n_candidates=settings.CONFIG):
+        """
+        Generates n candidate refinements concurrently, each steered towards a different
+        focus, and keeps the candidate with the highest confidence score.
+        Costs one round trip instead of up to max_attempts sequential ones.
+        """
+        n_candidates = settings.value("refinement_candidates", n_candidates)
+        if not deadline.allows("refine.best_of_n", agent=self.name):
+            return original_problem, 50
+        print(f"{Fore.YELLOW}[PromptRefinerAgent] Generating {n_candidates} candidate refinements concurrently{Style.RESET_ALL}")
+        prompts = [
+            self.build_refinement_prompt(original_problem, REFINEMENT_FOCI[i % len(REFINEMENT_FOCI)])
+            for i in range(n_candidates)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_candidates, 1)) as executor:
+            responses = list(executor.map(llm_usage.propagate(self.interface.query), prompts))
+
+        candidates = []
+        for response in responses:
+            data = extract_json_between_delimiters(response)
+            if data is None:
+                continue
+            refined_objective, extracted_confidence = self.parse_refinement(data)
+            if refined_objective:
+                candidates.append((refined_objective, extracted_confidence))
+
+        if not candidates:
+            print(f"{Fore.RED}[PromptRefinerAgent] No usable candidates. Keeping original objective.{Style.RESET_ALL}")
+            return original_problem, 50
+
+        # Single scoring pass: highest confidence wins, the more detailed objective breaks ties
+        refined_problem, confidence_score = max(candidates, key=lambda c: (c[1], len(c[0])))
+        print(f"{Fore.GREEN}[PromptRefinerAgent] Best of {len(candidates)} candidates → Confidence {confidence_score}%{Style.RESET_ALL}")
+        return refined_problem, confidence_score
+
+    @staticmethod
+    def build_refinement_prompt(problem, focus=None):
+        focus_note = f"\nPay particular attention to {focus}.\n" if focus else ""
+        return f"""
 You are a domain expert and writing coach. Your task is to refine the following problem statement to improve clarity, specificity, and completeness.
 
 **Original Problem Statement:**
-{refined_problem}
+{problem}
 
 Refine it so that it:
 - Uses measurable and specific language (e.g., targets, deadlines, constraints)
 - Is actionable and time-bound
 - Includes key context or scope where relevant
-
+{focus_note}
 **Response Format — strictly follow this format:**
 
 Return ONLY a valid JSON object enclosed exactly between these delimiters: <<<JSON>>> and <<<END>>>.
@@ -199,25 +410,16 @@ Do NOT include any markdown, backticks, explanations, or introductory text.
 <<<END>>>
 """
 
-            llm_response = self.interface.query(prompt)
-            data = extract_json_between_delimiters(llm_response)
-            if data is not None:
-                refined_objective = data.get("Refined Objective", "").strip()
-                confidence_str = data.get("Confidence Score", "50%").strip().replace("%", "")
-                try:
-                    extracted_confidence = int(float(confidence_str))
-                except:
-                    extracted_confidence = 50
-                if refined_objective and extracted_confidence >= 85:
-                    print(f"{Fore.GREEN}[PromptRefinerAgent] Confidence {extracted_confidence}% → Final Refinement Achieved.{Style.RESET_ALL}")
-                    return refined_objective, extracted_confidence
-                else:
-                    refined_problem = refined_objective if refined_objective else refined_problem
-                    confidence_score = extracted_confidence
-            else:
-                print(f"{Fore.YELLOW}[PromptRefinerAgent] Failed to extract JSON on attempt {attempt+1}.{Style.RESET_ALL}")
-        print(f"{Fore.RED}[PromptRefinerAgent] Max Refinement Attempts Reached. Using Best Version.{Style.RESET_ALL}")
-        return refined_problem, confidence_score
+    @staticmethod
+    def parse_refinement(data):
+        """Returns (refined objective, confidence 0-100) from a parsed refinement JSON object."""
+        refined_objective = str(data.get("Refined Objective", "")).strip()
+        confidence_str = str(data.get("Confidence Score", "50%")).strip().replace("%", "")
+        try:
+            extracted_confidence = int(float(confidence_str))
+        except:
+            extracted_confidence = 50
+        return refined_objective, extracted_confidence
 
 class EvaluatorAgent(Agent):
     def execute(self, agent_name, agent_response, problem_statement):
@@ -250,33 +452,110 @@ Do NOT include any markdown, backticks, explanations, or introductory text.
 """
 
         evaluation_output = self.interface.query(evaluation_prompt)
-        print(f"{Fore.YELLOW}[EvaluatorAgent] Evaluation for {agent_name}:\n{evaluation_output}{Style.RESET_ALL}")
+        event_log.event("evaluation", agent=self.name, subject=agent_name, text_chars=len(evaluation_output),
+                        text_preview=event_log.preview(evaluation_output))
         return evaluation_output
 
+    def evaluate_many(self, agent_outputs, problem_statement, subject="agents"):
+        """
+        Grades every (agent_name, agent_response) pair in agent_outputs in a single LLM call.
+        Returns (score_map, evaluation_output) where score_map maps each name to a 0-100 score.
+        """
+        response_sections = "\n\n".join(
+            f"### {name}\n{response}" for name, response in agent_outputs.items()
+        )
+        score_lines = ",\n".join(f'  "{name}": "X/10"' for name in agent_outputs)
+        evaluation_prompt = f"""
+You are an evaluation expert. Your task is to assess the responses provided by {len(agent_outputs)} {subject} in relation to the original objective.
+Grade each response for accuracy and completeness.
+
+**Objective:** {problem_statement}
+
+{response_sections}
+
+Return ONLY a valid JSON object enclosed exactly between these delimiters: <<<JSON>>> and <<<END>>>.
+Use the exact names from the section headings above as keys.
+Do NOT include any markdown, backticks, explanations, or introductory text.
+
+<<<JSON>>>
+{{
+{score_lines}
+}}
+<<<END>>>
+"""
+        evaluation_output = self.interface.query(evaluation_prompt)
+        batch = f"{len(agent_outputs)} {subject}"
+        event_log.event("evaluation", agent=self.name, subject=batch, text_chars=len(evaluation_output),
+                        text_preview=event_log.preview(evaluation_output))
+        event_log.event("evaluation.raw", event_log.DEBUG, agent=self.name, subject=batch, text=evaluation_output)
+
+        data = extract_json_between_delimiters(evaluation_output) or {}
+        score_map = {}
+        for name in agent_outputs:
+            value = str(data.get(name, "5/10"))
+            try:
+                val = float(value.split("/")[0].strip())
+                score_map[name] = val * 10 if val <= 10 else val
+            except ValueError:
+                score_map[name] = 50
+        return score_map, evaluation_output
+
+    def evaluate_candidates(self, agent_name, candidates, problem_statement):
+        """
+        Grades several candidate responses for the same agent in a single LLM call.
+        Returns (scores, evaluation_output) where scores are 0-100 in candidate order.
+        """
+        names = [f"Candidate {i+1}" for i in range(len(candidates))]
+        score_map, evaluation_output = self.evaluate_many(
+            dict(zip(names, candidates)), problem_statement, subject=f"candidate responses for {agent_name}"
+        )
+        return [score_map[name] for name in names], evaluation_output
+
 class ResponseCritiqueAgent(Agent):
     def execute(self, agent_name, agent_response):
-        critique_prompt = f"""
+        critique_prompt = self.build_critique_prompt(agent_name, agent_response)
+        refined_response = self.interface.query(critique_prompt)
+        if str(refined_response).strip() != str(agent_response).strip():
+            print(f"{Fore.GREEN}✅ {agent_name} Response Optimized!{Style.RESET_ALL}")
+            return refined_response
+        return agent_response
+
+    def critique_candidates(self, agent_name, agent_response, k=settings.CONFIG):
+        """Launches k critiques of the same response concurrently, one per critique focus."""
+        k = settings.value("critique_candidates", k)
+        prompts = [
+            self.build_critique_prompt(agent_name, agent_response, CRITIQUE_FOCI[i % len(CRITIQUE_FOCI)])
+            for i in range(k)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(k, 1)) as executor:
+            responses = list(executor.map(llm_usage.propagate(self.interface.query), prompts))
+        return [response for response in responses if response != "ERROR" and response.strip()]
+
+    @staticmethod
+    def build_critique_prompt(agent_name, agent_response, focus=None):
+        focus_note = f"\nConcentrate your refinement on {focus}." if focus else ""
+        return f"""
 Evaluate the response from {agent_name} for clarity, completeness, and alignment with the objective.
-If necessary, refine it to be more actionable and specific.
+If necessary, refine it to be more actionable and specific.{focus_note}
 
 **Original Response:**
 {agent_response}
 
 Return your refined response as plain text only.
 """
-        refined_response = self.interface.query(critique_prompt)
-        if str(refined_response).strip() != str(agent_response).strip():
-            print(f"{Fore.GREEN}✅ {agent_name} Response Optimized!{Style.RESET_ALL}")
-            return refined_response
-        return agent_response
 
 class CommunicatorAgent(Agent):
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", job=None):
         print(f"{Fore.BLUE}[{self.name}] Executing CommunicatorAgent...{Style.RESET_ALL}")
-        return super().execute(problem_statement, context)
+        return super().execute(problem_statement, context, job)
 
 # --- Dynamic/DreamTeam Agent with Multi-Instance Approach ---
 class DynamicAgent(Agent):
+    # Near-duplicate elimination before peer review and synthesis; set deduplicate = False to disable
+    deduplicate = True
+    role_similarity_threshold = 0.4
+    paragraph_similarity_threshold = 0.6
+
     def generate_dynamic_expert_definitions(self, problem_statement):
         prompt = f"""
 Based on the following objective, list potential expert roles that could contribute to solving the problem.
@@ -305,7 +584,8 @@ Objective: {problem_statement}
             }
         return definitions
 
-    def extract_required_roles(self, problem_statement):
+    def extract_required_roles(self, problem_statement, max_team_size=None):
+        """max_team_size keeps only the first N selected roles; None: no cap."""
         expert_definitions = self.generate_dynamic_expert_definitions(problem_statement)
         expert_definitions_str = "\n".join([f"{role}: {desc}" for role, desc in expert_definitions.items()])
         role_prompt = f"""
@@ -321,6 +601,10 @@ Objective: {problem_statement}
         roles = [role.strip() for role in role_response.split(",") if role.strip()]
         if not roles:
             roles = list(expert_definitions.keys())
+        if self.deduplicate:
+            roles, expert_definitions, _ = merge_similar_roles(roles, expert_definitions, self.role_similarity_threshold)
+        if max_team_size:
+            roles = roles[:max_team_size]
         return roles, expert_definitions
 
     def instantiate_dynamic_agents(self, required_roles, expert_definitions):
@@ -337,8 +621,9 @@ Objective: {problem_statement}
             dynamic_agent_pool[role] = Agent(role, role, prompt_template)
         return dynamic_agent_pool
 
-    def execute(self, problem_statement, context=""):
-        required_roles, expert_definitions = self.extract_required_roles(problem_statement)
+    def execute(self, problem_statement, context="", job=None, max_team_size=None):
+        """With a job, the dedup stats of the run are kept in job["dedup_stats"]."""
+        required_roles, expert_definitions = self.extract_required_roles(problem_statement, max_team_size)
         dynamic_agent_pool = self.instantiate_dynamic_agents(required_roles, expert_definitions)
 
         team_outputs = {}
@@ -354,6 +639,10 @@ Objective: {problem_statement}
                 print(f"{Fore.RED}[{role} ERROR] {e}{Style.RESET_ALL}")
                 team_outputs[role] = "ERROR"
 
+        if self.deduplicate:
+            team_outputs, dedup_stats = deduplicate_contributions(team_outputs, self.paragraph_similarity_threshold)
+            self.record_dedup_stats(dedup_stats, job)
+
         aggregated_output = "Aggregated Team Contributions:\n"
         for role, output in team_outputs.items():
             aggregated_output += f"\n--- Role: {role} ---\n{output}\n"
@@ -383,30 +672,76 @@ Objective: {problem_statement}
         aggregated_output += "\nEnd of team contributions."
         return aggregated_output
 
-    def execute_with_peer_review(self, problem_statement, context=""):
-        required_roles, expert_definitions = self.extract_required_roles(problem_statement)
+    def execute_with_peer_review(self, problem_statement, context="", job=None, max_team_size=None):
+        # With a job every role's first pass and revision is checkpointed and survives a crash on its own
+        if job is not None:
+            cached = lambda stage, inputs, compute: stages.cached(job["checkpoints"], stage, inputs, compute)
+        else:
+            cached = lambda stage, inputs, compute: compute()
+        required_roles, expert_definitions = cached(
+            "team.roles", [problem_statement, max_team_size], lambda: self.extract_required_roles(problem_statement, max_team_size)
+        )
         dynamic_agent_pool = self.instantiate_dynamic_agents(required_roles, expert_definitions)
 
         # Step 1: Initial execution by each agent
         print(f"{Fore.CYAN}\n[DynamicAgent] Step 1: Initial Agent Outputs{Style.RESET_ALL}")
         first_pass_outputs = {}
-        for role, agent in dynamic_agent_pool.items():
-            formatted_prompt = agent.prompt_template.format(problem=problem_statement, context=context)
-            output = agent.interface.query(formatted_prompt)
-            agent.output = output
-            first_pass_outputs[role] = output
-            print(f"{Fore.LIGHTBLACK_EX}Initial output by {role}:\n{output[:200]}...{Style.RESET_ALL}")
+        with tracing.span("team.first_pass"):
+            for role, agent in dynamic_agent_pool.items():
+                formatted_prompt = agent.prompt_template.format(problem=problem_statement, context=context)
+                output = cached(f"team.first_pass.{role}", [formatted_prompt], lambda: agent.interface.query(formatted_prompt))
+                agent.output = output
+                first_pass_outputs[role] = output
+                print(f"{Fore.LIGHTBLACK_EX}Initial output by {role}:\n{output[:200]}...{Style.RESET_ALL}")
+
+        # Drop redundant paragraphs before they are fanned out to every peer reviewer
+        if self.deduplicate:
+            first_pass_outputs, dedup_stats = deduplicate_contributions(first_pass_outputs, self.paragraph_similarity_threshold)
 
         # Step 2: Peer review loop
         print(f"{Fore.CYAN}\n[DynamicAgent] Step 2: Peer Feedback Rounds{Style.RESET_ALL}")
         refined_outputs = {}
-        for target_role, target_output in first_pass_outputs.items():
-            feedbacks = []
-            for reviewer_role, reviewer_agent in dynamic_agent_pool.items():
-                if reviewer_role == target_role:
+        with tracing.span("team.peer_review"):
+            for target_role, target_output in first_pass_outputs.items():
+                # Out of time: the role keeps its first-pass output
+                if not deadline.allows("team.peer_review", calls=len(dynamic_agent_pool), agent=target_role, detail=target_role):
+                    refined_outputs[target_role] = target_output
                     continue
+                refined_outputs[target_role] = cached(
+                    f"team.revision.{target_role}", [problem_statement, target_output, list(dynamic_agent_pool)],
+                    lambda: self.review_and_revise(problem_statement, target_role, target_output, dynamic_agent_pool)
+                )
 
-                feedback_prompt = f"""
+        # Step 4: Aggregate the final outputs
+        if self.deduplicate:
+            refined_outputs, revision_stats = deduplicate_contributions(refined_outputs, self.paragraph_similarity_threshold)
+            for key in ("chars_before", "chars_after", "paragraphs_removed"):
+                dedup_stats[key] += revision_stats[key]
+            removed = dedup_stats["chars_before"] - dedup_stats["chars_after"]
+            dedup_stats["removed_ratio"] = removed / dedup_stats["chars_before"] if dedup_stats["chars_before"] else 0.0
+            self.record_dedup_stats(dedup_stats, job)
+        print(f"{Fore.CYAN}\n[DynamicAgent] Step 3: Final Aggregated Team Contributions{Style.RESET_ALL}")
+        aggregated_output = "Refined Team Contributions:\n"
+        for role, output in refined_outputs.items():
+            aggregated_output += f"\n--- Role: {role} ---\n{output.strip()}\n"
+        aggregated_output += "\nEnd of improved team collaboration."
+        return aggregated_output
+
+    def record_dedup_stats(self, dedup_stats, job=None):
+        # Per run in job["dedup_stats"]; self.dedup_stats only serves standalone calls
+        if job is not None:
+            job["dedup_stats"] = dedup_stats
+        else:
+            self.dedup_stats = dedup_stats
+
+    def review_and_revise(self, problem_statement, target_role, target_output, dynamic_agent_pool):
+        """One peer-review round for target_role: feedback from every other role, then the revision."""
+        feedbacks = []
+        for reviewer_role, reviewer_agent in dynamic_agent_pool.items():
+            if reviewer_role == target_role:
+                continue
+
+            feedback_prompt = f"""
     You are acting as a peer expert '{reviewer_role}' reviewing a fellow expert '{target_role}'.
 
     Review their output below and suggest up to 2 improvements or corrections. Focus on alignment with the goal, missing data, clarity, and consistency.
@@ -416,12 +751,12 @@ Objective: {problem_statement}
 
     Return your feedback in 1–2 bullet points. Use plain text only.
     """
-                feedback = reviewer_agent.interface.query(feedback_prompt)
-                feedbacks.append(f"- {reviewer_role}: {feedback.strip()}")
+            feedback = reviewer_agent.interface.query(feedback_prompt)
+            feedbacks.append(f"- {reviewer_role}: {feedback.strip()}")
 
-            # Step 3: Let the original agent revise their response
-            combined_feedback = "\n".join(feedbacks)
-            revision_prompt = f"""
+        # Step 3: Let the original agent revise their response
+        combined_feedback = "\n".join(feedbacks)
+        revision_prompt = f"""
     You are the expert '{target_role}'. Based on the original objective and the feedback from your peers, revise your response to make it more clear, accurate, and actionable.
 
     **Original Objective:**
@@ -435,17 +770,9 @@ Objective: {problem_statement}
 
     Return only your revised and improved response as plain text.
     """
-            revised_response = dynamic_agent_pool[target_role].interface.query(revision_prompt)
-            refined_outputs[target_role] = revised_response
-            print(f"{Fore.GREEN}\n✅ {target_role} Revised Output:\n{revised_response[:300]}...{Style.RESET_ALL}")
-
-        # Step 4: Aggregate the final outputs
-        print(f"{Fore.CYAN}\n[DynamicAgent] Step 3: Final Aggregated Team Contributions{Style.RESET_ALL}")
-        aggregated_output = "Refined Team Contributions:\n"
-        for role, output in refined_outputs.items():
-            aggregated_output += f"\n--- Role: {role} ---\n{output.strip()}\n"
-        aggregated_output += "\nEnd of improved team collaboration."
-        return aggregated_output
+        revised_response = dynamic_agent_pool[target_role].interface.query(revision_prompt)
+        print(f"{Fore.GREEN}\n✅ {target_role} Revised Output:\n{revised_response[:300]}...{Style.RESET_ALL}")
+        return revised_response
 
 
 class SynthesizerAgent(Agent):
@@ -470,12 +797,157 @@ Return only the unified plan as plain text.
         prompt = self.prompt_template.format(problem=refined_problem, context=team_contributions)
         return self.interface.query(prompt)
 
+    def synthesize_tree(self, refined_problem, team_contributions, fan_in=2, max_depth=None, max_input_chars=6000):
+        """
+        Tree-reduce synthesis for large teams: contributions are merged in groups of
+        fan_in in parallel, the partial plans are merged again level by level, and the
+        final (at most fan_in) partial plans go through the regular synthesize() prompt.
+        An input longer than max_input_chars is split at paragraph breaks into extra leaves
+        instead of being cut, so every prompt stays bounded by roughly fan_in * max_input_chars
+        without dropping content, and latency grows with log_fan_in(team size).
+        max_depth caps the merge levels; a team that needs more raises ValueError, before
+        any merge call when the contributions alone already need more.
+        """
+        fan_in = max(fan_in, 2)
+        pieces = self.split_oversized(self.split_contributions(team_contributions), max_input_chars)
+        levels = len(self.merge_levels(len(pieces), fan_in))
+        if max_depth is not None and levels > max_depth:
+            raise ValueError(f"synthesis max_depth {max_depth} is too shallow for {len(pieces)} contributions "
+                             f"with fan_in {fan_in}: {levels} merge levels are needed")
+        depth = 0
+        while len(pieces) > fan_in:
+            if max_depth is not None and depth >= max_depth:
+                raise ValueError(f"synthesis max_depth {max_depth} reached with {len(pieces)} partial plans left "
+                                 f"(fan_in {fan_in})")
+            groups = [pieces[i:i + fan_in] for i in range(0, len(pieces), fan_in)]
+            print(f"{Fore.BLUE}🧠 [SynthesizerAgent] Merge level {depth+1}: {len(pieces)} inputs → {len(groups)} partial plans{Style.RESET_ALL}")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(groups)) as executor:
+                merged = list(executor.map(
+                    llm_usage.propagate(lambda group: self.merge_group(refined_problem, group)), groups
+                ))
+            merged_pieces = self.split_oversized([
+                (" + ".join(label for label, _ in group), output)
+                for group, output in zip(groups, merged)
+            ], max_input_chars)
+            if len(merged_pieces) >= len(pieces):
+                # Every merge came back as long as its inputs (e.g. failed calls fell back to concatenation)
+                raise RuntimeError(f"Merge level {depth+1} did not reduce {len(pieces)} inputs")
+            pieces = merged_pieces
+            depth += 1
+
+        partial_plans = "\n".join(
+            f"\n--- Partial Plan: {label} ---\n{output.strip()}\n" for label, output in pieces
+        )
+        return self.synthesize(refined_problem, partial_plans)
+
+    @staticmethod
+    def merge_levels(pieces, fan_in=2):
+        """(merge calls, groups) per level of synthesize_tree for that many contributions."""
+        fan_in = max(fan_in, 2)
+        levels = []
+        while pieces > fan_in:
+            groups = math.ceil(pieces / fan_in)
+            levels.append((pieces // fan_in + (1 if pieces % fan_in > 1 else 0), groups))
+            pieces = groups
+        return levels
+
+    def merge_group(self, refined_problem, group):
+        """Merges one group of (label, text) contributions into a single partial plan."""
+        if len(group) == 1:
+            return group[0][1]
+        contributions = "\n".join(
+            f"\n--- {label} ---\n{text.strip()}\n" for label, text in group
+        )
+        prompt = f"""
+You are a synthesis expert. Merge the following expert contributions into one consolidated partial plan for the refined objective.
+Keep every concrete recommendation, figure, risk and owner; drop repetition. Keep the partial plan under 600 words.
+
+**Refined Objective:**
+{refined_problem}
+
+**Contributions:**
+{contributions}
+
+Return only the merged partial plan as plain text.
+"""
+        merged = self.interface.query(prompt)
+        if merged == "ERROR" or not merged.strip():
+            # Fall back to concatenation so no contribution is lost
+            return contributions
+        return merged
+
+    @staticmethod
+    def split_oversized(pieces, max_input_chars):
+        """
+        Splits every (label, text) piece longer than max_input_chars into parts labelled
+        "<label> (part i/n)", cut at the last paragraph, line or word break that fits.
+        """
+        result = []
+        for label, text in pieces:
+            parts, text = [], text.strip()
+            while len(text) > max_input_chars:
+                cut = max_input_chars
+                for separator in ("\n\n", "\n", " "):
+                    if text.rfind(separator, 0, max_input_chars) > 0:
+                        cut = text.rfind(separator, 0, max_input_chars)
+                        break
+                parts.append(text[:cut].rstrip())
+                text = text[cut:].lstrip()
+            parts.append(text)
+            if len(parts) == 1:
+                result.append((label, text))
+            else:
+                result.extend((f"{label} (part {i}/{len(parts)})", part) for i, part in enumerate(parts, 1))
+        return result
+
+    @staticmethod
+    def split_contributions(team_contributions):
+        """
+        Splits DynamicAgent's aggregated output ("--- Role: X ---" sections) into a list of
+        (role, text) pairs. Unstructured text is returned as a single contribution.
+        """
+        sections = re.split(r"\n--- Role: (.+?) ---\n", team_contributions)
+        if len(sections) < 3:
+            return [("Team", team_contributions)]
+        pieces = []
+        for role, text in zip(sections[1::2], sections[2::2]):
+            text = re.sub(r"\n*End of (improved team collaboration|team contributions)\.\s*$", "", text)
+            pieces.append((role.strip(), text.strip()))
+        return pieces
+
 
 # --- Multi-Agent System Controller ---
 
+# Agent name → class for MultiAgentSystem.load_agents; other names get a plain Agent.
+# Plugins add their own classes with AGENT_CLASSES.register(name, cls).
+AGENT_CLASSES = AgentRegistry(Agent, {
+    "PromptRefinerAgent": PromptRefinerAgent,
+    "EvaluatorAgent": EvaluatorAgent,
+    "ResponseCritiqueAgent": ResponseCritiqueAgent,
+    "CommunicatorAgent": CommunicatorAgent,
+    "DynamicAgent": DynamicAgent,
+    "SynthesizerAgent": SynthesizerAgent,
+})
+
+
 class MultiAgentSystem:
-    def __init__(self, config_file="agents_config.json"):
-        self.agents = {}
+    # Batch runs share one console across many problems and switch this off
+    clear_console_on_run = True
+
+    def __init__(self, config_file="agents_config.json", refinement_mode=settings.CONFIG, critique_mode=settings.CONFIG,
+                 synthesis_mode=settings.CONFIG, synthesis_fan_in=settings.CONFIG, synthesis_max_depth=settings.CONFIG,
+                 checkpoint_dir=settings.CONFIG, peer_review=True, trace_dir=settings.CONFIG, max_team_size=None):
+        self.agents = LazyAgents(AGENT_CLASSES)  # built on first use, then reused across runs
+        self.checkpoint_dir = settings.value("checkpoint_dir", checkpoint_dir)  # None disables checkpoints
+        self.peer_review = peer_review  # False: one pass per expert role, no peer feedback rounds
+        self.max_team_size = max_team_size  # cap on the expert roles per run; None: as many as selected
+        self.trace_dir = settings.value("trace_dir", trace_dir)  # None: spans are analyzed but no trace file is written
+        self.refinement_mode = settings.value("refinement_mode", refinement_mode)  # "sequential" or "best_of_n"
+        self.critique_mode = settings.value("critique_mode", critique_mode)  # "sequential" or "tournament"
+        self.synthesis_mode = settings.value("synthesis_mode", synthesis_mode)  # "single" or "tree"
+        self.synthesis_fan_in = settings.value("synthesis_fan_in", synthesis_fan_in)
+        self.synthesis_max_depth = settings.value("synthesis_max_depth", synthesis_max_depth)
+        self.prescreen_settings = settings.get("prescreen", {})  # every job screens with its own HeuristicPreEvaluator
         self.agent_cache = {}
         self.load_agents(config_file)
         self.session = Session(session_id="session_001", domain="Dynamic")
@@ -540,21 +1012,7 @@ class MultiAgentSystem:
             }
         }
 
-        for name, details in agent_configs.items():
-            if name == "PromptRefinerAgent":
-                self.agents[name] = PromptRefinerAgent(name, details["role"], details["prompt_template"])
-            elif name == "EvaluatorAgent":
-                self.agents[name] = EvaluatorAgent(name, details["role"], details["prompt_template"])
-            elif name == "ResponseCritiqueAgent":
-                self.agents[name] = ResponseCritiqueAgent(name, details["role"], details["prompt_template"])
-            elif name == "CommunicatorAgent":
-                self.agents[name] = CommunicatorAgent(name, details["role"], details["prompt_template"])
-            elif name == "DynamicAgent":
-                self.agents[name] = DynamicAgent(name, details["role"], details["prompt_template"])
-            elif name == "SynthesizerAgent":
-                self.agents[name] = SynthesizerAgent(name, details["role"], details.get("prompt_template"))
-            else:
-                self.agents[name] = Agent(name, details["role"], details["prompt_template"])
+        self.agents = LazyAgents(AGENT_CLASSES, agent_configs)
     
     def clear_console(self):
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -624,54 +1082,244 @@ class MultiAgentSystem:
         return aggregated_output
 
         
-    def run(self, problem_statement, domain="General"):
-        self.clear_console()
+    def run(self, problem_statement, domain="General", resume=None, deadline=None):
+        """Solves one problem and returns the final output; see run_with_report() for the arguments."""
+        return self.run_with_report(problem_statement, domain, resume, deadline)["output"]
+
+    def run_with_report(self, problem_statement, domain="General", resume=None, deadline=None):
+        """
+        resume is the session ID of an interrupted run: stages (and, inside the team stage,
+        single role outputs) whose checkpointed inputs still match are replayed from disk.
+        deadline is a time budget in seconds: once the rest of the run would not fit, further
+        refinement attempts, peer review rounds and critique iterations are skipped.
+        Returns {"output", "session_id", "prescreen", "checkpoints", "llm_usage", "trace",
+        "deadline"}; nothing about the run is left on the system, so runs can overlap.
+        """
+        if self.clear_console_on_run:
+            self.clear_console()
         print("\n==== Multi-Agent System Started ====\n")
-        self.session = Session(session_id=f"session_{int(time.time())}", domain=domain)
-        reset_context(self.session)
+        started = time.time()
+        job = self.new_job(problem_statement, domain, session_id=resume, deadline=deadline)
+        session = job["session"]
+        if job["checkpoints"].enabled:
+            print(f"{Fore.CYAN}[Checkpoint] Session {session.session_id} → {job['checkpoints'].directory} "
+                  f"(resume with run(..., resume=\"{session.session_id}\")){Style.RESET_ALL}")
+
+        for stage in PIPELINE_STAGES:
+            self.run_stage(stage, job)
+
+        final_output = job["final_output"]
+        job["prescreen"] = job["pre_evaluator"].report()
+        report = {
+            "output": final_output,
+            "session_id": session.session_id,
+            "prescreen": job["prescreen"],
+            "checkpoints": job["checkpoints"].report(),
+            "llm_usage": job["usage"].report(),
+            "trace": evaluation.finish_trace(job["tracer"], self.trace_dir),
+            "deadline": job["deadline"].report() if job["deadline"] else None,
+        }
+        metrics.record_run("dreamteam", started)
+        print("\n==== Multi-Agent System Completed ====\n")
+        print("\n===== Final Solution (Dream Team Approach) =====\n")
+        print(final_output)
+        return report
+
+    def plan(self, problem_statement, domain="General", peer_review=None, max_team_size=None, budget_s=None):
+        """
+        Dry run of run(problem_statement, domain): stages, LLM calls, tokens and wall time,
+        calibrated from the traces in trace_dir (see planner.py). No LLM is called.
+        peer_review and max_team_size default to this system's settings. With budget_s the
+        plan also lists every peer review / team cap combination and recommends the most
+        thorough one whose expected wall time fits: the largest team first, dropping peer
+        review before dropping an expert.
+        """
+        model = planner.load_model(self.trace_dir)
+        peer_review = self.peer_review if peer_review is None else peer_review
+        max_team_size = self.max_team_size if max_team_size is None else max_team_size
+        result = self.build_plan(problem_statement, domain, model, peer_review, max_team_size).as_dict()
+        result["options"]["budget_s"] = budget_s
+        if budget_s is not None:
+            largest = max(1, math.ceil(result["team_size"]["worst"]))
+            candidates = [
+                ({"peer_review": review, "max_team_size": size},
+                 self.build_plan(problem_statement, domain, model, review, size).as_dict())
+                for size in range(largest, 0, -1) for review in (True, False)
+                if not (review and size == 1)  # a lone expert has no peers
+            ]
+            result["alternatives"] = [
+                dict(options, seconds=alternative["total"]["seconds"], worst_seconds=alternative["total"]["worst_seconds"],
+                     calls=alternative["total"]["calls"])
+                for options, alternative in candidates
+            ]
+            result["recommendation"] = planner.recommend(candidates, budget_s)
+            result["tunable"] = ["peer_review", "max_team_size"]
+        return result
+
+    def build_plan(self, problem_statement, domain, model, peer_review, max_team_size):
+        runs = model.runs_with("DynamicAgent")
+        known = set(self.agents)
+        sizes = model.team_sizes(runs, known) or [4]  # the fallback expert definitions have four roles
+        team, worst_team = sum(sizes) / len(sizes), max(sizes)
+        if max_team_size:
+            team, worst_team = min(team, max_team_size), min(worst_team, max_team_size)
+        experts = model.other_agents(runs, known)
+
+        plan = planner.Plan("dreamteam", problem_statement, model, domain=domain, peer_review=peer_review,
+                            max_team_size=max_team_size, refinement_mode=self.refinement_mode,
+                            synthesis_mode=self.synthesis_mode, critique_mode=self.critique_mode)
+        plan.stage("refine")
+        if "PromptRefinerAgent" in self.agents:
+            plan.add_refinement("PromptRefinerAgent", self.refinement_mode, settings.value("max_refinement_attempts"),
+                                settings.value("refinement_candidates"), runs)
+        plan.stage("team")
+        if "DynamicAgent" in self.agents:
+            plan.add("DynamicAgent", 2, note="expert definitions and role selection")
+            plan.add("experts", team, worst=worst_team, cost_of=experts, note="first pass")
+            if peer_review:
+                plan.add("experts", team * team, worst=worst_team * worst_team, cost_of=experts,
+                         note="n·(n-1) peer feedback calls and n revisions")
+        plan.stage("synthesize")
+        if "SynthesizerAgent" in self.agents:
+            if self.synthesis_mode == "tree":
+                expected_levels = SynthesizerAgent.merge_levels(round(team), self.synthesis_fan_in)
+                worst_levels = SynthesizerAgent.merge_levels(worst_team, self.synthesis_fan_in)
+                max_depth = self.synthesis_max_depth
+                for level, (calls, groups) in enumerate(worst_levels):
+                    expected = expected_levels[level][0] if level < len(expected_levels) else 0
+                    beyond = max_depth is not None and level >= max_depth
+                    plan.add("SynthesizerAgent", expected, worst=calls, parallel=groups,
+                             note=f"merge level {level + 1}{' (beyond max_depth: such a team is rejected)' if beyond else ''}")
+            plan.add("SynthesizerAgent", 1)
+        plan.stage("evaluate")
+        if "EvaluatorAgent" in self.agents:
+            # The pre-screen skips some evaluator calls; history shows how often critique kicks in
+            critiques = plan.expected(runs, "ResponseCritiqueAgent", 1)
+            evaluations = plan.expected(runs, "EvaluatorAgent", 1 + critiques)
+            if self.critique_mode == "tournament":
+                plan.add("EvaluatorAgent", evaluations, worst=2, note="grade, then one batched tournament grading")
+                plan.add("ResponseCritiqueAgent", critiques, worst=3, parallel=3, note="concurrent critiques below 85%")
+            else:
+                plan.add("EvaluatorAgent", evaluations, worst=4, note="grade and re-grade per critique")
+                plan.add("ResponseCritiqueAgent", critiques, worst=3, note="up to 3 iterations below 85%")
+        plan.stage("communicate")
+        if "CommunicatorAgent" in self.agents:
+            plan.add("CommunicatorAgent", 1)
+        plan.details["team_size"] = {"expected": round(team, 2), "worst": worst_team, "history_runs": len(runs)}
+        return plan
+
+    def new_job(self, problem_statement, domain="General", session_id=None, deadline=None):
+        """
+        State of one problem as it moves through the stages. Everything a run writes lives
+        here, never on the shared agents, so jobs can overlap (see run_pipeline).
+        """
+        session = Session(session_id=session_id or f"session_{int(time.time())}_{uuid.uuid4().hex[:6]}", domain=domain)
+        reset_context(session)
+        usage = llm_usage.UsageLog(session.session_id)
+        return {
+            "problem": problem_statement,
+            "domain": domain,
+            "session": session,
+            "checkpoints": CheckpointStore(session.session_id, self.checkpoint_dir),
+            "usage": usage,
+            "deadline": Deadline.for_run(deadline, DEADLINE_RESERVE_CALLS, usage, self.trace_dir),
+            "tracer": tracing.Tracer(session.session_id),
+            "pre_evaluator": HeuristicPreEvaluator(**self.prescreen_settings),
+            "outputs": {},  # agent name → latest output in this run
+            "feedback": {},  # agent name → evaluator feedback notes of this run
+            "dedup_stats": None,
+            "stage_times": {},
+        }
+
+    def run_stage(self, stage, job):
+        """Runs one stage of job, or replays it from its checkpoint when its inputs are unchanged."""
+        input_keys, output_keys = PIPELINE_STAGE_IO[stage]
+        options = [self.refinement_mode, self.peer_review, self.synthesis_mode, self.synthesis_fan_in,
+                   self.synthesis_max_depth, self.critique_mode, self.max_team_size]
+        inputs = [job[key] for key in input_keys] + options
+
+        def execute():
+            getattr(self, f"stage_{stage}")(job)
+            return {key: job[key] for key in output_keys}
+
+        with llm_usage.track(job["usage"]), tracing.activate(job["tracer"].root), deadline.activate(job["deadline"]):
+            job.update(stages.cached(job["checkpoints"], stage, inputs, execute))
 
-        # Step 1: Refine problem
+    # Step 1: Refine problem
+    def stage_refine(self, job):
+        problem_statement = job["problem"]
         if "PromptRefinerAgent" in self.agents:
             print(f"{Fore.BLUE}🔄 Running PromptRefinerAgent...{Style.RESET_ALL}")
-            refined_problem, confidence = self.agents["PromptRefinerAgent"].refine_problem_statement(problem_statement)
-            self.session.refined_objective = refined_problem  # <--- save into session
+            if self.refinement_mode == "best_of_n":
+                refined_problem, confidence = self.agents["PromptRefinerAgent"].refine_problem_statement_best_of_n(problem_statement)
+            else:
+                refined_problem, confidence = self.agents["PromptRefinerAgent"].refine_problem_statement(problem_statement)
+            job["session"].refined_objective = refined_problem  # <--- save into session
+            metrics.CONFIDENCE_SCORES.labels(system="dreamteam", source="refinement").observe(confidence)
             print(f"{Fore.CYAN}Refined Objective (Confidence {confidence}%):\n{refined_problem}{Style.RESET_ALL}")
         else:
             refined_problem = problem_statement
+        job["refined_problem"] = refined_problem
 
-        # Step 2: Run Dream Team
+    # Step 2: Run Dream Team
+    def stage_team(self, job):
         if "DynamicAgent" in self.agents:
             print(f"{Fore.BLUE}🔄 Running DynamicAgent (Dream Team Assembler)...{Style.RESET_ALL}")
-            dynamic_output = self.agents["DynamicAgent"].execute_with_peer_review(refined_problem)
-#            dynamic_output = self.agents["DynamicAgent"].execute(refined_problem)
+            if self.peer_review:
+                dynamic_output = self.agents["DynamicAgent"].execute_with_peer_review(
+                    job["refined_problem"], job=job, max_team_size=self.max_team_size
+                )
+            else:
+                dynamic_output = self.agents["DynamicAgent"].execute(job["refined_problem"], job=job, max_team_size=self.max_team_size)
         else:
             dynamic_output = "DynamicAgent not found."
+        job["dynamic_output"] = dynamic_output
 
-        # Step 3: Synthesize outputs into unified plan
+    # Step 3: Synthesize outputs into unified plan
+    def stage_synthesize(self, job):
+        refined_problem, dynamic_output = job["refined_problem"], job["dynamic_output"]
         if "SynthesizerAgent" in self.agents:
             print(f"{Fore.BLUE}🧠 Running SynthesizerAgent...{Style.RESET_ALL}")
-            synthesized = self.agents["SynthesizerAgent"].synthesize(refined_problem, dynamic_output)
+            if self.synthesis_mode == "tree":
+                synthesized = self.agents["SynthesizerAgent"].synthesize_tree(
+                    refined_problem, dynamic_output, self.synthesis_fan_in, self.synthesis_max_depth
+                )
+            else:
+                synthesized = self.agents["SynthesizerAgent"].synthesize(refined_problem, dynamic_output)
         else:
             synthesized = dynamic_output
+        job["synthesized"] = synthesized
 
-        # Step 3: Evaluate and refine iteratively
-        best_output = synthesized
+    # Step 4: Evaluate and refine iteratively
+    def stage_evaluate(self, job):
+        refined_problem, dynamic_output = job["refined_problem"], job["dynamic_output"]
+        best_output = job["synthesized"]
 #        best_output = dynamic_output
         best_score = 0
 
         if "EvaluatorAgent" in self.agents:
-            evaluation_output = self.agents["EvaluatorAgent"].execute("DynamicAgent", dynamic_output, refined_problem)
-            confidence_score = self.extract_confidence_score(evaluation_output)
+            confidence_score, evaluation_output = self.screen_and_evaluate("DynamicAgent", dynamic_output, refined_problem, job)
             best_score = confidence_score
             iteration = 0
-
-            while confidence_score < 85 and iteration < 3:
-                print(f"{Fore.YELLOW}[{datetime.datetime.now()}] 🔄 Refining response due to low confidence ({confidence_score}%)...{Style.RESET_ALL}")
-                refined = self.agents["ResponseCritiqueAgent"].execute("DynamicAgent", best_output)
-                self.agents["DynamicAgent"].update_from_feedback(refined, evaluation_output)
-
-                evaluation_output = self.agents["EvaluatorAgent"].execute("DynamicAgent", refined, refined_problem)
-                confidence_score = self.extract_confidence_score(evaluation_output)
+            # Tournament mode replaces the serial critique loop with one concurrent round
+            max_iterations = 0 if self.critique_mode == "tournament" else 3
+
+            if self.critique_mode == "tournament" and best_score < 85 and deadline.allows("evaluate.tournament", calls=2):
+                with tracing.span("evaluate.tournament"):
+                    best_output, best_score = evaluation.run_critique_tournament(
+                        self.agents, "DynamicAgent", best_output, best_score, refined_problem, settings.CONFIG,
+                        on_feedback=lambda name, response, feedback: self.agents[name].update_from_feedback(response, feedback, job)
+                    )
+
+            while confidence_score < 85 and iteration < max_iterations:
+                if not deadline.allows("evaluate.critique", calls=2, detail=f"iteration {iteration + 1}"):
+                    break
+                with tracing.span(f"evaluate.iteration.{iteration + 1}"):
+                    print(f"{Fore.YELLOW}[{datetime.datetime.now()}] 🔄 Refining response due to low confidence ({confidence_score}%)...{Style.RESET_ALL}")
+                    refined = self.agents["ResponseCritiqueAgent"].execute("DynamicAgent", best_output)
+                    self.agents["DynamicAgent"].update_from_feedback(refined, evaluation_output, job)
+
+                    confidence_score, evaluation_output = self.screen_and_evaluate("DynamicAgent", refined, refined_problem, job)
 
                 if confidence_score > best_score:
                     best_output = refined
@@ -680,21 +1328,112 @@ class MultiAgentSystem:
                 iteration += 1
 
             print(f"{Fore.GREEN}[{datetime.datetime.now()}] ✅ Final Confidence Score: {best_score}%{Style.RESET_ALL}")
+            metrics.CONFIDENCE_SCORES.labels(system="dreamteam", source="evaluation").observe(best_score)
         else:
             best_output = dynamic_output
+        job["best_output"], job["best_score"] = best_output, best_score
 
-        # Step 4: Final CommunicatorAgent polish
+    # Step 5: Final CommunicatorAgent polish
+    def stage_communicate(self, job):
+        best_output = job["best_output"]
         if "CommunicatorAgent" in self.agents:
-            final_output = self.agents["CommunicatorAgent"].execute(best_output, context=refined_problem)
+            final_output = self.agents["CommunicatorAgent"].execute(best_output, context=job["refined_problem"], job=job)
  #           final_output = self.agents["CommunicatorAgent"].execute(best_output)
         else:
             final_output = best_output
+        job["final_output"] = final_output
+
+    def run_pipeline(self, problems, stage_workers=None, on_complete=None):
+        """
+        Solves many problems with stage-level pipelining: every stage in PIPELINE_STAGES has
+        its own queue and worker threads (stage_workers overrides PIPELINE_STAGE_WORKERS),
+        so while one problem is in the team stage the next one is already being refined.
+        problems is a list of plain problem strings, (problem, domain) tuples or (problem, domain,
+        deadline) tuples; a deadline in seconds bounds that problem from its submission on and its
+        report lands in job["deadline_report"].
+        on_complete(index, job) is called from the last stage as each problem finishes.
+        Returns the finished jobs in input order; a failed job has "error" set and no "final_output".
+        Jobs share no state, so each one carries its own pre-screen stats in job["prescreen"].
+        """
+        stage_workers = dict(PIPELINE_STAGE_WORKERS, **(stage_workers or {}))
+        queues = [queue.Queue() for _ in PIPELINE_STAGES]
+        done = queue.Queue()
+
+        def worker(stage_index):
+            stage = PIPELINE_STAGES[stage_index]
+            inbox = queues[stage_index]
+            outbox = queues[stage_index + 1] if stage_index + 1 < len(PIPELINE_STAGES) else done
+            while True:
+                item = inbox.get()
+                if item is None:
+                    break
+                index, job = item
+                if "error" not in job:
+                    start_time = time.time()
+                    try:
+                        self.run_stage(stage, job)
+                    except Exception as e:
+                        print(f"{Fore.RED}[Pipeline] Problem {index} failed in stage '{stage}': {e}{Style.RESET_ALL}")
+                        job["error"] = f"{stage}: {type(e).__name__}: {e}"
+                    job["stage_times"][stage] = time.time() - start_time
+                outbox.put((index, job))
+
+        threads = []
+        for stage_index, stage in enumerate(PIPELINE_STAGES):
+            for _ in range(max(1, stage_workers.get(stage, 1))):
+                thread = threading.Thread(target=worker, args=(stage_index,), name=f"pipeline-{stage}", daemon=True)
+                thread.start()
+                threads.append((stage_index, thread))
+
+        started = time.time()
+        for index, item in enumerate(problems):
+            item = (item,) if isinstance(item, str) else tuple(item)
+            problem_statement, domain, budget = item + ("General", None)[len(item) - 1:]
+            job = self.new_job(problem_statement, domain, deadline=budget)
+            job["submitted_at"] = time.time()
+            queues[0].put((index, job))
+
+        results = [None] * len(problems)
+        for _ in range(len(problems)):
+            index, job = done.get()
+            job["latency"] = time.time() - job["submitted_at"]
+            job["trace"] = evaluation.finish_trace(job["tracer"], self.trace_dir, quiet=True)
+            job["prescreen"] = job["pre_evaluator"].report()
+            job["deadline_report"] = job["deadline"].report() if job["deadline"] else None
+            metrics.record_run("dreamteam", job["submitted_at"], "error" if "error" in job else "ok")
+            results[index] = job
+            print(f"{Fore.GREEN}[Pipeline] Problem {index} {'failed' if 'error' in job else 'completed'} "
+                  f"in {job['latency']:.1f}s{Style.RESET_ALL}")
+            if on_complete:
+                on_complete(index, job)
+
+        # Shut the stages down front to back so every queue is drained first
+        for stage_index in range(len(PIPELINE_STAGES)):
+            for thread_stage, _ in threads:
+                if thread_stage == stage_index:
+                    queues[stage_index].put(None)
+            for thread_stage, thread in threads:
+                if thread_stage == stage_index:
+                    thread.join()
+
+        wall_time = time.time() - started
+        busy = {stage: sum(job["stage_times"].get(stage, 0) for job in results) for stage in PIPELINE_STAGES}
+        print(f"{Fore.CYAN}[Pipeline] {len(results)} problems in {wall_time:.1f}s; stage busy time: "
+              f"{', '.join(f'{stage} {busy[stage]:.1f}s' for stage in PIPELINE_STAGES)}{Style.RESET_ALL}")
+        return results
+
+    def screen_and_evaluate(self, agent_name, agent_response, refined_problem, job):
+        """
+        Runs the job's local pre-screen first and only calls the LLM evaluator for borderline
+        responses. Returns (confidence_score, evaluation_output).
+        """
+        verdict, score, reasons = job["pre_evaluator"].screen(agent_response, refined_problem)
+        if verdict != BORDERLINE:
+            print(f"{Fore.CYAN}[PreEvaluator] {agent_name}: {verdict} ({'; '.join(reasons)}) → LLM evaluation skipped{Style.RESET_ALL}")
+            return score, f"Pre-screen {verdict}: {'; '.join(reasons)}"
+        evaluation_output = self.agents["EvaluatorAgent"].execute(agent_name, agent_response, refined_problem)
+        return self.extract_confidence_score(evaluation_output), evaluation_output
 
-        print("\n==== Multi-Agent System Completed ====\n")
-        print("\n===== Final Solution (Dream Team Approach) =====\n")
-        print(final_output)
-        return final_output
-    
     @staticmethod
     def extract_confidence_score(response_text):
         try:
@@ -715,9 +1454,10 @@ class MultiAgentSystem:
             if match:
                 return float(match.group("val")) * 10
         except Exception as e:
-            print(f"{Fore.RED}❌ Error extracting confidence score: {e}{Style.RESET_ALL}")
+            event_log.event("confidence.error", event_log.ERROR, error=str(e))
 
-        print(f"{Fore.YELLOW}⚠️ Failed to extract confidence score. Defaulting to 50%.{Style.RESET_ALL}")
+        event_log.event("confidence.missing", event_log.WARNING, score=50,
+                        text_preview=event_log.preview(response_text))
         return 50    
         
     def extract_confidence_score_orig(response_text):
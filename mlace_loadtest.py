@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Load generator: drives N concurrent MultiAgentSystem.run calls against an Ollama server
+(the in-process mock from mock_ollama.py by default) and reports throughput and tail
+latency for every concurrency level, to tune worker counts against the server's slots.
+
+Usage:
+    python mlace_loadtest.py --system dreamteam --concurrency 1,2,4,8 --parallel 4 --time-scale 0.05
+    python mlace_loadtest.py --host http://127.0.0.1:11434 --concurrency 1,2   # a real Ollama server
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+import concurrent.futures
+from colorama import Fore, Style
+
+import llm_backend
+import mock_ollama
+from mlace_batch import SYSTEMS, get_system, solve, percentile
+from mlace_benchmark import load_corpus
+
+
+def run_level(system, corpus, concurrency, problems_per_worker, mock=None, quiet=True):
+    """Runs concurrency × problems_per_worker problems with concurrency workers; returns the level's stats."""
+    records = []
+    for index in range(concurrency * problems_per_worker):
+        item = corpus[index % len(corpus)]
+        records.append({"id": f"c{concurrency}-{index}", "problem": item["problem"],
+                        "domain": item.get("domain", "General"), "system": system})
+    before = mock.report() if mock else None
+    if mock:
+        with mock.lock:
+            mock.stats["max_queued"] = mock.stats["max_busy"] = 0
+    started = time.time()
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        # each worker thread builds its MultiAgentSystem once, before its first problem
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, initializer=get_system,
+                                                   initargs=(system,)) as pool:
+            results = list(pool.map(solve, records))
+    wall = time.time() - started
+
+    latencies = [r["latency_s"] for r in results if r["status"] == "ok"]
+    level = {
+        "concurrency": concurrency,
+        "problems": len(results),
+        "failures": sum(1 for r in results if r["status"] != "ok"),
+        "wall_time_s": round(wall, 3),
+        "throughput_per_min": round(len(latencies) / wall * 60, 3) if wall > 0 else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_p99_s": percentile(latencies, 99),
+        "errors": sorted({r["error"] for r in results if r["status"] != "ok"}),
+    }
+    if mock:
+        after = mock.report()
+        level["server"] = {
+            "requests": after["requests"] - before["requests"],
+            "rejected": after["rejected"] - before["rejected"],
+            "errors": after["errors"] - before["errors"],
+            "max_queued": after["max_queued"],
+            "max_busy": after["max_busy"],
+        }
+    return level
+
+
+def print_curve(levels):
+    print(f"\n{Fore.CYAN}{'workers':>8} {'problems':>8} {'failed':>6} {'per min':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+          f"{'queued':>7} {'rejected':>8}{Style.RESET_ALL}")
+    best = max(levels, key=lambda l: l["throughput_per_min"]) if levels else None
+    for level in levels:
+        server = level.get("server", {})
+        colour = Fore.RED if level["failures"] else Fore.GREEN if level is best else ""
+        print(f"{colour}{level['concurrency']:>8} {level['problems']:>8} {level['failures']:>6} "
+              f"{level['throughput_per_min']:>9.2f} {level['latency_p50_s']:>8.2f} {level['latency_p95_s']:>8.2f} "
+              f"{level['latency_p99_s']:>8.2f} {server.get('max_queued', '-'):>7} {server.get('rejected', '-'):>8}"
+              f"{Style.RESET_ALL if colour else ''}")
+    if best:
+        print(f"{Fore.CYAN}Peak throughput at {best['concurrency']} concurrent runs{Style.RESET_ALL}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrency sweep of MultiAgentSystem.run against (mock) Ollama.")
+    parser.add_argument("--system", choices=sorted(SYSTEMS), default="dreamteam")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated concurrent runs per level")
+    parser.add_argument("--problems-per-worker", type=int, default=2)
+    parser.add_argument("--corpus", help="JSONL file of {id, problem, domain}; the benchmark corpus by default")
+    parser.add_argument("--host", help="load an existing Ollama (or mock) server instead of starting a mock")
+    parser.add_argument("--output", help="write the levels as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the agents' console output")
+    mock_ollama.add_model_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = mock = None
+    host = args.host
+    if host is None:
+        server, mock = mock_ollama.serve(port=0, **mock_ollama.model_options(args))
+        host = f"http://127.0.0.1:{server.server_address[1]}"
+    previous = llm_backend.set_backend(llm_backend.OllamaBackend(host=host))
+
+    corpus = load_corpus(args.corpus)
+    levels = []
+    try:
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            print(f"{Fore.CYAN}[LoadTest] {concurrency} concurrent {args.system} runs against {host}{Style.RESET_ALL}")
+            levels.append(run_level(args.system, corpus, concurrency, args.problems_per_worker, mock, not args.verbose))
+    finally:
+        llm_backend.set_backend(previous)
+        if server:
+            server.shutdown()
+            server.server_close()
+    print_curve(levels)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"system": args.system, "host": host, "levels": levels}, f, indent=2)
+        print(f"{Fore.CYAN}[LoadTest] Results written to {args.output}{Style.RESET_ALL}")
+    return 1 if any(level["failures"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,69 +1,137 @@
 import os
-import yfinance as yf
 import json
-import ollama
-import requests
+import llm_backend  # live Ollama by default; record/replay via MLACE_LLM_BACKEND
+import event_log
+import llm_usage
+import metrics
+import settings  # config.json, loaded on first use
+import tracing
+import planner
+import deadline
+import evaluation
+import stages
+from deadline import Deadline, activate as activate_deadline
 import time
 import datetime
 import re
 import hashlib
+import uuid
 import concurrent.futures
 from colorama import Fore, Style
 
 # Import the domain agent functions
 from domain_agent import Session, reset_context
-
-# Load configuration settings
-with open("config.json", "r") as config_file:
-    SETTINGS = json.load(config_file)
-
-CONFIDENCE_THRESHOLD = SETTINGS.get("confidence_threshold", 85)
-MAX_REFINEMENT_ATTEMPTS = SETTINGS.get("max_refinement_attempts", 4)
-MAX_CONFIDENCE_ITERATIONS = SETTINGS.get("max_confidence_iterations", 5)
+from pre_evaluator import HeuristicPreEvaluator
+from checkpoints import CheckpointStore
+from agent_registry import AgentRegistry, LazyAgents
+
+# Each best-of-N candidate is steered towards a different quality so the candidates don't collapse into one answer
+REFINEMENT_FOCI = [
+    "clarity (remove ambiguity and vague wording)",
+    "specificity (measurable targets, constraints and deadlines)",
+    "completeness (missing context, scope and assumptions)",
+    "actionability (concrete, time-bound next steps)",
+]
+
+# Tournament critique candidates each attack a different weakness of the current best output
+CRITIQUE_FOCI = [
+    "clarity and structure",
+    "completeness and missing details",
+    "actionability with specific, measurable recommendations",
+]
 
 # Ollama API Wrapper with robust error handling
 class OllamaInterface:
 #    def __init__(self, model="deepseek-r1", temperature=0.1):
-    def __init__(self, model="llama3.2", temperature=0.1):
+    def __init__(self, model="llama3.2", temperature=0.1, agent=None):
         self.model = model
+        self.agent = agent  # recorded with each call's token counts and timings
 
     def query(self, prompt):
+        started = time.time()
         try:
-            response = ollama.chat(model=self.model, messages=[{"role": "user", "content": prompt}])
+            response = llm_backend.chat(model=self.model, messages=[{"role": "user", "content": prompt}])
+            llm_usage.record(self.agent, self.model, response, time.time() - started)
+            metrics.record_llm_call(self.agent, self.model, response, time.time() - started)
+            tracing.add_span(f"llm {self.agent}", started, agent=self.agent, model=self.model,
+                             prompt_tokens=response.get("prompt_eval_count"), completion_tokens=response.get("eval_count"))
             raw_content = response.get("message", {}).get("content", "")
-            print(f"{Fore.MAGENTA}[LLM Query] {prompt[:200]}...{Style.RESET_ALL}")
-            print(f"{Fore.MAGENTA}[LLM Response] {raw_content[:200]}...{Style.RESET_ALL}")
+            event_log.llm_call(self.agent, self.model, prompt, raw_content, time.time() - started)
             return raw_content
         except Exception as e:
-            print(f"{Fore.RED}[ERROR in OllamaInterface] {e}{Style.RESET_ALL}")
+            llm_usage.record(self.agent, self.model, None, time.time() - started, error=f"{type(e).__name__}: {e}")
+            metrics.record_llm_call(self.agent, self.model, None, time.time() - started, error=e)
+            tracing.add_span(f"llm {self.agent}", started, agent=self.agent, model=self.model, error=str(e))
+            event_log.llm_call(self.agent, self.model, prompt, None, time.time() - started, error=e)
             return "ERROR"
 
+class RunContext:
+    """
+    Per-run execution state: the session, agent outputs, the refined problem and feedback
+    notes added to agent prompts, plus the run's pre-screen stats, checkpoints, LLM usage and trace. Agents
+    themselves only hold their definition (name, role, prompt_template) and LLM client,
+    which a run never modifies, so one loaded MultiAgentSystem can serve parallel runs.
+    """
+    def __init__(self, session, pre_evaluator, checkpoints):
+        self.session = session
+        self.pre_evaluator = pre_evaluator
+        self.checkpoints = checkpoints
+        self.usage = llm_usage.UsageLog(session.session_id)
+        self.tracer = tracing.Tracer(session.session_id)
+        self.refined_problem = None
+        self.outputs = {}   # agent name → latest output in this run
+        self.feedback = {}  # agent name → feedback notes appended to its prompt in this run
+        self.deadline = None  # Deadline of a run(..., deadline=...)
+
+    def prompt_template_for(self, agent):
+        """The agent's template as this run sees it: refined problem and feedback appended."""
+        template = agent.prompt_template
+        if self.refined_problem is not None and agent.name != "PromptRefinerAgent":
+            template += f"\n\nRefined Problem Statement:\n{self.refined_problem}"
+        return template + "".join(self.feedback.get(agent.name, []))
+
+
 # In the base Agent class, add a method to update internal state from feedback
 class Agent:
     def __init__(self, name, role, prompt_template):
         self.name = name
         self.role = role
         self.prompt_template = prompt_template
-        self.interface = OllamaInterface()
+        self.interface = OllamaInterface(agent=name)
         self.output = None
         self.improvement_history = []  # Track improvements over time
 
-    def execute(self, problem_statement, context=""):
-        prompt = self.prompt_template.format(problem=problem_statement, context=context)
+    def execute(self, problem_statement, context="", run=None):
+        template = run.prompt_template_for(self) if run is not None else self.prompt_template
+        prompt = template.format(problem=problem_statement, context=context)
         try:
-            self.output = self.interface.query(prompt)
+            output = self.interface.query(prompt)
         except Exception as e:
             print(f"{Fore.RED}[{self.name} ERROR] {e}{Style.RESET_ALL}")
-            self.output = "ERROR"
-        return self.output
+            output = "ERROR"
+        # Within a run the output belongs to the run; self.output only serves standalone calls
+        if run is not None:
+            run.outputs[self.name] = output
+        else:
+            self.output = output
+        return output
 
-    def update_from_feedback(self, refined_response, evaluator_feedback):
+    def update_from_feedback(self, refined_response, evaluator_feedback, run=None):
         """
         Update the agent's prompt_template (or internal state) based on feedback.
         This could involve appending clarifications or adjustments to the prompt.
+        Within a run the note is kept in the run context and the agent itself is left untouched.
         """
         # Example: Append a note to the prompt template to guide future responses.
         feedback_note = f"\n\n[Feedback Update]: {evaluator_feedback.strip()}"
+        if run is not None:
+            notes = run.feedback.setdefault(self.name, [])
+            if feedback_note not in notes:
+                notes.append(feedback_note)
+                print(f"{Fore.GREEN}[{self.name}] Prompt updated with feedback for this run.{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.CYAN}[{self.name}] Feedback already integrated.{Style.RESET_ALL}")
+            return
         if feedback_note not in self.prompt_template:
             self.prompt_template += feedback_note
             self.improvement_history.append(feedback_note)
@@ -91,47 +159,86 @@ class Agent_old:
 
 # PromptRefinerAgent: iteratively refines the problem statement
 class PromptRefinerAgent(Agent):
-    def refine_problem_statement(self, original_problem, max_attempts=MAX_REFINEMENT_ATTEMPTS):
+    def refine_problem_statement(self, original_problem, max_attempts=settings.CONFIG):
+        max_attempts = settings.value("max_refinement_attempts", max_attempts)
         refined_problem = original_problem
         confidence_score = 50  # Default to 50% if no score is extracted
 
         for attempt in range(max_attempts):
+            if not deadline.allows("refine.attempt", agent=self.name, detail=f"attempt {attempt+1}"):
+                return refined_problem, extracted_confidence if attempt else confidence_score
             print(f"{Fore.YELLOW}[PromptRefinerAgent] Refinement Attempt {attempt+1}/{max_attempts}{Style.RESET_ALL}")
 
             # Explicitly ask the LLM to provide a confidence score in its response
-            prompt = f"""
-            Refine the following problem statement to improve clarity, specificity, and completeness.
-            
-            **Original Problem Statement:**
-            {refined_problem}
-            
-            After refinement, provide:
-            1. The improved problem statement.
-            2. A **confidence score (0-100%)** indicating how well the refinement improves clarity, specificity, and completeness.
-
-            **Response Format:**
-            ```
-            Refined Problem Statement: [Your refined statement here]
-            Confidence Score: [X%]
-            ```
-            """
+            prompt = self.build_refinement_prompt(refined_problem)
 
             llm_response = self.interface.query(prompt)
 
             # Extract confidence score and refined statement
             refined_problem, extracted_confidence = self.extract_confidence_score(llm_response)
 
-            if extracted_confidence >= CONFIDENCE_THRESHOLD:
+            if extracted_confidence >= settings.value("confidence_threshold"):
                 print(f"{Fore.GREEN}[PromptRefinerAgent] Confidence {extracted_confidence}% → Final Refinement Achieved.{Style.RESET_ALL}")
+                metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(attempt + 1)
                 return refined_problem, extracted_confidence
 
             if refined_problem.strip() == original_problem.strip():
                 print(f"{Fore.CYAN}[PromptRefinerAgent] No significant refinement detected. Stopping early.{Style.RESET_ALL}")
+                metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(attempt + 1)
                 return refined_problem, extracted_confidence
 
         print(f"{Fore.RED}[PromptRefinerAgent] Max Refinement Attempts Reached. Using Best Version.{Style.RESET_ALL}")
+        metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(max_attempts)
         return refined_problem, extracted_confidence
 
+    def refine_problem_statement_best_of_n(self, original_problem, n_candidates=settings.CONFIG):
+        """
+        Generates n candidate refinements concurrently, each steered towards a different
+        focus, and keeps the candidate with the highest confidence score.
+        Costs one round trip instead of up to max_attempts sequential ones.
+        """
+        n_candidates = settings.value("refinement_candidates", n_candidates)
+        if not deadline.allows("refine.best_of_n", agent=self.name):
+            return original_problem, 50
+        print(f"{Fore.YELLOW}[PromptRefinerAgent] Generating {n_candidates} candidate refinements concurrently{Style.RESET_ALL}")
+        prompts = [
+            self.build_refinement_prompt(original_problem, REFINEMENT_FOCI[i % len(REFINEMENT_FOCI)])
+            for i in range(n_candidates)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_candidates, 1)) as executor:
+            responses = list(executor.map(llm_usage.propagate(self.interface.query), prompts))
+
+        candidates = [self.extract_confidence_score(response) for response in responses if response != "ERROR"]
+        candidates = [(text, score) for text, score in candidates if text]
+        if not candidates:
+            print(f"{Fore.RED}[PromptRefinerAgent] No usable candidates. Keeping original problem statement.{Style.RESET_ALL}")
+            return original_problem, 50
+
+        # Single scoring pass: highest confidence wins, the more detailed statement breaks ties
+        refined_problem, confidence_score = max(candidates, key=lambda c: (c[1], len(c[0])))
+        print(f"{Fore.GREEN}[PromptRefinerAgent] Best of {len(candidates)} candidates → Confidence {confidence_score}%{Style.RESET_ALL}")
+        return refined_problem, confidence_score
+
+    @staticmethod
+    def build_refinement_prompt(problem, focus=None):
+        focus_note = f"\n            Pay particular attention to {focus}.\n" if focus else ""
+        return f"""
+            Refine the following problem statement to improve clarity, specificity, and completeness.
+            
+            **Original Problem Statement:**
+            {problem}
+            {focus_note}
+            After refinement, provide:
+            1. The improved problem statement.
+            2. A **confidence score (0-100%)** indicating how well the refinement improves clarity, specificity, and completeness.
+
+            **Response Format:**
+            ```
+            Refined Problem Statement: [Your refined statement here]
+            Confidence Score: [X%]
+            ```
+            """
+
     @staticmethod
     def extract_confidence_score(response_text):
         """Extracts confidence score from LLM response."""
@@ -149,7 +256,8 @@ class PromptRefinerAgent(Agent):
 
 
 class PromptRefinerAgent_old(Agent):
-    def refine_problem_statement(self, original_problem, max_attempts=MAX_REFINEMENT_ATTEMPTS):
+    def refine_problem_statement(self, original_problem, max_attempts=settings.CONFIG):
+        max_attempts = settings.value("max_refinement_attempts", max_attempts)
         refined_problem = original_problem
         confidence_score = 50
         for attempt in range(max_attempts):
@@ -157,7 +265,7 @@ class PromptRefinerAgent_old(Agent):
             new_refinement = self.interface.query(self.prompt_template.format(problem=refined_problem))
 #            print(f"..........{new_refinement}")
             confidence_score = self.extract_confidence_score(new_refinement)
-            if confidence_score >= CONFIDENCE_THRESHOLD:
+            if confidence_score >= settings.value("confidence_threshold"):
                 print(f"{Fore.GREEN}[PromptRefinerAgent] Confidence {confidence_score}% → Final Refinement Achieved.{Style.RESET_ALL}")
                 return new_refinement, confidence_score
             if new_refinement.strip() == refined_problem.strip():
@@ -228,10 +336,10 @@ class ResearchAgent(Agent):
         print(f"{Fore.CYAN}[ResearchAgent] Dynamically selected agents: {agent_list}{Style.RESET_ALL}")
         return agent_list
         
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         enriched_context = (f"{context}\n\n🔍 Gather insights from at least three credible sources. "
                             "Present key trends and comparisons using bullet points or tables for clarity.")
-        generic_response = super().execute(problem_statement, enriched_context)
+        generic_response = super().execute(problem_statement, enriched_context, run)
         selected_agents = self.decide_specialized_agents(problem_statement, context)
         additional_insights = ""
         if "ResearchAgentFinance" in selected_agents:
@@ -242,7 +350,7 @@ class ResearchAgent(Agent):
                     ("You are a financial research analyst. Your task is to research the following problem: {problem}\n\n"
                      "Context: {context}\n\nCompare metrics from at least three credible sources, using bullet points or tables where possible.")
                 )
-            finance_response = self.specialized_agents["ResearchAgentFinance"].execute(problem_statement, context)
+            finance_response = self.specialized_agents["ResearchAgentFinance"].execute(problem_statement, context, run)
             additional_insights += f"\n\n🔹 **Financial Insights:**\n- {finance_response.replace(chr(10), chr(10)+'- ')}"
         if "MacroeconomicAgent" in selected_agents:
             if "MacroeconomicAgent" not in self.specialized_agents:
@@ -252,21 +360,22 @@ class ResearchAgent(Agent):
                     ("You are a macroeconomic analyst. Your task is to fetch and analyze real-time economic indicators for the following problem: {problem}\n\n"
                      "Context: {context}\n\nEmphasize trends and provide actionable comparisons.")
                 )
-            macro_response = self.specialized_agents["MacroeconomicAgent"].execute(problem_statement, context)
+            macro_response = self.specialized_agents["MacroeconomicAgent"].execute(problem_statement, context, run)
             additional_insights += f"\n\n🔹 **Macroeconomic Insights:**\n- {macro_response.replace(chr(10), chr(10)+'- ')}"
         final_response = f"{generic_response}\n\n{additional_insights}"
         return final_response
 
 # ResearchAgentFinance uses Yahoo Finance to fetch market data
 class ResearchAgentFinance(Agent):
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         external_data = self.fetch_market_data()
         enriched_context = f"{context}\n\n🔹 Real-time Market Data:\n{external_data}"
-        return super().execute(problem_statement, enriched_context)
+        return super().execute(problem_statement, enriched_context, run)
 
     def fetch_market_data(self):
         market_data = {}
         try:
+            import yfinance  # imported lazily: yfinance and pandas add ~0.5s to every start otherwise
             indices = {
                 "S&P 500": "^GSPC",
                 "NASDAQ": "^IXIC",
@@ -276,7 +385,7 @@ class ResearchAgentFinance(Agent):
                 "DAX": "^GDAXI"
             }
             for name, ticker in indices.items():
-                stock = yf.Ticker(ticker)
+                stock = yfinance.Ticker(ticker)
                 history = stock.history(period="1d")
                 market_data[name] = {"Current Price": history["Close"].iloc[-1] if not history.empty else "Unavailable"}
             treasury_yields = {
@@ -285,20 +394,21 @@ class ResearchAgentFinance(Agent):
                 "US 5Y Treasury Yield": "^FVX"
             }
             for name, ticker in treasury_yields.items():
-                bond = yf.Ticker(ticker)
+                bond = yfinance.Ticker(ticker)
                 history = bond.history(period="1d")
                 market_data[name] = {"Current Yield (%)": history["Close"].iloc[-1] if not history.empty else "Unavailable"}
         except Exception as e:
+            metrics.MARKET_DATA_FAILURES.labels(source="market").inc()
             print(f"{Fore.YELLOW}[ResearchAgentFinance] Failed to fetch data: {e}{Style.RESET_ALL}")
             market_data = {"Stock Market": "Unavailable", "Inflation Rate": "Unknown", "Bond Yields": "Unavailable"}
         return market_data
 
 # MacroeconomicAgent fetches and analyzes macroeconomic indicators
 class MacroeconomicAgent(Agent):
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         macro_data = self.fetch_macro_data()
         enriched_context = f"{context}\n\n🔹 Real-time Macroeconomic Data:\n{macro_data}"
-        return super().execute(problem_statement, enriched_context)
+        return super().execute(problem_statement, enriched_context, run)
 
     def fetch_macro_data(self):
         indicators = {
@@ -309,47 +419,65 @@ class MacroeconomicAgent(Agent):
         }
         macro_info = {}
         try:
+            import yfinance
             for indicator, symbol in indicators.items():
-                macro = yf.Ticker(symbol)
+                macro = yfinance.Ticker(symbol)
                 history = macro.history(period="1d")
                 macro_info[indicator] = history["Close"].iloc[-1] if not history.empty else "Unavailable"
             return macro_info
         except Exception as e:
+            metrics.MARKET_DATA_FAILURES.labels(source="macro").inc()
             return f"⚠️ Failed to fetch macroeconomic data: {e}"
 
 class DirectorAgent(Agent):
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         print(f"{Fore.BLUE}[{self.name}] Executing DirectorAgent...{Style.RESET_ALL}")
-        return super().execute(problem_statement, context)
+        return super().execute(problem_statement, context, run)
 
 class SolutionArchitectAgent(Agent):
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         print(f"{Fore.BLUE}[{self.name}] Executing SolutionArchitectAgent...{Style.RESET_ALL}")
-        return super().execute(problem_statement, context)
+        return super().execute(problem_statement, context, run)
 
 class CommunicatorAgent(Agent):
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         print(f"{Fore.BLUE}[{self.name}] Executing CommunicatorAgent...{Style.RESET_ALL}")
-        return super().execute(problem_statement, context)
+        return super().execute(problem_statement, context, run)
 
 # ResponseCritiqueAgent refines responses if needed
 class ResponseCritiqueAgent(Agent):
     def execute(self, agent_name, agent_response):
-        critique_prompt = f"""
+        critique_prompt = self.build_critique_prompt(agent_name, agent_response)
+        refined_response = self.interface.query(critique_prompt)
+        if str(refined_response).strip() != str(agent_response).strip():
+#    if refined_response.strip() != agent_response.strip():
+            print(f"{Fore.GREEN}✅ {agent_name} Response Optimized!{Style.RESET_ALL}")
+            return refined_response
+        return agent_response  # If no improvement, return original
+
+    def critique_candidates(self, agent_name, agent_response, k=settings.CONFIG):
+        """Launches k critiques of the same response concurrently, one per critique focus."""
+        k = settings.value("critique_candidates", k)
+        prompts = [
+            self.build_critique_prompt(agent_name, agent_response, CRITIQUE_FOCI[i % len(CRITIQUE_FOCI)])
+            for i in range(k)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(k, 1)) as executor:
+            responses = list(executor.map(llm_usage.propagate(self.interface.query), prompts))
+        return [response for response in responses if response != "ERROR" and response.strip()]
+
+    @staticmethod
+    def build_critique_prompt(agent_name, agent_response, focus=None):
+        focus_note = f"\n        Concentrate your refinement on {focus}." if focus else ""
+        return f"""
         Evaluate the response from {agent_name} for clarity, completeness, and alignment with the problem statement.
-        If necessary, refine it to be more actionable and specific.
+        If necessary, refine it to be more actionable and specific.{focus_note}
 
         **Original Response:**
         {agent_response}
 
         **Refined Response:** (Ensure this is the final improved version)
         """
-        refined_response = self.interface.query(critique_prompt)
-        if str(refined_response).strip() != str(agent_response).strip():
-#    if refined_response.strip() != agent_response.strip():
-            print(f"{Fore.GREEN}✅ {agent_name} Response Optimized!{Style.RESET_ALL}")
-            return refined_response
-        return agent_response  # If no improvement, return original
 
 class ResponseCritiqueAgent_old(Agent):
     def execute(self, agent_name, agent_response):
@@ -396,9 +524,61 @@ class EvaluatorAgent(Agent):
         Ensure that the Confidence Score is always provided in the format **X/10** for accurate parsing.
         """
         evaluation_output = self.interface.query(evaluation_prompt)
-        print(f"{Fore.YELLOW}[EvaluatorAgent] Evaluation for {agent_name}:\n{evaluation_output}{Style.RESET_ALL}")
+        event_log.event("evaluation", agent=self.name, subject=agent_name, text_chars=len(evaluation_output),
+                        text_preview=event_log.preview(evaluation_output))
         return evaluation_output
-        
+
+    def evaluate_many(self, agent_outputs, problem_statement, subject="agents"):
+        """
+        Grades every (agent_name, agent_response) pair in agent_outputs in a single LLM call.
+        Returns (score_map, evaluation_output) where score_map maps each name to a 0-100 score.
+        """
+        response_sections = "\n\n".join(
+            f"        ### {name}\n        {response}" for name, response in agent_outputs.items()
+        )
+        evaluation_prompt = f"""
+        You are an evaluation expert. Your task is to assess the responses provided by {len(agent_outputs)} {subject}
+        in relation to the original problem statement.
+
+        **Problem Statement:** {problem_statement}
+
+{response_sections}
+
+        Assess each response for accuracy and completeness, then provide one line per response in the following structured format:
+
+        **<Name> Confidence Score:** X/10
+
+        Use the exact names from the section headings above.
+        Ensure that every Confidence Score is provided in the format **X/10** for accurate parsing.
+        """
+        evaluation_output = self.interface.query(evaluation_prompt)
+        batch = f"{len(agent_outputs)} {subject}"
+        event_log.event("evaluation", agent=self.name, subject=batch, text_chars=len(evaluation_output),
+                        text_preview=event_log.preview(evaluation_output))
+        event_log.event("evaluation.raw", event_log.DEBUG, agent=self.name, subject=batch, text=evaluation_output)
+        return self.parse_score_map(evaluation_output, agent_outputs.keys()), evaluation_output
+
+    def evaluate_candidates(self, agent_name, candidates, problem_statement):
+        """
+        Grades several candidate responses for the same agent in a single LLM call.
+        Returns (scores, evaluation_output) where scores are 0-100 in candidate order.
+        """
+        names = [f"Candidate {i+1}" for i in range(len(candidates))]
+        score_map, evaluation_output = self.evaluate_many(
+            dict(zip(names, candidates)), problem_statement, subject=f"candidate responses for {agent_name}"
+        )
+        return [score_map[name] for name in names], evaluation_output
+
+    @staticmethod
+    def parse_score_map(evaluation_output, names):
+        """Extracts '**<name> Confidence Score:** X/10' lines; unparsed names default to 50."""
+        score_map = {}
+        for name in names:
+            # (?!\w) keeps "ResearchAgent" from matching "ResearchAgentFinance" and "Candidate 1" from "Candidate 10"
+            match = re.search(rf"{re.escape(name)}(?!\w)[^\n]*?Confidence Score:?\**:?\s*([0-9]+(?:\.[0-9]+)?)/10", evaluation_output, re.IGNORECASE)
+            score_map[name] = float(match.group(1)) * 10 if match else 50
+        return score_map
+
 
 
 def extract_agents(llm_response):
@@ -443,7 +623,7 @@ def extract_agents_old(llm_response):
     return found_list
 
 def get_dynamic_agent_mapping(problem_statement, domain="General"):
-    domain_exclusions = SETTINGS.get("domain_exclusions", {})
+    domain_exclusions = settings.get("domain_exclusions", {})
     exclusions = domain_exclusions.get(domain, [])
     
     prompt = (
@@ -459,17 +639,56 @@ def get_dynamic_agent_mapping(problem_statement, domain="General"):
         "Your response:"
     )
     
-    interface = OllamaInterface()
+    interface = OllamaInterface(agent="DynamicMapping")
     response = interface.query(prompt)
     agent_list = [name.strip() for name in response.split(",") if name.strip()]
     filtered_agent_list = [agent for agent in agent_list if agent not in exclusions]
     print(f"{Fore.CYAN}[Dynamic Mapping] Agents recommended by LLM after filtering: {filtered_agent_list}{Style.RESET_ALL}")
     return filtered_agent_list
 
+# Agent name → class for MultiAgentSystem.load_agents; other names get a plain Agent.
+# Plugins add their own classes with AGENT_CLASSES.register(name, cls).
+AGENT_CLASSES = AgentRegistry(Agent, {
+    "ResponseCritiqueAgent": ResponseCritiqueAgent,
+    "EvaluatorAgent": EvaluatorAgent,
+    "PromptRefinerAgent": PromptRefinerAgent,
+    "ResearchAgent": ResearchAgent,
+    "DirectorAgent": DirectorAgent,
+    "SolutionArchitectAgent": SolutionArchitectAgent,
+    "CommunicatorAgent": CommunicatorAgent,
+})
+
 # MultiAgentSystem Controller orchestrates agent execution
+# run(..., deadline=...): mandatory LLM round trips still ahead once a stage is done (agent
+# selection, ~4 agents, the batched evaluation and DirectorAgent after refinement), kept in reserve
+DEADLINE_RESERVE_CALLS = {"dynamic_mapping": 8, "refine": 7, "EvaluatorAgent": 1}
+
+# Order in which run_agents_sequentially runs the agents the selection step picked
+AGENT_EXECUTION_ORDER = [
+    "PromptRefinerAgent",
+    "ResearchAgent",
+    "ResearchAgentFinance",
+    "MacroeconomicAgent",
+    "SolutionArchitectAgent",
+    "CommunicatorAgent",
+    "EvaluatorAgent",
+    "ResponseCritiqueAgent",
+    "DirectorAgent"
+]
+
+
 class MultiAgentSystem:
-    def __init__(self, config_file="agents_config.json"):
-        self.agents = {}
+    # Batch runs share one console across many problems and switch this off
+    clear_console_on_run = True
+
+    def __init__(self, config_file="agents_config.json", refinement_mode=settings.CONFIG, critique_mode=settings.CONFIG,
+                 checkpoint_dir=settings.CONFIG, trace_dir=settings.CONFIG):
+        self.agents = LazyAgents(AGENT_CLASSES)  # built on first use, then reused across runs
+        self.refinement_mode = settings.value("refinement_mode", refinement_mode)
+        self.critique_mode = settings.value("critique_mode", critique_mode)
+        self.checkpoint_dir = settings.value("checkpoint_dir", checkpoint_dir)
+        self.trace_dir = settings.value("trace_dir", trace_dir)
+        self.prescreen_settings = settings.get("prescreen", {})
         self.domain_agent_mapping = {}
         self.load_agents(config_file)
         self.agent_cache = {}  # Cache agent selection for problem statements
@@ -478,6 +697,13 @@ class MultiAgentSystem:
         self.session = Session(session_id="session_001", domain="Dynamic")
         reset_context(self.session)
 
+    def new_run_context(self, domain="General", session_id=None):
+        """session_id of an earlier run resumes it from its checkpoints."""
+        session = Session(session_id=session_id or f"session_{int(time.time())}_{uuid.uuid4().hex[:6]}", domain=domain)
+        reset_context(session)
+        checkpoints = CheckpointStore(session.session_id, self.checkpoint_dir)
+        return RunContext(session, HeuristicPreEvaluator(**self.prescreen_settings), checkpoints)
+
     def hash_problem_statement(self, problem_statement):
         """Generate a unique hash for a given problem statement."""
         return hashlib.sha256(problem_statement.encode()).hexdigest()
@@ -486,6 +712,7 @@ class MultiAgentSystem:
         """Retrieve agents based on problem statement; use cache if available."""
         problem_hash = self.hash_problem_statement(problem_statement)
 
+        metrics.record_cache("agent_selection", problem_hash in self.agent_cache)
         if problem_hash in self.agent_cache:
             return self.agent_cache[problem_hash]
 
@@ -496,7 +723,7 @@ class MultiAgentSystem:
             f"Problem Statement: {problem_statement}\n"
         )
         
-        interface = OllamaInterface()
+        interface = OllamaInterface(agent="AgentSelection")
         response = interface.query(prompt)
         agent_list = [name.strip() for name in response.split(",") if name.strip()]
         
@@ -507,31 +734,22 @@ class MultiAgentSystem:
     def load_agents(self, config_file):
         with open(config_file, "r") as f:
             agent_configs = json.load(f)
-        for name, details in agent_configs.items():
-            if name in ["MacroeconomicAgent", "ResearchAgentFinance"]:
-                continue
-            if name == "ResponseCritiqueAgent":
-                self.agents[name] = ResponseCritiqueAgent(name, details["role"], details["prompt_template"])
-            elif name == "EvaluatorAgent":
-                self.agents[name] = EvaluatorAgent(name, details["role"], details["prompt_template"])
-            elif name == "PromptRefinerAgent":
-                self.agents[name] = PromptRefinerAgent(name, details["role"], details["prompt_template"])
-            elif name == "ResearchAgent":
-                self.agents[name] = ResearchAgent(name, details["role"], details["prompt_template"])
-            elif name == "DirectorAgent":
-                self.agents[name] = DirectorAgent(name, details["role"], details["prompt_template"])
-            elif name == "SolutionArchitectAgent":
-                self.agents[name] = SolutionArchitectAgent(name, details["role"], details["prompt_template"])
-            elif name == "CommunicatorAgent":
-                self.agents[name] = CommunicatorAgent(name, details["role"], details["prompt_template"])
-            else:
-                self.agents[name] = Agent(name, details["role"], details["prompt_template"])
+        # ResearchAgent creates the finance and macro agents itself when a problem needs them
+        self.agents = LazyAgents(AGENT_CLASSES, {
+            name: details for name, details in agent_configs.items()
+            if name not in ["MacroeconomicAgent", "ResearchAgentFinance"]
+        })
 
     # (#2) Clear previous console output.
     def clear_console(self):
         os.system('cls' if os.name == 'nt' else 'clear')
 
-    def adjust_agent_prompts(self, refined_problem):
+    def adjust_agent_prompts(self, refined_problem, run=None):
+        if run is not None:
+            # The refined problem is appended per run by RunContext.prompt_template_for
+            run.refined_problem = refined_problem
+            print(f"{Fore.GREEN}✅ Agent prompts adjusted to the refined problem for {run.session.session_id}.{Style.RESET_ALL}")
+            return
         for agent_name, agent in self.agents.items():
             if agent_name != "PromptRefinerAgent":
                 print(f"{Fore.YELLOW}🔄 Updating prompt template for {agent_name}...{Style.RESET_ALL}")
@@ -565,73 +783,90 @@ class MultiAgentSystem:
     @staticmethod
     def extract_confidence_score(response_text):
         try:
-            print(f"Raw evaluation output:\n{response_text}")  # Debugging output
+            event_log.event("confidence.raw", event_log.DEBUG, text=response_text)
 
             # Updated regex to capture both whole numbers and decimals (e.g., 8/10, 8.5/10)
             match = re.search(r'\*\*Confidence Score:\*\*\s*([0-9]+(?:\.[0-9]+)?)/10', response_text)
 
             if match:
                 score = float(match.group(1)) * 10  # Convert 8.5/10 to 85
-                print(f"✅ Extracted confidence score: {score}")  # Debugging output
+                event_log.event("confidence.parsed", event_log.DEBUG, score=score)
                 return score
             else:
-                print(f"⚠️ Failed to extract confidence score. Defaulting to 50%.")  # Debugging alert
+                event_log.event("confidence.missing", event_log.WARNING, score=50,
+                                text_preview=event_log.preview(response_text))
 
         except Exception as e:
-            print(f"❌ Error extracting confidence score: {e}")
+            event_log.event("confidence.error", event_log.ERROR, error=str(e))
 
         return 50  # Default fallback value
 
-    def run_agents_sequentially(self, refined_problem):
-        self.adjust_agent_prompts(refined_problem)
+    def evaluate_and_refine_outputs(self, dependency_outputs, refined_problem, run, threshold=70):
+        """
+        Grades all agent outputs of the run in one batched evaluator call and critiques only
+        the agents below the threshold (see evaluation.evaluate_and_refine_outputs). Low-scoring
+        outputs are rewritten in dependency_outputs; feedback goes to the run's prompt templates.
+        """
+        graded_outputs = {
+            name: output for name, output in dependency_outputs.items()
+            if name not in ("PromptRefinerAgent", "EvaluatorAgent", "ResponseCritiqueAgent")
+        }
+        if not graded_outputs:
+            return "No agent outputs to evaluate."
+
+        def retry(name):
+            return self.agents[name].execute(refined_problem, dependency_outputs, run)
+
+        def on_feedback(name, refined_response, evaluation_output):
+            if name in self.agents:
+                self.agents[name].update_from_feedback(refined_response, evaluation_output, run)
+
+        scores = evaluation.evaluate_and_refine_outputs(
+            self.agents, run.pre_evaluator, graded_outputs, refined_problem, threshold, self.critique_mode, "main",
+            retry=retry, on_feedback=on_feedback
+        )
+        dependency_outputs.update(graded_outputs)
+        run.session.context["evaluation_scores"] = scores
+        return evaluation.score_summary(scores)
+
+    def run_agents_sequentially(self, refined_problem, run):
+        self.adjust_agent_prompts(refined_problem, run)
         dependency_outputs = {}
 
-        ordered_execution = [
-            "PromptRefinerAgent",
-            "ResearchAgent",
-            "ResearchAgentFinance",
-            "MacroeconomicAgent",
-            "SolutionArchitectAgent",
-            "CommunicatorAgent",
-            "EvaluatorAgent",
-            "ResponseCritiqueAgent",
-            "DirectorAgent"
-        ]
+        ordered_execution = AGENT_EXECUTION_ORDER
 
-        dynamic_agents = self.get_dynamic_agent_mapping(refined_problem, self.session.domain)
-        self.session.active_agents = dynamic_agents
+        dynamic_agents = stages.cached(
+            run.checkpoints, "agent_selection", [refined_problem, run.session.domain],
+            lambda: self.get_dynamic_agent_mapping(refined_problem, run.session.domain)
+        )
+        run.session.active_agents = dynamic_agents
         filtered_execution = [agent for agent in ordered_execution if agent in dynamic_agents]
 
         for agent_name in filtered_execution:
             if agent_name in self.agents:
                 print(f"{Fore.BLUE}[{datetime.datetime.now()}] 🔄 Running {agent_name}...{Style.RESET_ALL}")
                 start_time = time.time()
+                # Every agent is checkpointed against the prompt it sees and the outputs it depends on
+                stage_inputs = [refined_problem, run.prompt_template_for(self.agents[agent_name]), dependency_outputs]
                 if agent_name == "EvaluatorAgent":
-                    # For the EvaluatorAgent, run evaluation and then trigger a refinement loop
-                    agent_response = self.agents[agent_name].execute(
-                        agent_name,
-                        dependency_outputs.get(agent_name, ""),
-                        refined_problem
-                    )
-                    confidence_score = self.extract_confidence_score(agent_response)
-                    iteration = 0
-                    while confidence_score < 70 and iteration < 3:
-                        print(f"{Fore.YELLOW}[{datetime.datetime.now()}] 🔄 Refining response due to low confidence ({confidence_score}%)...{Style.RESET_ALL}")
-                        # Get a refined response from the critique agent
-                        refined_response = self.agents["ResponseCritiqueAgent"].execute(agent_name, agent_response)
-                        # Update the originating agent with feedback for future runs
-                        if agent_name in self.agents:
-                            self.agents[agent_name].update_from_feedback(refined_response, agent_response)
-                        # Re-run evaluation after refinement
-                        evaluation_output = self.agents["EvaluatorAgent"].execute(agent_name, refined_response, refined_problem)
-                        confidence_score = self.extract_confidence_score(evaluation_output)
-                        agent_response = refined_response  # Use refined response for next iteration
-                        iteration += 1
-
-                    print(f"{Fore.GREEN}[{datetime.datetime.now()}] ✅ Final Confidence Score: {confidence_score}%{Style.RESET_ALL}")
+                    # Grade every output produced so far in one call, then refine only the weak ones.
+                    # This rewrites low-scoring outputs in place, so the checkpoint carries them too.
+                    def evaluate():
+                        outputs = dict(dependency_outputs)
+                        response = self.evaluate_and_refine_outputs(outputs, refined_problem, run)
+                        return {"response": response, "outputs": outputs, "feedback": run.feedback,
+                                "scores": run.session.context.get("evaluation_scores", {})}
+                    evaluated = stages.cached(run.checkpoints, agent_name, stage_inputs, evaluate)
+                    dependency_outputs.update(evaluated["outputs"])
+                    run.feedback.update(evaluated["feedback"])
+                    run.session.context["evaluation_scores"] = evaluated["scores"]
+                    agent_response = evaluated["response"]
                 else:
                     # Regular agent execution
-                    agent_response = self.agents[agent_name].execute(refined_problem, dependency_outputs)
+                    agent_response = stages.cached(
+                        run.checkpoints, agent_name, stage_inputs,
+                        lambda: self.agents[agent_name].execute(refined_problem, dependency_outputs, run)
+                    )
                 execution_time = time.time() - start_time
                 print(f"{Fore.GREEN}[{datetime.datetime.now()}] ✅ {agent_name} Completed in {execution_time:.2f}s!{Style.RESET_ALL}")
                 dependency_outputs[agent_name] = agent_response
@@ -697,24 +932,92 @@ class MultiAgentSystem:
 
         return dependency_outputs
         
-    def run(self, problem_statement, domain="General"):
-        self.clear_console()  # (#2) Clear console before starting
-        print("\n==== Multi-Agent System Started ====\n")
-        self.session = Session(session_id=f"session_{int(time.time())}", domain=domain)
-        reset_context(self.session)
-        dynamic_agents = get_dynamic_agent_mapping(problem_statement, domain)
-        print(f"{Fore.CYAN}[Dynamic Mapping] Agents recommended: {dynamic_agents}{Style.RESET_ALL}")
-        self.session.active_agents = dynamic_agents
+    def plan(self, problem_statement, domain="General"):
+        """
+        Dry run of run(problem_statement, domain): stages, LLM calls, tokens and wall time,
+        calibrated from the traces in trace_dir (see planner.py). No LLM is called. The agents
+        are picked by an LLM at run time, so each agent's expected calls are its mean over the
+        recorded runs and the worst case assumes every configured agent is picked.
+        """
+        model = planner.load_model(self.trace_dir)
+        runs = model.runs_with("DynamicMapping")
+        plan = planner.Plan("main", problem_statement, model, domain=domain,
+                            refinement_mode=self.refinement_mode, critique_mode=self.critique_mode)
+        plan.stage("dynamic_mapping").add("DynamicMapping", 1)
+        plan.stage("refine")
         if "PromptRefinerAgent" in self.agents:
-            print(f"{Fore.BLUE}🔄 Running PromptRefinerAgent...{Style.RESET_ALL}")
-            refined_problem, confidence = self.agents["PromptRefinerAgent"].refine_problem_statement(problem_statement)
-            print(f"{Fore.CYAN}Refined Problem Statement (Confidence {confidence}%):\n{refined_problem}{Style.RESET_ALL}")
-        else:
-            refined_problem = problem_statement
-        agent_outputs = self.run_agents_sequentially(refined_problem)
+            plan.add_refinement("PromptRefinerAgent", self.refinement_mode, settings.value("max_refinement_attempts"),
+                                settings.value("refinement_candidates"), runs)
+        plan.stage("agent_selection")
+        plan.add("AgentSelection", plan.expected(runs, "AgentSelection", 1), worst=1, note="cached per refined problem")
+        graded = []
+        for agent_name in AGENT_EXECUTION_ORDER:
+            if agent_name not in self.agents or agent_name == "ResponseCritiqueAgent":
+                continue
+            plan.stage(agent_name)
+            if agent_name == "EvaluatorAgent":
+                plan.add_batched_critique(self.critique_mode, graded, runs, settings.value("critique_candidates"))
+                continue
+            plan.add(agent_name, plan.expected(runs, agent_name, 1), worst=2 if agent_name == "ResearchAgent" else 1)
+            if agent_name == "ResearchAgent":
+                # ResearchAgent decides on its own whether to consult the finance and macro specialists
+                plan.add("ResearchAgentFinance", plan.expected(runs, "ResearchAgentFinance", 0.5), worst=1)
+                plan.add("MacroeconomicAgent", plan.expected(runs, "MacroeconomicAgent", 0.5), worst=1)
+            if agent_name != "PromptRefinerAgent":
+                graded.append(agent_name)
+        return plan.as_dict()
+
+    def run(self, problem_statement, domain="General", resume=None, deadline=None):
+        """Solves one problem and returns the agents' outputs; see run_with_report() for the arguments."""
+        return self.run_with_report(problem_statement, domain, resume, deadline)["output"]
+
+    def run_with_report(self, problem_statement, domain="General", resume=None, deadline=None):
+        """
+        resume is the session ID of an interrupted run: stages whose checkpointed inputs
+        still match are replayed from disk and only the missing ones are executed.
+        deadline is a time budget in seconds: once the rest of the run would not fit, further
+        refinement attempts, pre-screen retries and critique rounds are skipped.
+        Returns {"output", "session_id"} plus the run's session.context (evaluation scores,
+        prescreen, checkpoints, llm_usage, trace, deadline); nothing about the run is left on
+        the system, so runs can overlap.
+        """
+        if self.clear_console_on_run:
+            self.clear_console()  # (#2) Clear console before starting
+        print("\n==== Multi-Agent System Started ====\n")
+        started = time.time()
+        run = self.new_run_context(domain, session_id=resume)
+        run.deadline = Deadline.for_run(deadline, DEADLINE_RESERVE_CALLS, run.usage, self.trace_dir)
+        if run.checkpoints.enabled:
+            print(f"{Fore.CYAN}[Checkpoint] Session {run.session.session_id} → {run.checkpoints.directory} "
+                  f"(resume with run(..., resume=\"{run.session.session_id}\")){Style.RESET_ALL}")
+        with llm_usage.track(run.usage), tracing.activate(run.tracer.root), activate_deadline(run.deadline):
+            dynamic_agents = stages.cached(
+                run.checkpoints, "dynamic_mapping", [problem_statement, domain], lambda: get_dynamic_agent_mapping(problem_statement, domain)
+            )
+            print(f"{Fore.CYAN}[Dynamic Mapping] Agents recommended: {dynamic_agents}{Style.RESET_ALL}")
+            run.session.active_agents = dynamic_agents
+            if "PromptRefinerAgent" in self.agents:
+                print(f"{Fore.BLUE}🔄 Running PromptRefinerAgent...{Style.RESET_ALL}")
+                refiner = self.agents["PromptRefinerAgent"]
+                if self.refinement_mode == "best_of_n":
+                    refine = lambda: refiner.refine_problem_statement_best_of_n(problem_statement)
+                else:
+                    refine = lambda: refiner.refine_problem_statement(problem_statement)
+                refined_problem, confidence = stages.cached(run.checkpoints, "refine", [problem_statement, self.refinement_mode], refine)
+                metrics.CONFIDENCE_SCORES.labels(system="main", source="refinement").observe(confidence)
+                print(f"{Fore.CYAN}Refined Problem Statement (Confidence {confidence}%):\n{refined_problem}{Style.RESET_ALL}")
+            else:
+                refined_problem = problem_statement
+            agent_outputs = self.run_agents_sequentially(refined_problem, run)
+        run.session.context["prescreen"] = run.pre_evaluator.report()
+        run.session.context["checkpoints"] = run.checkpoints.report()
+        run.session.context["llm_usage"] = run.usage.report()
+        run.session.context["trace"] = evaluation.finish_trace(run.tracer, self.trace_dir)
+        run.session.context["deadline"] = run.deadline.report() if run.deadline else None
+        metrics.record_run("main", started)
         print("\n==== Multi-Agent System Completed ====\n")
         final_output = "\n".join([f"**{name} Output:**\n{result}" for name, result in agent_outputs.items()])
-        return final_output
+        return dict(run.session.context, output=final_output, session_id=run.session.session_id)
 
 if __name__ == "__main__":
     problem = (
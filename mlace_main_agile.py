@@ -4,47 +4,102 @@ import json
 import time
 import hashlib
 import datetime
+import concurrent.futures
 from colorama import Fore, Style
-import ollama
+import llm_backend  # live Ollama by default; record/replay via MLACE_LLM_BACKEND
+import event_log
+import llm_usage
+import metrics
+import settings  # config.json, loaded on first use
+import tracing
+import planner
+import deadline
+import evaluation
+import stages
+from deadline import Deadline, activate as activate_deadline
+from pre_evaluator import HeuristicPreEvaluator
+from checkpoints import CheckpointStore
+from agent_registry import AgentRegistry, LazyAgents
 
 # ===============================
 # =========== SETTINGS ==========
 # ===============================
-with open("config.json", "r") as config_file:
-    SETTINGS = json.load(config_file)
-
-CONFIDENCE_THRESHOLD = SETTINGS.get("confidence_threshold", 85)
-MAX_REFINEMENT_ATTEMPTS = SETTINGS.get("max_refinement_attempts", 4)
-MAX_CONFIDENCE_ITERATIONS = SETTINGS.get("max_confidence_iterations", 5)
+# config.json is read on first use through settings.value(); see settings.DEFAULTS for the keys.
+# Roles that produce one artifact per story; ReleaseTrainEngineerAgent then plans the whole backlog at once
+BACKLOG_ROLES = ["BusinessAnalystAgent", "SystemArchitectAgent", "DevTeamAgent", "TesterAgent", "ScrumMasterAgent"]
+# User-story boilerplate that says nothing about whether two stories are related
+STORY_STOPWORDS = {"user", "users", "want", "able", "need", "needs", "story", "backlog", "item", "feature", "admin"}
+
+# Each best-of-N candidate is steered towards a different quality so the candidates don't collapse into one answer
+REFINEMENT_FOCI = [
+    "clarity of the user story",
+    "testability of the acceptance criteria",
+    "alignment with business objectives",
+    "security and compliance constraints",
+]
+
+# Tournament critique candidates each attack a different weakness of the current best output
+CRITIQUE_FOCI = [
+    "clarity and structure",
+    "completeness and missing details",
+    "actionability and security/compliance specifics",
+]
 
 # ===============================
 # ========== OLLAMA API =========
 # ===============================
 class OllamaInterface:
-    def __init__(self, model="llama3.2", temperature=0.1):
+    def __init__(self, model="llama3.2", temperature=0.1, agent=None):
         self.model = model
         self.temperature = temperature
+        self.agent = agent  # recorded with each call's token counts and timings
 
     def query(self, prompt):
         """
-        Basic wrapper to call ollama.chat().
+        Basic wrapper to call ollama.chat() through the configured llm_backend.
         Adjust as needed for your environment.
         """
+        started = time.time()
         try:
-            response = ollama.chat(
+            response = llm_backend.chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
 #                temperature=self.temperature
             )
+            llm_usage.record(self.agent, self.model, response, time.time() - started)
+            metrics.record_llm_call(self.agent, self.model, response, time.time() - started)
+            tracing.add_span(f"llm {self.agent}", started, agent=self.agent, model=self.model,
+                             prompt_tokens=response.get("prompt_eval_count"), completion_tokens=response.get("eval_count"))
             raw_content = response.get("message", {}).get("content", "")
-            # Optional debugging prints
-            print(f"{Fore.MAGENTA}[LLM Query] {prompt[:200]}...{Style.RESET_ALL}")
-            print(f"{Fore.MAGENTA}[LLM Response] {raw_content[:200]}...{Style.RESET_ALL}")
+            event_log.llm_call(self.agent, self.model, prompt, raw_content, time.time() - started)
             return raw_content
         except Exception as e:
-            print(f"{Fore.RED}[ERROR in OllamaInterface] {e}{Style.RESET_ALL}")
+            llm_usage.record(self.agent, self.model, None, time.time() - started, error=f"{type(e).__name__}: {e}")
+            metrics.record_llm_call(self.agent, self.model, None, time.time() - started, error=e)
+            tracing.add_span(f"llm {self.agent}", started, agent=self.agent, model=self.model, error=str(e))
+            event_log.llm_call(self.agent, self.model, prompt, None, time.time() - started, error=e)
             return "ERROR"
 
+# ===============================
+# ========== RUN CONTEXT ========
+# ===============================
+class RunContext:
+    """
+    Per-run execution state: role outputs, the run's pre-screen and its stats, the artifact
+    store, LLM usage, trace and deadline. Agents themselves only hold their definition and
+    LLM client, so the roles of one run can execute in parallel and one MultiAgentSystem
+    can serve overlapping runs.
+    """
+    def __init__(self, pre_evaluator, usage, tracer, artifacts=None, deadline=None):
+        self.pre_evaluator = pre_evaluator
+        self.usage = usage
+        self.tracer = tracer
+        self.artifacts = artifacts
+        self.deadline = deadline
+        self.outputs = {}  # role → latest output in this run
+        self.timeline = []  # (role, started, finished) seconds from the start of the roles
+
+
 # ===============================
 # ========== BASE AGENT =========
 # ===============================
@@ -53,21 +108,26 @@ class Agent:
         self.name = name
         self.role = role
         self.prompt_template = prompt_template
-        self.interface = OllamaInterface()
+        self.interface = OllamaInterface(agent=name)
         self.output = None
         self.improvement_history = []
 
-    def execute(self, problem_statement, context=""):
+    def execute(self, problem_statement, context="", run=None):
         """
         Format the prompt template with the problem and context, then query.
         """
         prompt = self.prompt_template.format(problem=problem_statement, context=context)
         try:
-            self.output = self.interface.query(prompt)
+            output = self.interface.query(prompt)
         except Exception as e:
             print(f"{Fore.RED}[{self.name} ERROR] {e}{Style.RESET_ALL}")
-            self.output = "ERROR"
-        return self.output
+            output = "ERROR"
+        # Within a run the output belongs to the run; self.output only serves standalone calls
+        if run is not None:
+            run.outputs[self.name] = output
+        else:
+            self.output = output
+        return output
 
     def update_from_feedback(self, refined_response, evaluator_feedback):
         """
@@ -90,36 +150,74 @@ class ProductOwnerAgent(Agent):
     Example specialized logic for a Product Owner:
     refine backlog items, user stories, acceptance criteria, etc.
     """
-    def refine_backlog_item(self, original_item, max_attempts=MAX_REFINEMENT_ATTEMPTS):
+    def refine_backlog_item(self, original_item, max_attempts=settings.CONFIG):
+        max_attempts = settings.value("max_refinement_attempts", max_attempts)
         refined_item = original_item
         confidence_score = 50  # default
 
         for attempt in range(max_attempts):
+            if not deadline.allows("refine.attempt", agent=self.name, detail=f"attempt {attempt+1}"):
+                return refined_item, extracted_conf if attempt else confidence_score
             print(f"{Fore.YELLOW}[ProductOwnerAgent] Refinement Attempt {attempt+1}/{max_attempts}{Style.RESET_ALL}")
 
             # We'll build a specialized prompt
-            refine_prompt = f"""
-            You are a Product Owner. Refine the following user story/feature to ensure clarity, testability, and alignment with business objectives.
-            
-            Original Item:
-            {refined_item}
-
-            After refinement, provide:
-            1. The improved backlog item.
-            2. A confidence score (0-100%) regarding clarity and completeness.
-            """
+            refine_prompt = self.build_refinement_prompt(refined_item)
 
             llm_response = self.interface.query(refine_prompt)
             # Attempt to parse out a confidence score
             refined_item, extracted_conf = self.extract_confidence_score(llm_response)
 
-            if extracted_conf >= CONFIDENCE_THRESHOLD:
+            if extracted_conf >= settings.value("confidence_threshold"):
                 print(f"{Fore.GREEN}[ProductOwnerAgent] Confidence {extracted_conf}% → Final Refinement.{Style.RESET_ALL}")
+                metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(attempt + 1)
                 return refined_item, extracted_conf
 
         # If max attempts reached, just return the best we have
+        metrics.REFINEMENT_ITERATIONS.labels(agent=self.name).observe(max_attempts)
+        return refined_item, extracted_conf
+
+    def refine_backlog_item_best_of_n(self, original_item, n_candidates=settings.CONFIG):
+        """
+        Generates n candidate refinements concurrently, each steered towards a different
+        focus, and keeps the candidate with the highest confidence score.
+        One round trip instead of up to max_attempts sequential ones.
+        """
+        n_candidates = settings.value("refinement_candidates", n_candidates)
+        if not deadline.allows("refine.best_of_n", agent=self.name):
+            return original_item, 50
+        print(f"{Fore.YELLOW}[ProductOwnerAgent] Generating {n_candidates} candidate refinements concurrently{Style.RESET_ALL}")
+        prompts = [
+            self.build_refinement_prompt(original_item, REFINEMENT_FOCI[i % len(REFINEMENT_FOCI)])
+            for i in range(n_candidates)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(n_candidates, 1)) as executor:
+            responses = list(executor.map(llm_usage.propagate(self.interface.query), prompts))
+
+        candidates = [self.extract_confidence_score(response) for response in responses if response != "ERROR"]
+        candidates = [(text, score) for text, score in candidates if text]
+        if not candidates:
+            print(f"{Fore.RED}[ProductOwnerAgent] No usable candidates. Keeping original item.{Style.RESET_ALL}")
+            return original_item, 50
+
+        # Single scoring pass: highest confidence wins, the more detailed item breaks ties
+        refined_item, extracted_conf = max(candidates, key=lambda c: (c[1], len(c[0])))
+        print(f"{Fore.GREEN}[ProductOwnerAgent] Best of {len(candidates)} candidates → Confidence {extracted_conf}%{Style.RESET_ALL}")
         return refined_item, extracted_conf
 
+    @staticmethod
+    def build_refinement_prompt(item, focus=None):
+        focus_note = f"\n            Pay particular attention to {focus}.\n" if focus else ""
+        return f"""
+            You are a Product Owner. Refine the following user story/feature to ensure clarity, testability, and alignment with business objectives.
+            
+            Original Item:
+            {item}
+            {focus_note}
+            After refinement, provide:
+            1. The improved backlog item.
+            2. A confidence score (0-100%) regarding clarity and completeness.
+            """
+
     @staticmethod
     def extract_confidence_score(text):
         """
@@ -300,9 +398,60 @@ class EvaluatorAgent(Agent):
     def execute(self, agent_name, agent_response, problem_statement):
         prompt = self.prompt_template.format(problem=problem_statement, context=agent_response)
         raw_eval = self.interface.query(prompt)
-        print(f"{Fore.YELLOW}[EvaluatorAgent] Evaluation for {agent_name}:\n{raw_eval}{Style.RESET_ALL}")
+        event_log.event("evaluation", agent=self.name, subject=agent_name, text_chars=len(raw_eval),
+                        text_preview=event_log.preview(raw_eval))
         return raw_eval
 
+    def evaluate_many(self, agent_outputs, problem_statement, subject="SAFe roles"):
+        """
+        Grades every (agent_name, agent_response) pair in agent_outputs in a single LLM call.
+        Returns (score_map, raw_eval) where score_map maps each name to a 0-100 score.
+        """
+        response_sections = "\n\n".join(
+            f"        ### {name}\n        {response}" for name, response in agent_outputs.items()
+        )
+        prompt = f"""
+        You are responsible for ensuring the outputs of {len(agent_outputs)} {subject} align with the original backlog item.
+        Evaluate clarity, feasibility and security/compliance alignment for each response.
+
+        Backlog Item: {problem_statement}
+
+{response_sections}
+
+        Provide one line per response, using the exact names from the section headings above, in the following structured format:
+        **<Name> Confidence Score:** X/10
+        """
+        raw_eval = self.interface.query(prompt)
+        batch = f"{len(agent_outputs)} {subject}"
+        event_log.event("evaluation", agent=self.name, subject=batch, text_chars=len(raw_eval),
+                        text_preview=event_log.preview(raw_eval))
+        event_log.event("evaluation.raw", event_log.DEBUG, agent=self.name, subject=batch, text=raw_eval)
+        return self.parse_score_map(raw_eval, agent_outputs.keys()), raw_eval
+
+    def evaluate_candidates(self, agent_name, candidates, problem_statement):
+        """
+        Grades several candidate responses for the same agent in a single LLM call.
+        Returns (scores, raw_eval) where scores are 0-100 in candidate order.
+        """
+        names = [f"Candidate {i+1}" for i in range(len(candidates))]
+        score_map, raw_eval = self.evaluate_many(
+            dict(zip(names, candidates)), problem_statement, subject=f"candidate responses for {agent_name}"
+        )
+        return [score_map[name] for name in names], raw_eval
+
+    @staticmethod
+    def parse_score_map(raw_eval, names):
+        """
+        Parse "**<name> Confidence Score:** 8/10" lines → {name: 80.0}.
+        Names without a parsable score default to 50.
+        """
+        score_map = {}
+        for name in names:
+            # (?!\w) keeps "Candidate 1" from matching "Candidate 10"
+            match = re.search(rf"{re.escape(name)}(?!\w)[^\n]*?Confidence Score:?\**:?\s*([0-9]+(?:\.[0-9]+)?)/10", raw_eval, re.IGNORECASE)
+            score_map[name] = float(match.group(1)) * 10 if match else 50.0
+        return score_map
+
 
 class CommunicatorAgent(Agent):
     """Summarizes final outcome into an executive-level update."""
@@ -321,12 +470,114 @@ class ResponseCritiqueAgent(Agent):
             return refined_response
         return agent_response
 
+    def critique_candidates(self, agent_name, agent_response, k=settings.CONFIG):
+        """
+        Launches k critiques of the same response concurrently, each told to concentrate
+        on a different critique focus.
+        """
+        k = settings.value("critique_candidates", k)
+        base_prompt = self.prompt_template.format(problem=agent_name, context=agent_response)
+        prompts = [
+            f"{base_prompt}\n\nConcentrate your refinement on {CRITIQUE_FOCI[i % len(CRITIQUE_FOCI)]}."
+            for i in range(k)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(k, 1)) as executor:
+            responses = list(executor.map(llm_usage.propagate(self.interface.query), prompts))
+        return [response for response in responses if response != "ERROR" and response.strip()]
+
 # ===============================
 # ===== MULTIAGENTSYSTEM =======
 # ===============================
+# Agent name → class for MultiAgentSystem.load_agents; other names get a plain Agent.
+# Plugins add their own classes with AGENT_CLASSES.register(name, cls).
+AGENT_CLASSES = AgentRegistry(Agent, {
+    "ProductOwnerAgent": ProductOwnerAgent,
+    "ScrumMasterAgent": ScrumMasterAgent,
+    "DevTeamAgent": DevTeamAgent,
+    "TesterAgent": TesterAgent,
+    "ReleaseTrainEngineerAgent": ReleaseTrainEngineerAgent,
+    "SystemArchitectAgent": SystemArchitectAgent,
+    "BusinessAnalystAgent": BusinessAnalystAgent,
+    "EvaluatorAgent": EvaluatorAgent,
+    "CommunicatorAgent": CommunicatorAgent,
+    "ResponseCritiqueAgent": ResponseCritiqueAgent,
+})
+
+
+def group_backlog_items(items, max_group_size=settings.CONFIG, max_group_chars=settings.CONFIG,
+                        similarity=settings.CONFIG):
+    """
+    Greedily groups related stories: each group starts from the first ungrouped item and
+    takes the most similar remaining items (keyword Jaccard >= similarity) while the group
+    stays within max_group_size items and max_group_chars characters.
+    Returns a list of index lists.
+    """
+    max_group_size = settings.value("backlog_group_size", max_group_size)
+    max_group_chars = settings.value("backlog_group_chars", max_group_chars)
+    similarity = settings.value("backlog_similarity", similarity)
+    keywords = [HeuristicPreEvaluator.extract_keywords(item) - STORY_STOPWORDS for item in items]
+
+    def jaccard(a, b):
+        return len(keywords[a] & keywords[b]) / len(keywords[a] | keywords[b]) if keywords[a] | keywords[b] else 0.0
+
+    remaining = list(range(len(items)))
+    groups = []
+    while remaining:
+        seed = remaining.pop(0)
+        group, size = [seed], len(items[seed])
+        for candidate in sorted(remaining, key=lambda i: jaccard(seed, i), reverse=True):
+            if len(group) >= max_group_size or jaccard(seed, candidate) < similarity:
+                break
+            if size + len(items[candidate]) > max_group_chars:
+                continue
+            group.append(candidate)
+            size += len(items[candidate])
+        remaining = [i for i in remaining if i not in group]
+        groups.append(group)
+    return groups
+
+
+def split_story_sections(response, count):
+    """
+    Splits a grouped role response on its '### Story <n>' headings. Returns count sections;
+    when the response doesn't follow the format every story gets the whole response.
+    """
+    parts = re.split(r"^\s*#+\s*\**\s*Story\s+(\d+)\b[^\n]*$", response, flags=re.MULTILINE | re.IGNORECASE)
+    sections = {}
+    for number, body in zip(parts[1::2], parts[2::2]):
+        sections.setdefault(int(number), body.strip())
+    if not all(number in sections for number in range(1, count + 1)):
+        return [response] * count
+    return [sections[number] for number in range(1, count + 1)]
+
+
+ROLE_ORDER = [
+    "BusinessAnalystAgent",
+    "SystemArchitectAgent",
+    "DevTeamAgent",
+    "TesterAgent",
+    "ScrumMasterAgent",
+    "ReleaseTrainEngineerAgent",
+    "EvaluatorAgent",
+    "CommunicatorAgent",
+    "ResponseCritiqueAgent"
+]
+
+
 class MultiAgentSystem:
-    def __init__(self, config_file="agents_config_agilec.json"):
-        self.agents = {}
+    # Batch runs share one console across many problems and switch this off
+    clear_console_on_run = True
+
+    def __init__(self, config_file="agents_config_agilec.json", refinement_mode=settings.CONFIG, critique_mode=settings.CONFIG,
+                 artifact_dir=settings.CONFIG, role_execution=settings.CONFIG, trace_dir=settings.CONFIG):
+        self.agents = LazyAgents(AGENT_CLASSES)  # built on first use, then reused across runs
+        self.refinement_mode = settings.value("refinement_mode", refinement_mode)
+        self.critique_mode = settings.value("critique_mode", critique_mode)
+        self.artifact_dir = settings.value("artifact_dir", artifact_dir)
+        self.role_execution = settings.value("role_execution", role_execution)
+        self.trace_dir = settings.value("trace_dir", trace_dir)
+        self.role_dependencies = {}  # role → "depends_on" from the agent config (None when not declared)
+        self.prescreen_settings = settings.get("prescreen", {})  # every run screens with its own HeuristicPreEvaluator
         self.load_agents(config_file)
 
     def load_agents(self, config_file):
@@ -334,32 +585,8 @@ class MultiAgentSystem:
             agent_configs = json.load(f)
 
         for name, details in agent_configs.items():
-            role = details["role"]
-            template = details["prompt_template"]
-
-            if name == "ProductOwnerAgent":
-                self.agents[name] = ProductOwnerAgent(name, role, template)
-            elif name == "ScrumMasterAgent":
-                self.agents[name] = ScrumMasterAgent(name, role, template)
-            elif name == "DevTeamAgent":
-                self.agents[name] = DevTeamAgent(name, role, template)
-            elif name == "TesterAgent":
-                self.agents[name] = TesterAgent(name, role, template)
-            elif name == "ReleaseTrainEngineerAgent":
-                self.agents[name] = ReleaseTrainEngineerAgent(name, role, template)
-            elif name == "SystemArchitectAgent":
-                self.agents[name] = SystemArchitectAgent(name, role, template)
-            elif name == "BusinessAnalystAgent":
-                self.agents[name] = BusinessAnalystAgent(name, role, template)
-            elif name == "EvaluatorAgent":
-                self.agents[name] = EvaluatorAgent(name, role, template)
-            elif name == "CommunicatorAgent":
-                self.agents[name] = CommunicatorAgent(name, role, template)
-            elif name == "ResponseCritiqueAgent":
-                self.agents[name] = ResponseCritiqueAgent(name, role, template)
-            else:
-                # Fallback to a base Agent if no specialized class is found.
-                self.agents[name] = Agent(name, role, template)
+            self.role_dependencies[name] = details.get("depends_on")
+        self.agents = LazyAgents(AGENT_CLASSES, agent_configs)
 
     def clear_console(self):
         os.system('cls' if os.name == 'nt' else 'clear')
@@ -381,14 +608,61 @@ class MultiAgentSystem:
             pass
         return 50.0
 
-    def run(self, problem_statement):
-        self.clear_console()
+    def evaluate_and_refine_outputs(self, outputs, problem_statement, run, threshold=settings.CONFIG):
+        """
+        Grades all role outputs in one batched evaluator call and critiques only the roles
+        below the threshold (see evaluation.evaluate_and_refine_outputs). Weak outputs are
+        rewritten in outputs; roles the pre-screen rejects outright are re-executed once.
+        """
+        threshold = settings.value("confidence_threshold", threshold)
+        if not outputs:
+            return "No role outputs to evaluate."
+        scores = evaluation.evaluate_and_refine_outputs(
+            self.agents, run.pre_evaluator, outputs, problem_statement, threshold, self.critique_mode, "agile",
+            retry=lambda name: self.agents[name].execute(problem_statement, context=outputs, run=run)
+        )
+        return evaluation.score_summary(scores)
+
+    def run(self, problem_statement, workspace=None, deadline=None):
+        """Runs the roles on one backlog item and returns their outputs; see run_with_report() for the arguments."""
+        return self.run_with_report(problem_statement, workspace, deadline)["output"]
+
+    def run_with_report(self, problem_statement, workspace=None, deadline=None):
+        """
+        workspace turns on make-style incremental sprints: every role artifact is stored under
+        artifact_dir/<workspace> with a hash of its inputs (the backlog item, the role's prompt
+        and the upstream artifacts it sees), and a later sprint in the same workspace
+        recomputes only the roles whose inputs changed.
+        deadline is a time budget in seconds: once the rest of the run would not fit, further
+        refinement attempts, pre-screen retries and critique rounds are skipped.
+        Returns {"output", "prescreen", "llm_usage", "trace", "deadline", "timeline", "artifacts"};
+        nothing about the run is left on the system, so runs can overlap.
+        """
+        if self.clear_console_on_run:
+            self.clear_console()
         print(f"{Fore.CYAN}=== Running Multi-Agent System (SAFe Roles) ==={Style.RESET_ALL}")
+        started = time.time()
+        run = RunContext(HeuristicPreEvaluator(**self.prescreen_settings), llm_usage.UsageLog(workspace or "agile"),
+                         tracing.Tracer(f"agile_{int(time.time())}_{workspace or 'run'}"),
+                         CheckpointStore(workspace or "none", self.artifact_dir, enabled=workspace is not None))
+        role_order = [role_name for role_name in ROLE_ORDER if role_name in self.agents]
+        run.deadline = Deadline.for_run(deadline, self.deadline_reserve_calls(role_order), run.usage, self.trace_dir)
 
         # 1) Optionally let Product Owner refine the backlog item
         if "ProductOwnerAgent" in self.agents:
-            refined, conf = self.agents["ProductOwnerAgent"].refine_backlog_item(problem_statement)
+            product_owner = self.agents["ProductOwnerAgent"]
+            if self.refinement_mode == "best_of_n":
+                refine = lambda: product_owner.refine_backlog_item_best_of_n(problem_statement)
+            else:
+                refine = lambda: product_owner.refine_backlog_item(problem_statement)
+            # Whitespace-only edits of the backlog item don't invalidate the refinement
+            backlog_key = " ".join(problem_statement.split())
+            with llm_usage.track(run.usage), tracing.activate(run.tracer.root), activate_deadline(run.deadline):
+                refined, conf = stages.cached(
+                    run.artifacts, "ProductOwnerAgent", [backlog_key, product_owner.prompt_template, self.refinement_mode], refine
+                )
             problem_statement = refined
+            metrics.CONFIDENCE_SCORES.labels(system="agile", source="refinement").observe(conf)
             print(f"{Fore.GREEN}[Refined Backlog Item] (Confidence: {conf}%)\n{refined}{Style.RESET_ALL}")
         elif "DevTeamAgent":
             dev_agent = self.agents["DevTeamAgent"]
@@ -397,53 +671,269 @@ class MultiAgentSystem:
             
        # Decide on execution order
         # (In practice, you could also do dynamic selection. This is a static example.)
-        role_order = [
-            "BusinessAnalystAgent",
-            "SystemArchitectAgent",
-            "DevTeamAgent",
-            "TesterAgent",
-            "ScrumMasterAgent",
-            "ReleaseTrainEngineerAgent",
-            "EvaluatorAgent",
-            "CommunicatorAgent",
-            "ResponseCritiqueAgent"
-        ]
+        with llm_usage.track(run.usage), tracing.activate(run.tracer.root), activate_deadline(run.deadline):
+            outputs = self.run_roles(problem_statement, role_order, run)
+
+        report = {
+            "prescreen": run.pre_evaluator.report(),
+            "llm_usage": run.usage.report(),
+            "trace": evaluation.finish_trace(run.tracer, self.trace_dir),
+            "deadline": run.deadline.report() if run.deadline else None,
+            "timeline": run.timeline,
+            "artifacts": None,
+        }
+        metrics.record_run("agile", started)
+        if workspace is not None:
+            stats = report["artifacts"] = run.artifacts.report()
+            print(f"{Fore.CYAN}[Incremental] Sprint in workspace '{workspace}': {stats['replayed']} role artifacts reused, "
+                  f"{stats['executed']} recomputed{Style.RESET_ALL}")
+
+        # Summarize final
+        report["output"] = "\n\n".join(f"**{k}** Output:\n{outputs[k]}" for k in role_order if k in outputs)
+        return report
 
-        outputs = {}
+    def plan(self, problem_statement):
+        """
+        Dry run of run(problem_statement): stages, LLM calls, tokens and wall time, calibrated
+        from the traces in trace_dir (see planner.py). No LLM is called. Roles are stages that
+        start once the roles they depend on are done, so the wall time follows the longest
+        depends_on chain; artifacts a workspace would reuse are not subtracted.
+        """
+        model = planner.load_model(self.trace_dir)
+        runs = model.runs_with("ProductOwnerAgent")
+        plan = planner.Plan("agile", problem_statement, model, refinement_mode=self.refinement_mode,
+                            critique_mode=self.critique_mode, role_execution=self.role_execution)
+        plan.stage("ProductOwnerAgent")
+        if "ProductOwnerAgent" in self.agents:
+            plan.add_refinement("ProductOwnerAgent", self.refinement_mode, settings.value("max_refinement_attempts"),
+                                settings.value("refinement_candidates"), runs)
+        role_order = [role_name for role_name in ROLE_ORDER if role_name in self.agents]
+        dependencies = self.resolve_role_dependencies(role_order)
         for role_name in role_order:
-            if role_name in self.agents:
-                agent = self.agents[role_name]
-                print(f"\n{Fore.BLUE}=== Executing {role_name} ==={Style.RESET_ALL}")
-
-                # The EvaluatorAgent's .execute() signature differs
-                if role_name == "EvaluatorAgent":
-                    agent_response = agent.execute(role_name, outputs, problem_statement)
-                    conf_score = self.extract_confidence_score(agent_response)
-                    if conf_score < CONFIDENCE_THRESHOLD:
-                        print(f"{Fore.YELLOW}→ Low Confidence ({conf_score}%). Attempting refinements...{Style.RESET_ALL}")
-                        # Try critique → re-evaluate loop
-                        for attempt in range(3):
-                            if "ResponseCritiqueAgent" in self.agents:
-                                critiqued = self.agents["ResponseCritiqueAgent"].execute(role_name, agent_response)
-                                agent_response = critiqued
-                                re_eval = agent.execute(role_name, critiqued, problem_statement)
-                                conf_score = self.extract_confidence_score(re_eval)
-                                if conf_score >= CONFIDENCE_THRESHOLD:
-                                    break
-                    print(f"{Fore.GREEN}[EvaluatorAgent] Final Confidence: {conf_score}%{Style.RESET_ALL}")
-                elif role_name == "ResponseCritiqueAgent":
-                    # Typically you'd pass in the last agent's output to critique
-                    last_agent_name = list(outputs.keys())[-1] if outputs else "NoAgent"
-                    last_agent_response = outputs[last_agent_name] if last_agent_name in outputs else ""
-                    agent_response = agent.execute(last_agent_name, last_agent_response)
-                else:
-                    # Standard approach: pass the entire 'outputs' dict as context
-                    agent_response = agent.execute(problem_statement, context=outputs)
-
-                outputs[role_name] = agent_response
+            plan.stage(role_name, depends_on=["ProductOwnerAgent"] + dependencies[role_name])
+            if role_name == "EvaluatorAgent":
+                plan.add_batched_critique(self.critique_mode, dependencies[role_name], runs,
+                                          settings.value("critique_candidates"))
+            else:
+                plan.add(role_name, 1)
+        return plan.as_dict()
 
-        # Summarize final
-        return "\n\n".join(f"**{k}** Output:\n{v}" for k, v in outputs.items())
+    def deadline_reserve_calls(self, role_order):
+        """
+        Deadline reserve: the mandatory round trips after each stage, i.e. the longest chain of
+        roles still waiting on it (after refinement, the longest depends_on chain of the run).
+        """
+        dependencies = self.resolve_role_dependencies(role_order)
+        chain = {}
+
+        def after(role_name):
+            if role_name not in chain:
+                chain[role_name] = max((after(name) + 1 for name in role_order if role_name in dependencies[name]), default=0)
+            return chain[role_name]
+
+        reserve = {role_name: after(role_name) for role_name in role_order}
+        reserve["ProductOwnerAgent"] = max((reserve[name] + 1 for name in role_order if not dependencies[name]), default=0)
+        return reserve
+
+    def resolve_role_dependencies(self, role_order):
+        """
+        Maps each role to the upstream roles it waits for. Roles without "depends_on" in the
+        agent config (and every role in sequential mode) wait for all roles before them.
+        """
+        dependencies = {}
+        for index, role_name in enumerate(role_order):
+            declared = self.role_dependencies.get(role_name)
+            if self.role_execution == "sequential" or declared is None:
+                dependencies[role_name] = role_order[:index]
+            else:
+                dependencies[role_name] = [name for name in role_order if name in declared]
+
+        # Reject cycles up front instead of deadlocking the executor
+        resolved = set()
+        while len(resolved) < len(role_order):
+            ready = [name for name in role_order if name not in resolved and set(dependencies[name]) <= resolved]
+            if not ready:
+                cycle = [name for name in role_order if name not in resolved]
+                raise ValueError(f"Circular depends_on between roles: {cycle}")
+            resolved.update(ready)
+        return dependencies
+
+    def execute_role(self, role_name, problem_statement, upstream, run):
+        """
+        Runs one role on the artifacts of its dependencies (upstream, in role order).
+        Returns (response, rewritten) where rewritten holds upstream artifacts the
+        EvaluatorAgent's critique replaced, or None.
+        """
+        agent = self.agents[role_name]
+        print(f"\n{Fore.BLUE}=== Executing {role_name} ==={Style.RESET_ALL}")
+
+        # A role's artifact depends on the backlog item, its prompt and its upstream artifacts
+        role_inputs = [problem_statement, agent.prompt_template, upstream]
+
+        # The EvaluatorAgent's .execute() signature differs
+        if role_name == "EvaluatorAgent":
+            # Grade every upstream output in one call, then refine only the weak ones.
+            # Critique rewrites weak artifacts in place, so they are stored with the evaluation.
+            def evaluate():
+                refined_outputs = dict(upstream)
+                response = self.evaluate_and_refine_outputs(refined_outputs, problem_statement, run)
+                return {"response": response, "outputs": refined_outputs}
+            evaluated = stages.cached(run.artifacts, role_name, role_inputs, evaluate)
+            return evaluated["response"], evaluated["outputs"]
+        if role_name == "ResponseCritiqueAgent":
+            # Critique the output of the last role it depends on
+            last_agent_name = list(upstream.keys())[-1] if upstream else "NoAgent"
+            last_agent_response = upstream.get(last_agent_name, "")
+            return stages.cached(run.artifacts, role_name, role_inputs, lambda: agent.execute(last_agent_name, last_agent_response)), None
+        # Standard approach: pass the upstream 'outputs' dict as context
+        return stages.cached(run.artifacts, role_name, role_inputs, lambda: agent.execute(problem_statement, context=upstream, run=run)), None
+
+    def run_roles(self, problem_statement, role_order, run):
+        """
+        Dependency-driven executor: every role starts as soon as all roles it depends on
+        have finished, so independent roles overlap and a run takes about the time of its
+        longest dependency chain. Prints a timeline of the overlap afterwards.
+        """
+        dependencies = self.resolve_role_dependencies(role_order)
+        outputs, timeline = {}, []
+        pending, running = list(role_order), {}
+        start = time.time()
+
+        def timed_role(role_name, upstream):
+            started = time.time() - start
+            response, rewritten = self.execute_role(role_name, problem_statement, upstream, run)
+            return response, rewritten, started, time.time() - start
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(role_order))) as executor:
+            while pending or running:
+                ready = [name for name in pending if all(dep in outputs for dep in dependencies[name])]
+                for role_name in ready:
+                    pending.remove(role_name)
+                    upstream = {name: outputs[name] for name in role_order if name in dependencies[role_name]}
+                    running[executor.submit(llm_usage.propagate(timed_role), role_name, upstream)] = role_name
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    role_name = running.pop(future)
+                    response, rewritten, started, finished = future.result()
+                    if rewritten:
+                        outputs.update(rewritten)
+                    outputs[role_name] = response
+                    timeline.append((role_name, started, finished))
+
+        run.timeline = timeline
+        self.print_role_timeline(timeline)
+        return outputs
+
+    @staticmethod
+    def print_role_timeline(timeline, width=50):
+        """ASCII Gantt chart of the role executions; overlapping bars ran concurrently."""
+        if not timeline:
+            return
+        total = max(finished for _, _, finished in timeline) or 1e-9
+        print(f"\n{Fore.CYAN}=== Role Timeline ({total:.1f}s) ==={Style.RESET_ALL}")
+        for role_name, started, finished in sorted(timeline, key=lambda entry: entry[1]):
+            offset = int(started / total * width)
+            length = max(1, int(round((finished - started) / total * width)))
+            bar = (" " * offset + "█" * length)[:width]
+            print(f"{role_name:<26} |{bar:<{width}}| {started:7.1f}s → {finished:7.1f}s")
+        busy = sum(finished - started for _, started, finished in timeline)
+        print(f"{Fore.CYAN}Wall time {total:.1f}s vs {busy:.1f}s of role time ({busy / total:.1f}x overlap){Style.RESET_ALL}")
+
+
+    def run_grouped_role(self, role_name, stories, upstream, run=None):
+        """
+        One call of role_name covering several stories. upstream holds, per story, the
+        artifacts of the roles before this one. Returns one artifact per story.
+        """
+        agent = self.agents[role_name]
+        if len(stories) == 1:
+            return [agent.execute(stories[0], context=upstream[0], run=run)]
+        story_block = f"the following {len(stories)} related backlog items:\n" + "\n\n".join(
+            f"### Story {i+1}\n{story}" for i, story in enumerate(stories)
+        )
+        context_block = "\n\n".join(
+            f"### Story {i+1}\n" + "\n".join(f"{name}: {artifact}" for name, artifact in artifacts.items())
+            for i, artifacts in enumerate(upstream)
+        )
+        prompt = agent.prompt_template.format(problem=story_block, context=context_block or "None")
+        prompt += (f"\n\nAddress every story separately, each in its own section headed exactly "
+                   f"'### Story <number>' (Story 1 to Story {len(stories)}).")
+        try:
+            response = agent.interface.query(prompt)
+        except Exception as e:
+            print(f"{Fore.RED}[{role_name} ERROR] {e}{Style.RESET_ALL}")
+            response = "ERROR"
+        return split_story_sections(response, len(stories))
+
+    def run_backlog(self, backlog_items, workers=settings.CONFIG):
+        """
+        Backlog mode for a whole program increment. Items are refined concurrently, related
+        stories are grouped so each role in BACKLOG_ROLES covers a group in one call, and
+        ReleaseTrainEngineerAgent produces one release plan for the entire backlog.
+        Returns {"items": [{"item", "refined", "confidence", "artifacts"}], "groups", "release_plan",
+        "llm_usage", "trace"} with the LLM usage and trace analysis of the whole backlog.
+        """
+        workers = settings.value("backlog_workers", workers)
+        print(f"{Fore.CYAN}=== Running SAFe Backlog Mode ({len(backlog_items)} items) ==={Style.RESET_ALL}")
+        if not backlog_items:
+            return {"items": [], "groups": [], "release_plan": "", "llm_usage": None, "trace": None}
+
+        run = RunContext(HeuristicPreEvaluator(**self.prescreen_settings), llm_usage.UsageLog("backlog"),
+                         tracing.Tracer(f"backlog_{int(time.time())}"))
+
+        # 1) Refine every item concurrently
+        if "ProductOwnerAgent" in self.agents:
+            product_owner = self.agents["ProductOwnerAgent"]
+            refine = product_owner.refine_backlog_item_best_of_n if self.refinement_mode == "best_of_n" else product_owner.refine_backlog_item
+            with llm_usage.track(run.usage), tracing.activate(run.tracer.root), tracing.span("refine"), \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(backlog_items)))) as executor:
+                refinements = list(executor.map(llm_usage.propagate(refine), backlog_items))
+        else:
+            refinements = [(item, None) for item in backlog_items]
+        refined_items = [refined for refined, _ in refinements]
+
+        # 2) Group related stories and run the per-story roles once per group
+        groups = group_backlog_items(refined_items)
+        print(f"{Fore.CYAN}[Backlog] {len(backlog_items)} items in {len(groups)} groups: {groups}{Style.RESET_ALL}")
+        artifacts = [{} for _ in backlog_items]
+
+        def run_group(group):
+            stories = [refined_items[i] for i in group]
+            for role_name in BACKLOG_ROLES:
+                if role_name not in self.agents:
+                    continue
+                print(f"{Fore.BLUE}[Backlog] {role_name} → stories {[i + 1 for i in group]}{Style.RESET_ALL}")
+                sections = self.run_grouped_role(role_name, stories, [dict(artifacts[i]) for i in group], run)
+                for i, section in zip(group, sections):
+                    artifacts[i][role_name] = section
+
+        with llm_usage.track(run.usage), tracing.activate(run.tracer.root), tracing.span("groups"), \
+                concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as executor:
+            list(executor.map(llm_usage.propagate(run_group), groups))
+
+        # 3) One aggregate release plan across the whole backlog
+        release_plan = ""
+        if "ReleaseTrainEngineerAgent" in self.agents:
+            print(f"{Fore.BLUE}[Backlog] ReleaseTrainEngineerAgent → aggregate release plan{Style.RESET_ALL}")
+            objective = "Deliver the following backlog items as one program increment:\n" + "\n".join(
+                f"{i+1}. {item}" for i, item in enumerate(refined_items)
+            )
+            context = "\n\n".join(
+                f"Story {i+1}:\n" + "\n".join(
+                    f"{role}: {artifacts[i][role][:800]}" for role in ("SystemArchitectAgent", "DevTeamAgent")
+                    if role in artifacts[i]
+                )
+                for i in range(len(refined_items))
+            )
+            with llm_usage.track(run.usage), tracing.activate(run.tracer.root), tracing.span("release_plan"):
+                release_plan = self.agents["ReleaseTrainEngineerAgent"].execute(objective, context=context, run=run)
+
+        items = [
+            {"item": item, "refined": refined, "confidence": confidence, "artifacts": artifacts[i]}
+            for i, (item, (refined, confidence)) in enumerate(zip(backlog_items, refinements))
+        ]
+        return {"items": items, "groups": groups, "release_plan": release_plan,
+                "llm_usage": run.usage.report(), "trace": evaluation.finish_trace(run.tracer, self.trace_dir)}
 
 
 #************************************************
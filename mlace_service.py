@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Long-running HTTP service around MultiAgentSystem.run.
+
+Agents, LLM clients and caches are built once per worker and reused across requests,
+so a request no longer pays for a fresh interpreter, the yfinance/pandas imports and
+reloading config.json / agent configs.
+
+Endpoints:
+    POST /jobs                  {"problem": "...", "domain": "...", "system": "dreamteam"} → 202 {"job_id", "coalesced"}
+    GET  /jobs                  all known jobs (without results)
+    GET  /jobs/<job_id>         status, result or error, latency
+    GET  /jobs/<job_id>/events  progress as a text/event-stream, closed when the job finishes
+    GET  /health                queue depth, workers, in-flight jobs
+    GET  /metrics               Prometheus text format (LLM calls, tokens, latency, caches, runs)
+
+Identical problem statements submitted while one is queued or running are coalesced
+(single-flight): they get the job_id of the execution already in progress.
+Jobs write no traces or checkpoints unless --trace-dir or --checkpoint-dir is given.
+
+Usage:
+    python mlace_service.py --port 8080 --workers 2 --system dreamteam
+"""
+import re
+import sys
+import json
+import uuid
+import queue
+import hashlib
+import argparse
+import datetime
+import threading
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from colorama import Fore, Style
+
+import metrics
+from mlace_batch import SYSTEMS, configure_outputs, solve
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+SERVICE_JOBS = metrics.Gauge("mlace_service_jobs", "Service jobs by state, sampled at scrape time", ["state"])
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+MAX_JOB_EVENTS = 2000  # progress lines kept per job; older ones are dropped first
+
+# Job whose progress the current code is producing. A contextvar rather than a thread-local, so
+# pool threads started through llm_usage.propagate() (best-of-N, tournaments, agile roles) inherit it.
+_current_job = contextvars.ContextVar("service_job", default=None)
+
+
+class JobProgressStdout:
+    """
+    Replaces sys.stdout while the service runs. Everything the agents print still goes to
+    the console; lines printed while a job is bound (in the worker running it or in any
+    thread it hands work to through llm_usage.propagate) are also recorded as that job's
+    progress events.
+    """
+    # event_log renders its console lines in the logging thread, not on its listener thread,
+    # so LLM call progress is attributed to the job as well
+    render_events_inline = True
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()  # per thread: job_id → unfinished line
+
+    @staticmethod
+    def bind(job):
+        """Binds job to the current context; returns the token for unbind()."""
+        return _current_job.set(job)
+
+    @staticmethod
+    def unbind(token):
+        _current_job.reset(token)
+
+    def write(self, text):
+        self.stream.write(text)
+        job = _current_job.get()
+        if job is not None:
+            buffers = getattr(self.local, "buffers", None)
+            if buffers is None:
+                buffers = self.local.buffers = {}
+            *lines, rest = (buffers.pop(job.job_id, "") + text).split("\n")
+            if rest:
+                buffers[job.job_id] = rest
+            for line in lines:
+                line = ANSI_ESCAPE.sub("", line).strip()
+                if line:
+                    job.add_event(line)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Job:
+    def __init__(self, problem, domain, system, key):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.record = {"id": self.job_id, "problem": problem, "domain": domain, "system": system}
+        self.status = QUEUED
+        self.subscribers = 1  # requests coalesced into this execution
+        self.submitted_at = datetime.datetime.now().isoformat()
+        self.result = None
+        self.events = []  # the latest MAX_JOB_EVENTS progress events
+        self.events_dropped = 0  # older events removed from the front of self.events
+        self.changed = threading.Condition()
+
+    def add_event(self, message):
+        with self.changed:
+            self.events.append({"time": datetime.datetime.now().isoformat(), "message": message})
+            if len(self.events) > MAX_JOB_EVENTS:
+                excess = len(self.events) - MAX_JOB_EVENTS
+                del self.events[:excess]
+                self.events_dropped += excess
+            self.changed.notify_all()
+
+    def event_count(self):
+        """Events recorded so far, including dropped ones; call with self.changed held."""
+        return self.events_dropped + len(self.events)
+
+    def events_since(self, sent):
+        """Events after the first sent ones that are still kept; call with self.changed held."""
+        return self.events[max(sent - self.events_dropped, 0):]
+
+    def start(self):
+        with self.changed:
+            self.status = RUNNING
+            self.changed.notify_all()
+
+    def finish(self, result):
+        with self.changed:
+            self.result = result
+            self.status = DONE if result["status"] == "ok" else FAILED
+            self.changed.notify_all()
+
+    def to_dict(self, include_result=True):
+        info = dict(self.record, job_id=self.job_id, status=self.status, subscribers=self.subscribers,
+                    submitted_at=self.submitted_at, events=self.event_count())
+        if self.result is not None:
+            info["latency_s"] = self.result["latency_s"]
+            if include_result:
+                info["result"] = self.result.get("result")
+                info["error"] = self.result.get("error")
+        return info
+
+
+class MLACEService:
+    """Job queue, single-flight table and worker threads shared by all HTTP requests."""
+    def __init__(self, workers=2, default_system="dreamteam", max_finished_jobs=500):
+        self.default_system = default_system
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self.in_flight = {}  # single-flight key → job still queued or running
+        self.finished = []
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.progress = JobProgressStdout(sys.stdout)
+        sys.stdout = self.progress  # restored by close()
+        self.workers = []
+        for index in range(workers):
+            worker = threading.Thread(target=self.worker_loop, name=f"mlace-worker-{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    @staticmethod
+    def single_flight_key(problem, domain, system):
+        normalized = " ".join(problem.split()).lower()
+        return hashlib.sha256(f"{system}\n{domain}\n{normalized}".encode()).hexdigest()
+
+    def submit(self, problem, domain="General", system=None):
+        """Returns (job, coalesced)."""
+        system = system or self.default_system
+        if system not in SYSTEMS:
+            raise ValueError(f"Unknown system '{system}'; expected one of {sorted(SYSTEMS)}")
+        key = self.single_flight_key(problem, domain, system)
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                return job, True
+            job = Job(problem, domain, system, key)
+            self.jobs[job.job_id] = job
+            self.in_flight[key] = job
+        job.add_event(f"Queued for {system} ({self.queue.qsize()} jobs ahead)")
+        self.queue.put(job)
+        return job, False
+
+    def worker_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:  # close()
+                break
+            job.start()
+            job.add_event("Started")
+            token = self.progress.bind(job)
+            try:
+                # solve() reuses this worker's MultiAgentSystem and never raises
+                result = solve(job.record)
+            finally:
+                self.progress.unbind(token)
+            job.add_event(f"Finished with status {result['status']} in {result['latency_s']:.1f}s")
+            with self.lock:
+                self.in_flight.pop(job.key, None)
+                self.finished.append(job.job_id)
+                while len(self.finished) > self.max_finished_jobs:
+                    self.jobs.pop(self.finished.pop(0), None)
+            job.finish(result)
+
+    def close(self, timeout=None):
+        """
+        Stops the workers once the jobs already queued are done and puts the original
+        sys.stdout back.
+        """
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+        if sys.stdout is self.progress:
+            sys.stdout = self.progress.stream
+
+    def health(self):
+        with self.lock:
+            return {
+                "status": "ok",
+                "workers": len(self.workers),
+                "queued": self.queue.qsize(),
+                "in_flight": len(self.in_flight),
+                "jobs": len(self.jobs),
+            }
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    service = None  # set by serve()
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def find_job(self, job_id):
+        job = self.service.jobs.get(job_id)
+        if job is None:
+            self.send_json(404, {"error": f"Unknown job '{job_id}'"})
+        return job
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self.send_json(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            return self.send_json(400, {"error": f"Invalid JSON body: {e}"})
+        if not isinstance(payload, dict) or not str(payload.get("problem", "")).strip():
+            return self.send_json(400, {"error": "Field 'problem' is required"})
+        try:
+            job, coalesced = self.service.submit(payload["problem"], payload.get("domain", "General"), payload.get("system"))
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        self.send_json(202, {"job_id": job.job_id, "status": job.status, "coalesced": coalesced,
+                             "links": {"self": f"/jobs/{job.job_id}", "events": f"/jobs/{job.job_id}/events"}})
+
+    def do_GET(self):
+        parts = [part for part in urlparse(self.path).path.split("/") if part]
+        if parts == ["health"]:
+            return self.send_json(200, self.service.health())
+        if parts == ["metrics"]:
+            return self.send_metrics()
+        if parts == ["jobs"]:
+            return self.send_json(200, [job.to_dict(include_result=False) for job in list(self.service.jobs.values())])
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self.find_job(parts[1])
+            return job and self.send_json(200, job.to_dict())
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = self.find_job(parts[1])
+            return job and self.stream_events(job)
+        self.send_json(404, {"error": "Not found"})
+
+    def send_metrics(self):
+        health = self.service.health()
+        for state in ("queued", "in_flight", "jobs"):
+            SERVICE_JOBS.labels(state=state).set(health[state])
+        body = metrics.REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", metrics.CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self, job):
+        """Server-sent events: replays the progress so far, then follows the job until it finishes."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                with job.changed:
+                    if sent == job.event_count() and job.status in (QUEUED, RUNNING):
+                        job.changed.wait(timeout=15)
+                    # A slow client may fall behind by more than MAX_JOB_EVENTS; it skips what was dropped
+                    events, sent = job.events_since(sent), job.event_count()
+                    finished = job.status not in (QUEUED, RUNNING)
+                for event in events:
+                    self.wfile.write(f"event: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if not events and not finished:
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+                if finished:
+                    self.wfile.write(f"event: {job.status}\ndata: {json.dumps(job.to_dict(), ensure_ascii=False, default=str)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away; the job keeps running
+
+    def log_message(self, format, *args):
+        self.service.progress.stream.write(f"{Fore.LIGHTBLACK_EX}[HTTP] {self.address_string()} {format % args}{Style.RESET_ALL}\n")
+
+
+def serve(host="127.0.0.1", port=8080, workers=2, system="dreamteam"):
+    """Returns the HTTP server; server.service is the MLACEService to close() after shutdown."""
+    service = MLACEService(workers=workers, default_system=system)
+    ServiceRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"{Fore.CYAN}[Service] Listening on http://{host}:{server.server_address[1]} "
+          f"with {workers} workers (default system: {system}){Style.RESET_ALL}")
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve MLACE over HTTP with a job queue.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2, help="problems solved concurrently")
+    parser.add_argument("--system", choices=sorted(SYSTEMS), default="dreamteam",
+                        help="orchestrator for requests that don't name one")
+    parser.add_argument("--trace-dir", help="write each job's span trace here (off by default)")
+    parser.add_argument("--checkpoint-dir", help="checkpoint each job's stages here (off by default)")
+    args = parser.parse_args(argv)
+    configure_outputs(args.trace_dir, args.checkpoint_dir)
+
+    server = serve(args.host, args.port, args.workers, args.system)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{Fore.CYAN}[Service] Shutting down{Style.RESET_ALL}")
+    finally:
+        server.server_close()
+        server.service.close(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
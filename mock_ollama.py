@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an Ollama server, for load and concurrency testing without a GPU.
+
+Speaks the parts of the Ollama HTTP API the orchestrators use (POST /api/chat, streamed or
+not, plus GET /api/tags and /api/version) and models how a real server behaves under load:
+    - `parallel` slots (OLLAMA_NUM_PARALLEL): at most that many requests generate at once,
+    - a bounded queue (OLLAMA_MAX_QUEUE): beyond it requests get 503 "server busy",
+    - latency from token rates: prompt tokens / prompt_rate + completion tokens / token_rate,
+      and per-slot generation slows down as more slots are busy (shared GPU),
+    - occasional errors (error_rate → HTTP 500).
+Response text is synthetic, or served from a trace recorded with MLACE_LLM_BACKEND=record so
+the orchestrators see realistic answers.
+
+Usage:
+    python mock_ollama.py --port 11435 --parallel 4 --max-queue 64 --token-rate 40
+    OLLAMA_HOST=http://127.0.0.1:11435 python mlace_dreamteam.py
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from colorama import Fore, Style
+
+import llm_backend
+
+FILLER_WORDS = ("the solution balances cost risk and delivery by staging the work into measurable "
+                "milestones with clear owners and review points").split()
+
+
+def count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class MockOllama:
+    """Slot, queue and latency model shared by all request handler threads."""
+    def __init__(self, parallel=4, max_queue=64, prompt_rate=800.0, token_rate=40.0, completion_tokens=300,
+                 contention=0.15, error_rate=0.0, time_scale=1.0, trace_path=None, seed=0):
+        self.parallel = parallel
+        self.max_queue = max_queue
+        self.prompt_rate = prompt_rate  # prompt tokens evaluated per second
+        self.token_rate = token_rate  # completion tokens generated per second by one busy slot
+        self.completion_tokens = completion_tokens  # mean length of synthetic answers
+        self.contention = contention  # per extra busy slot, each slot generates this much slower
+        self.error_rate = error_rate
+        self.time_scale = time_scale  # < 1 shrinks every modelled duration
+        self.replay = llm_backend.ReplayBackend(trace_path, latency="none") if trace_path else None
+        self.random = random.Random(seed)
+        self.slots = threading.Semaphore(parallel)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.busy = 0
+        self.stats = {"requests": 0, "completed": 0, "rejected": 0, "errors": 0, "max_queued": 0, "max_busy": 0}
+
+    def admit(self):
+        """Reserves a queue place; False when the queue is full."""
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                return False
+            self.queued += 1
+            return True
+
+    def answer(self, model, messages):
+        if self.replay is not None:
+            response = self.replay.chat(model=model, messages=messages)
+            return str(response.get("message", {}).get("content", ""))
+        with self.lock:
+            length = max(1, int(self.random.expovariate(1.0 / self.completion_tokens)))
+        prompt = str(messages[-1].get("content", "")) if messages else ""
+        words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(length)]
+        return (f"Mock answer to: {' '.join(prompt.split()[:12])}\n\n{' '.join(words)}\n\n"
+                f"Confidence Score: 85%\n**Confidence Score:** 8/10")
+
+    def generate(self, model, messages):
+        """Waits for a slot, then sleeps for the modelled prompt evaluation and generation time."""
+        queued_at = time.time()
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.stats["max_queued"] = max(self.stats["max_queued"], self.queued)
+            self.slots.acquire()
+        with self.lock:
+            self.queued -= 1
+            self.busy += 1
+            self.stats["max_busy"] = max(self.stats["max_busy"], self.busy)
+            busy = self.busy
+            failed = self.random.random() < self.error_rate
+        try:
+            prompt_tokens = count_tokens("".join(str(m.get("content", "")) for m in messages))
+            prompt_eval = prompt_tokens / self.prompt_rate
+            if failed:
+                time.sleep(prompt_eval * self.time_scale)
+                raise RuntimeError("model runner has unexpectedly stopped")
+            content = self.answer(model, messages)
+            completion_tokens = count_tokens(content)
+            eval_time = completion_tokens / self.token_rate * (1 + self.contention * (busy - 1))
+            time.sleep((prompt_eval + eval_time) * self.time_scale)
+        finally:
+            with self.lock:
+                self.busy -= 1
+            self.slots.release()
+        ns = lambda seconds: int(seconds * self.time_scale * 1e9)
+        with self.lock:
+            self.stats["completed"] += 1
+        return {
+            "model": model,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.time() - queued_at) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": ns(prompt_eval),
+            "eval_count": completion_tokens,
+            "eval_duration": ns(eval_time),
+        }
+
+    def report(self):
+        with self.lock:
+            stats = dict(self.stats, queued=self.queued, busy=self.busy)
+        return stats
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    mock = None  # set by serve()
+    quiet = True
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            return self.send_json(200, {"version": "0.0.0-mock"})
+        if self.path == "/api/tags":
+            return self.send_json(200, {"models": [{"name": "mock", "model": "mock"}]})
+        if self.path == "/mock/stats":
+            return self.send_json(200, self.mock.report())
+        self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            return self.send_json(404, {"error": "not found"})
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except (ValueError, json.JSONDecodeError) as e:
+            return self.send_json(400, {"error": f"invalid request: {e}"})
+        if not self.mock.admit():
+            return self.send_json(503, {"error": "server busy, please try again.  maximum pending requests exceeded"})
+        try:
+            response = self.mock.generate(payload.get("model", "mock"), payload.get("messages", []))
+        except RuntimeError as e:
+            with self.mock.lock:
+                self.mock.stats["errors"] += 1
+            return self.send_json(500, {"error": str(e)})
+        if payload.get("stream", True) is False:
+            return self.send_json(200, response)
+        # Streaming: one NDJSON chunk per line of the answer, then the final "done" chunk with the counts
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in response["message"]["content"].splitlines(keepends=True):
+            chunk = {"model": response["model"], "created_at": response["created_at"],
+                     "message": {"role": "assistant", "content": line}, "done": False}
+            self.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+        final = dict(response, message={"role": "assistant", "content": ""})
+        self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            sys.stderr.write(f"{Fore.LIGHTBLACK_EX}[MockOllama] {format % args}{Style.RESET_ALL}\n")
+
+
+def serve(host="127.0.0.1", port=11435, **options):
+    """Starts the mock in a background thread; returns (server, mock). port=0 picks a free port."""
+    mock = MockOllama(**options)
+    MockOllamaHandler.mock = mock
+    server = ThreadingHTTPServer((host, port), MockOllamaHandler)
+    server.daemon_threads = True
+    server.request_queue_size = max(64, mock.max_queue + mock.parallel)
+    threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True).start()
+    print(f"{Fore.CYAN}[MockOllama] Listening on http://{host}:{server.server_address[1]} with {mock.parallel} slots, "
+          f"queue {mock.max_queue}, {mock.token_rate:g} tokens/s per slot{Style.RESET_ALL}")
+    return server, mock
+
+
+def add_model_arguments(parser):
+    parser.add_argument("--parallel", type=int, default=4, help="requests generated at once (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--max-queue", type=int, default=64, help="waiting requests before 503 (OLLAMA_MAX_QUEUE)")
+    parser.add_argument("--prompt-rate", type=float, default=800.0, help="prompt tokens evaluated per second")
+    parser.add_argument("--token-rate", type=float, default=40.0, help="completion tokens per second per slot")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="mean synthetic answer length")
+    parser.add_argument("--contention", type=float, default=0.15, help="slow-down per additional busy slot")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier on every modelled duration")
+    parser.add_argument("--trace", help="serve answers from this recorded trace instead of synthetic text")
+
+
+def model_options(args):
+    return {"parallel": args.parallel, "max_queue": args.max_queue, "prompt_rate": args.prompt_rate,
+            "token_rate": args.token_rate, "completion_tokens": args.completion_tokens,
+            "contention": args.contention, "error_rate": args.error_rate, "time_scale": args.time_scale,
+            "trace_path": args.trace}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Ollama /api/chat server with slots, queueing and errors.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    add_model_arguments(parser)
+    args = parser.parse_args(argv)
+    MockOllamaHandler.quiet = not args.verbose
+
+    server, mock = serve(args.host, args.port, **model_options(args))
+    try:
+        while True:
+            time.sleep(10)
+            stats = mock.report()
+            print(f"{Fore.CYAN}[MockOllama] {stats['completed']} completed, {stats['rejected']} rejected, "
+                  f"{stats['errors']} errors, {stats['busy']} busy, {stats['queued']} queued{Style.RESET_ALL}")
+    except KeyboardInterrupt:
+        print(f"{Fore.CYAN}[MockOllama] Shutting down{Style.RESET_ALL}")
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
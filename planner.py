@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Dry-run execution plans: what a run would cost before any LLM call is made.
+
+Each MultiAgentSystem.plan(problem, ...) lists the stages of a run with the LLM calls they
+make, both the expected number and the worst case where every refinement and critique loop
+runs to its limit, and turns them into tokens and wall time with a CostModel. The model is
+calibrated from the traces earlier runs exported to trace_dir: per agent the mean latency and
+token counts of its calls, per system how often each agent is called in a run (and, for the
+dream team, how many experts a run assembles). Without history it falls back to DEFAULT_CALL.
+
+A scheduler uses the plan to fit a latency budget, e.g. dream team runs with or without peer
+review, or with a capped team size:
+    plan = system.plan(problem, domain, budget_s=300)
+    plan["recommendation"]  # {"peer_review": False, "max_team_size": 3, "seconds": 271.4, ...}
+
+From the shell:
+    python planner.py --system dreamteam --budget 300 "Reduce discharge time by 20%"
+"""
+import os
+import sys
+import glob
+import json
+import math
+import argparse
+import importlib
+import threading
+import statistics
+from colorama import Fore, Style
+
+import tracing
+
+# Per-call cost assumed for agents without recorded calls
+DEFAULT_CALL = {"seconds": 12.0, "prompt_tokens": 600, "completion_tokens": 400}
+CHARS_PER_TOKEN = 4
+MIN_SAMPLES = 3  # calls an agent needs before its own mean replaces the overall mean
+TRACE_LIMIT = 50  # most recent traces read for calibration
+
+_models = {}
+_lock = threading.Lock()
+
+
+class CostModel:
+    """Per-agent call costs and per-run call counts from exported run traces."""
+    def __init__(self, source=None):
+        self.source = source
+        self.samples = {}  # agent → [(seconds, prompt_tokens, completion_tokens)]
+        self.runs = []  # per run: {agent: calls, (top-level stage, agent): calls}
+
+    @classmethod
+    def from_traces(cls, directory, limit=TRACE_LIMIT):
+        model = cls(directory)
+        if not directory:
+            return model
+        paths = sorted(glob.glob(os.path.join(directory, "*.trace.json")), key=os.path.getmtime, reverse=True)
+        for path in paths[:limit]:
+            try:
+                tracer = tracing.Tracer.load(path)
+            except (OSError, ValueError, KeyError, StopIteration):
+                continue  # partially written or foreign file
+            model.add_run(tracer)
+        return model
+
+    def add_run(self, tracer):
+        by_id = {span.span_id: span for span in tracer.spans}
+        calls = {}
+        for span in tracer.spans:
+            if span.kind != "llm":
+                continue
+            agent = span.attrs.get("agent") or span.name[len("llm "):]
+            stage = span
+            while stage.parent_id in by_id and by_id[stage.parent_id].parent_id is not None:
+                stage = by_id[stage.parent_id]
+            for key in (agent, (stage.name, agent)):
+                calls[key] = calls.get(key, 0) + 1
+            self.samples.setdefault(agent, []).append((
+                span.duration, span.attrs.get("prompt_tokens") or 0, span.attrs.get("completion_tokens") or 0,
+            ))
+        if calls:
+            self.runs.append(calls)
+
+    @property
+    def calls(self):
+        return sum(len(samples) for samples in self.samples.values())
+
+    def cost(self, agents):
+        """Mean cost of one call by any of agents (a name or a list), else of any recorded call."""
+        agents = [agents] if isinstance(agents, str) else list(agents)
+        samples = [sample for agent in agents for sample in self.samples.get(agent, [])]
+        if len(samples) < MIN_SAMPLES:
+            samples = [sample for pool in self.samples.values() for sample in pool]
+        if not samples:
+            return dict(DEFAULT_CALL, calibrated=False)
+        seconds = sorted(s for s, _, _ in samples)
+        return {
+            "seconds": statistics.fmean(seconds),
+            "p90_seconds": seconds[min(len(seconds) - 1, int(0.9 * len(seconds)))],
+            "prompt_tokens": statistics.fmean(p for _, p, _ in samples),
+            "completion_tokens": statistics.fmean(c for _, _, c in samples),
+            "calibrated": True,
+        }
+
+    def runs_with(self, marker):
+        """Recorded runs of one system, recognised by an agent only that system calls."""
+        return [run for run in self.runs if marker in run]
+
+    @staticmethod
+    def mean_calls(runs, agent, default, stage=None):
+        """
+        Mean calls per run of agent (0 in runs without it), counting only the calls made inside
+        the top-level span named stage when given; default without history.
+        """
+        if not runs:
+            return default
+        key = agent if stage is None else (stage, agent)
+        return statistics.fmean(run.get(key, 0) for run in runs)
+
+    @staticmethod
+    def team_sizes(runs, known):
+        """Number of distinct agents outside known in each run (the dream team's experts)."""
+        return [len([agent for agent in run if isinstance(agent, str) and agent not in known]) for run in runs]
+
+    @staticmethod
+    def other_agents(runs, known):
+        return sorted({agent for run in runs for agent in run if isinstance(agent, str) and agent not in known})
+
+
+def load_model(directory, limit=TRACE_LIMIT):
+    """CostModel of directory, re-read only when a trace was added or rewritten."""
+    paths = glob.glob(os.path.join(directory, "*.trace.json")) if directory else []
+    signature = (len(paths), max((os.path.getmtime(p) for p in paths), default=0), limit)
+    with _lock:
+        cached = _models.get(directory)
+        if cached is None or cached[0] != signature:
+            cached = _models[directory] = (signature, CostModel.from_traces(directory, limit))
+        return cached[1]
+
+
+class Plan:
+    """
+    Stages in run order, each a list of steps (one agent's calls). Steps of a stage run one
+    after the other and the calls of a step `parallel` at a time; a stage starts when the
+    stages it depends on (by default the one before it) have finished.
+    """
+    def __init__(self, system, problem, model, **options):
+        self.system = system
+        self.problem = problem
+        self.model = model
+        self.options = options
+        self.stages = []
+        self.details = {}  # system-specific extras copied into as_dict()
+
+    def stage(self, name, depends_on=None):
+        if depends_on is None:
+            depends_on = [self.stages[-1]["stage"]] if self.stages else []
+        self.stages.append({"stage": name, "depends_on": list(depends_on), "steps": []})
+        return self
+
+    def add(self, agent, calls, worst=None, parallel=1, cost_of=None, note=None):
+        """calls expected (may be fractional), worst at most; cost_of names the agents to calibrate from."""
+        cost = self.model.cost(cost_of or agent)
+        if not cost["calibrated"]:
+            cost["prompt_tokens"] += len(self.problem) / CHARS_PER_TOKEN
+        worst = calls if worst is None else worst
+        calls = min(calls, worst)  # history recorded under larger limits
+        self.stages[-1]["steps"].append({
+            "agent": agent, "calls": calls, "worst_calls": worst, "parallel": max(parallel, 1),
+            "cost": cost, "note": note,
+        })
+        return self
+
+    def expected(self, runs, agent, default):
+        """Mean calls of agent inside the current stage over the recorded runs."""
+        return CostModel.mean_calls(runs, agent, default, self.stages[-1]["stage"])
+
+    def add_refinement(self, agent, mode, max_attempts, candidates, runs):
+        """Prompt refinement: sequential attempts until confident, or best_of_n concurrent candidates."""
+        if mode == "best_of_n":
+            return self.add(agent, candidates, parallel=candidates, note="concurrent candidates")
+        return self.add(agent, self.expected(runs, agent, min(2, max_attempts)), worst=max_attempts,
+                        note="stops once confident")
+
+    def add_batched_critique(self, mode, graded, runs, k):
+        """main/agile EvaluatorAgent: one batched grading of the graded agents, then critique of the low scorers."""
+        critiques = self.expected(runs, "ResponseCritiqueAgent", 1)
+        self.add("EvaluatorAgent", self.expected(runs, "EvaluatorAgent", 1 + critiques),
+                 worst=2 if mode == "tournament" else 5, note="batched grading, pre-screen retries and re-grades")
+        if not graded:
+            return self
+        self.add("retries", 0, worst=len(graded), cost_of=graded, note="outputs the pre-screen rejects run once more")
+        if mode == "tournament":
+            self.add("EvaluatorAgent", 0, worst=len(graded), parallel=len(graded), note="tournament grading per low scorer")
+            self.add("ResponseCritiqueAgent", critiques, worst=len(graded) * k, parallel=len(graded) * k,
+                     note="concurrent tournaments")
+        else:
+            self.add("ResponseCritiqueAgent", critiques, worst=3 * len(graded), note="up to 3 rounds over the low scorers")
+        return self
+
+    @staticmethod
+    def rounds(calls, parallel):
+        """Round trips for calls issued parallel at a time (expected counts may be fractional)."""
+        if parallel <= 1:
+            return calls
+        return calls / parallel if calls != int(calls) else math.ceil(calls / parallel)
+
+    def stage_totals(self, stage):
+        totals = dict.fromkeys(["calls", "worst_calls", "tokens", "worst_tokens", "seconds", "worst_seconds"], 0.0)
+        for step in stage["steps"]:
+            cost = step["cost"]
+            tokens = cost["prompt_tokens"] + cost["completion_tokens"]
+            totals["calls"] += step["calls"]
+            totals["worst_calls"] += step["worst_calls"]
+            totals["tokens"] += step["calls"] * tokens
+            totals["worst_tokens"] += step["worst_calls"] * tokens
+            totals["seconds"] += self.rounds(step["calls"], step["parallel"]) * cost["seconds"]
+            totals["worst_seconds"] += self.rounds(step["worst_calls"], step["parallel"]) * cost.get("p90_seconds", cost["seconds"])
+        return totals
+
+    def as_dict(self):
+        stages, finish, worst_finish = [], {}, {}
+        for stage in self.stages:
+            totals = self.stage_totals(stage)
+            start = max((finish[name] for name in stage["depends_on"] if name in finish), default=0.0)
+            worst_start = max((worst_finish[name] for name in stage["depends_on"] if name in worst_finish), default=0.0)
+            finish[stage["stage"]] = start + totals["seconds"]
+            worst_finish[stage["stage"]] = worst_start + totals["worst_seconds"]
+            stages.append(dict(
+                {key: round(value, 1) for key, value in totals.items()},
+                stage=stage["stage"], depends_on=stage["depends_on"], start_s=round(start, 1),
+                steps=[{
+                    "agent": step["agent"], "calls": round(step["calls"], 2), "worst_calls": step["worst_calls"],
+                    "parallel": step["parallel"], "seconds_per_call": round(step["cost"]["seconds"], 2),
+                    "tokens_per_call": round(step["cost"]["prompt_tokens"] + step["cost"]["completion_tokens"]),
+                    "calibrated": step["cost"]["calibrated"], "note": step["note"],
+                } for step in stage["steps"]],
+            ))
+        total = {key: round(sum(stage[key] for stage in stages), 1)
+                 for key in ("calls", "worst_calls", "tokens", "worst_tokens")}
+        total["llm_seconds"] = round(sum(stage["seconds"] for stage in stages), 1)
+        total["seconds"] = round(max(finish.values(), default=0.0), 1)  # critical path through the stages
+        total["worst_seconds"] = round(max(worst_finish.values(), default=0.0), 1)
+        return dict({
+            "system": self.system,
+            "problem_chars": len(self.problem),
+            "options": dict(self.options),
+            "stages": stages,
+            "total": total,
+            "calibration": {"source": self.model.source, "runs": len(self.model.runs), "calls": self.model.calls},
+        }, **self.details)
+
+
+def recommend(candidates, budget_s):
+    """
+    candidates: (options, plan dict) from most to least thorough. Returns the first whose
+    expected wall time fits budget_s, else the fastest one with fits=False.
+    """
+    for options, plan in candidates:
+        if plan["total"]["seconds"] <= budget_s:
+            return dict(options, seconds=plan["total"]["seconds"], worst_seconds=plan["total"]["worst_seconds"],
+                        calls=plan["total"]["calls"], fits=True)
+    options, plan = min(candidates, key=lambda candidate: candidate[1]["total"]["seconds"])
+    return dict(options, seconds=plan["total"]["seconds"], worst_seconds=plan["total"]["worst_seconds"],
+                calls=plan["total"]["calls"], fits=False)
+
+
+def report(plan):
+    """Prints a plan returned by MultiAgentSystem.plan()."""
+    calibration = plan["calibration"]
+    source = (f"{calibration['runs']} traced runs, {calibration['calls']} calls in {calibration['source']}"
+              if calibration["calls"] else "no recorded runs, default call costs")
+    print(f"{Fore.CYAN}[Plan] {plan['system']} ({source}){Style.RESET_ALL}")
+    print(f"  {'stage':<28} {'calls':>7} {'worst':>6} {'tokens':>9} {'worst':>9} {'seconds':>9} {'worst':>9}")
+    for stage in plan["stages"]:
+        print(f"  {stage['stage'][:28]:<28} {stage['calls']:7.1f} {stage['worst_calls']:6.0f} {stage['tokens']:9.0f} "
+              f"{stage['worst_tokens']:9.0f} {stage['seconds']:9.1f} {stage['worst_seconds']:9.1f}")
+    total = plan["total"]
+    print(f"{Fore.GREEN}  {'total (wall time on the critical path)':<28} {total['calls']:7.1f} {total['worst_calls']:6.0f} "
+          f"{total['tokens']:9.0f} {total['worst_tokens']:9.0f} {total['seconds']:9.1f} {total['worst_seconds']:9.1f}"
+          f"{Style.RESET_ALL}")
+    recommendation = plan.get("recommendation")
+    if recommendation:
+        colour = Fore.GREEN if recommendation["fits"] else Fore.RED
+        options = ", ".join(f"{key}={recommendation[key]}" for key in plan.get("tunable", []))
+        verdict = "fits" if recommendation["fits"] else "does NOT fit"
+        print(f"{colour}[Plan] Budget {plan['options']['budget_s']}s: {options} → {recommendation['seconds']}s "
+              f"expected ({recommendation['worst_seconds']}s worst case), {verdict}{Style.RESET_ALL}")
+
+
+def main(argv=None):
+    from mlace_batch import SYSTEMS
+    parser = argparse.ArgumentParser(description="Dry-run plan of an MLACE run: LLM calls, tokens and wall time.")
+    parser.add_argument("problem", help="problem statement")
+    parser.add_argument("--system", choices=sorted(SYSTEMS), default="dreamteam")
+    parser.add_argument("--domain", default="General")
+    parser.add_argument("--budget", type=float, default=None, help="latency budget in seconds (dreamteam: suggests a setup)")
+    parser.add_argument("--json", action="store_true", help="print the plan as JSON")
+    args = parser.parse_args(argv)
+
+    module_name, config_file = SYSTEMS[args.system]
+    system = importlib.import_module(module_name).MultiAgentSystem(config_file=config_file)
+    if args.system == "agile":
+        plan = system.plan(args.problem)
+    elif args.system == "dreamteam":
+        plan = system.plan(args.problem, args.domain, budget_s=args.budget)
+    else:
+        plan = system.plan(args.problem, args.domain)
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        report(plan)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
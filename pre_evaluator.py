@@ -0,0 +1,122 @@
+# pre_evaluator.py
+import re
+import threading
+from colorama import Fore, Style
+
+# Markers that only show up when an agent or the LLM backend failed
+ERROR_MARKERS = [
+    "[ERROR",
+    "Traceback (most recent call last)",
+    "⚠️ Failed to fetch",
+    "DynamicAgent not found.",
+]
+
+STOPWORDS = {
+    "that", "this", "with", "from", "into", "while", "which", "their", "there", "these", "those",
+    "have", "will", "should", "would", "could", "about", "such", "each", "than", "then", "them",
+    "they", "what", "when", "where", "your", "also", "more", "most", "over", "under", "within",
+    "without", "ensure", "provide", "using", "based", "develop", "following", "refined", "problem",
+    "statement", "objective", "confidence", "score",
+}
+
+PASS, FAIL, BORDERLINE = "pass", "fail", "borderline"
+
+
+class HeuristicPreEvaluator:
+    """
+    Fast local pre-screen that runs before the LLM-based EvaluatorAgent.
+    Obvious failures (empty output, "ERROR" from OllamaInterface, far too short, off-topic)
+    and obvious passes (long, on-topic, all required sections present) are decided locally;
+    only borderline responses are sent to the LLM evaluator.
+    """
+    def __init__(self, enabled=True, min_length=200, pass_length=1500, fail_coverage=0.15,
+                 pass_coverage=0.7, required_sections=None, pass_score=85, fail_score=0):
+        self.enabled = enabled
+        self.min_length = min_length
+        self.pass_length = pass_length
+        self.fail_coverage = fail_coverage
+        self.pass_coverage = pass_coverage
+        self.required_sections = required_sections or []
+        self.pass_score = pass_score
+        self.fail_score = fail_score
+        self.lock = threading.Lock()  # tournaments and parallel roles screen concurrently
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"screened": 0, PASS: 0, FAIL: 0, BORDERLINE: 0}
+
+    def count(self, verdict):
+        with self.lock:
+            self.stats["screened"] += 1
+            self.stats[verdict] += 1
+
+    @staticmethod
+    def extract_keywords(objective):
+        words = re.findall(r"[a-zA-Z][a-zA-Z0-9\-]{3,}", objective or "")
+        return {word.lower() for word in words if word.lower() not in STOPWORDS}
+
+    def keyword_coverage(self, response, objective):
+        keywords = self.extract_keywords(objective)
+        if not keywords:
+            return 1.0
+        response_lower = response.lower()
+        return sum(1 for keyword in keywords if keyword in response_lower) / len(keywords)
+
+    def missing_sections(self, response):
+        response_lower = response.lower()
+        return [section for section in self.required_sections if section.lower() not in response_lower]
+
+    def screen(self, response, objective):
+        """
+        Returns (verdict, score, reasons) where verdict is "pass", "fail" or "borderline".
+        Borderline responses carry score None and must be graded by the LLM evaluator.
+        """
+        if not self.enabled:
+            return BORDERLINE, None, ["pre-screen disabled"]
+
+        text = str(response or "").strip()
+        reasons = []
+
+        if not text:
+            reasons.append("empty output")
+        elif text == "ERROR" or text.startswith("ERROR"):
+            reasons.append("LLM backend returned ERROR")
+        else:
+            reasons.extend(f"error marker '{marker}'" for marker in ERROR_MARKERS if marker in text)
+            if len(text) < self.min_length:
+                reasons.append(f"too short ({len(text)} < {self.min_length} chars)")
+
+        coverage = self.keyword_coverage(text, objective) if text else 0.0
+        if text and coverage < self.fail_coverage:
+            reasons.append(f"off-topic (keyword coverage {coverage:.0%})")
+
+        if reasons:
+            self.count(FAIL)
+            return FAIL, self.fail_score, reasons
+
+        missing = self.missing_sections(text)
+        if len(text) >= self.pass_length and coverage >= self.pass_coverage and not missing:
+            self.count(PASS)
+            return PASS, self.pass_score, [f"{len(text)} chars, keyword coverage {coverage:.0%}"]
+
+        self.count(BORDERLINE)
+        reasons.append(f"{len(text)} chars, keyword coverage {coverage:.0%}")
+        if missing:
+            reasons.append(f"missing sections {missing}")
+        return BORDERLINE, None, reasons
+
+    def skip_rate(self, stats=None):
+        """Share of screened responses that never reached the LLM evaluator."""
+        stats = stats or self.stats
+        if not stats["screened"]:
+            return 0.0
+        return (stats[PASS] + stats[FAIL]) / stats["screened"]
+
+    def report(self):
+        with self.lock:
+            stats = dict(self.stats)
+        print(f"{Fore.CYAN}[PreEvaluator] Screened {stats['screened']} responses: "
+              f"{stats[PASS]} accepted, {stats[FAIL]} rejected, {stats[BORDERLINE]} sent to LLM "
+              f"→ skip rate {self.skip_rate(stats):.0%}{Style.RESET_ALL}")
+        return dict(stats, skip_rate=self.skip_rate(stats))
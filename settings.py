@@ -0,0 +1,73 @@
+# settings.py
+"""
+config.json, read on first use instead of at import time.
+
+Importing an orchestrator no longer touches the file system; the first settings.value()
+call loads config.json from the working directory (or MLACE_CONFIG) and caches it.
+Parameters that used to default to a module constant now default to settings.CONFIG:
+
+    def refine(self, problem, max_attempts=settings.CONFIG):
+        max_attempts = settings.value("max_refinement_attempts", max_attempts)
+"""
+import os
+import json
+import threading
+
+DEFAULTS = {
+    "confidence_threshold": 85,
+    "max_refinement_attempts": 4,
+    "max_confidence_iterations": 5,
+    "refinement_mode": "sequential",  # "sequential" or "best_of_n"
+    "refinement_candidates": None,  # None → max_refinement_attempts
+    "critique_mode": "sequential",  # "sequential" or "tournament"
+    "critique_candidates": 3,
+    # dream team synthesis: "single" prompt or "tree" reduce in groups of synthesis_fan_in, at most synthesis_max_depth levels
+    "synthesis_mode": "single",
+    "synthesis_fan_in": 2,
+    "synthesis_max_depth": None,
+    "checkpoint_dir": "runs",  # None or "" disables checkpoints
+    "artifact_dir": "artifacts",  # agile: role artifacts per workspace, keyed by a hash of their inputs
+    "trace_dir": "traces",  # Chrome-format span trace per run; None or "" disables the export
+    # agile backlog mode: related stories share one call per role while they fit in the group limits
+    "backlog_group_size": 4,
+    "backlog_group_chars": 6000,
+    "backlog_similarity": 0.2,
+    "backlog_workers": 4,
+    # agile: "parallel" runs every role once the roles in its "depends_on" are done; "sequential" keeps the strict order
+    "role_execution": "parallel",
+}
+
+
+class _FromConfig:
+    def __repr__(self):
+        return "<from config.json>"
+
+
+CONFIG = _FromConfig()  # parameter default meaning "use the configured value"
+
+_settings = None
+_lock = threading.Lock()
+
+
+def load():
+    global _settings
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                with open(os.environ.get("MLACE_CONFIG", "config.json"), "r") as config_file:
+                    _settings = json.load(config_file)
+    return _settings
+
+
+def get(key, default=None):
+    """Raw config.json entry, like the old SETTINGS.get(key, default)."""
+    return load().get(key, default)
+
+
+def value(key, override=CONFIG):
+    """override unless it is CONFIG; otherwise the configured value, falling back to DEFAULTS."""
+    if override is not CONFIG:
+        return override
+    if key == "refinement_candidates" and load().get(key) is None:
+        return value("max_refinement_attempts")
+    return load().get(key, DEFAULTS.get(key))
@@ -0,0 +1,31 @@
+# stages.py
+"""
+Checkpointed stages of an orchestrator run. cached() wraps CheckpointStore's replay/record
+with the run's instrumentation: a trace span per stage, LLM calls accounted to the stage,
+the checkpoint cache hit metric, and the deadline rule that output cut short to meet a
+deadline is not stored, so a resumed run redoes that stage in full.
+
+    refined = stages.cached(run.checkpoints, "refine", [problem], lambda: refine(problem))
+"""
+import deadline
+import llm_usage
+import metrics
+import tracing
+from checkpoints import hash_inputs
+
+
+def cached(checkpoints, stage, inputs, compute):
+    """Returns the checkpointed output of stage for these inputs, or computes and stores it."""
+    input_hash = hash_inputs(stage, inputs)
+    with tracing.span(stage):
+        checkpoint = checkpoints.replay(stage, input_hash)
+        if checkpoints.enabled:
+            metrics.record_cache("checkpoint", checkpoint is not None)
+        if checkpoint is not None:
+            tracing.annotate(replayed=True)
+            return checkpoint["output"]
+        with llm_usage.stage(stage):  # LLM calls made by compute() are accounted to this stage
+            skipped = deadline.degraded_count(stage)
+            output = compute()
+    checkpoints.record(stage, input_hash, output, save=deadline.degraded_count(stage) == skipped)
+    return output
@@ -0,0 +1,27 @@
+# conftest.py
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root as flat scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True, scope="session")
+def test_environment(tmp_path_factory):
+    """
+    Runs the tests on settings.DEFAULTS instead of whatever config.json the checkout has, and
+    without the event log's file and console output (tests that check events configure it).
+    """
+    path = tmp_path_factory.mktemp("config") / "config.json"
+    path.write_text("{}")
+    overrides = {"MLACE_CONFIG": str(path), "MLACE_LOG_FILE": "", "MLACE_LOG_CONSOLE": "off"}
+    previous = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    yield path
+    for name, value in previous.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
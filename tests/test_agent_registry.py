@@ -0,0 +1,77 @@
+import collections
+import threading
+
+import pytest
+
+import mlace_main
+from agent_registry import AgentRegistry, LazyAgents
+
+
+class Agent:
+    def __init__(self, name, role, prompt_template=None):
+        self.name, self.role, self.prompt_template = name, role, prompt_template
+
+
+class SpecialAgent(Agent):
+    pass
+
+
+def test_resolve_prefers_the_config_class_then_the_name_then_the_default():
+    registry = AgentRegistry(Agent, {"SpecialAgent": SpecialAgent})
+    assert registry.resolve("SpecialAgent", {}) is SpecialAgent
+    assert registry.resolve("Other", {}) is Agent
+    assert registry.resolve("Other", {"class": "SpecialAgent"}) is SpecialAgent
+    assert registry.resolve("Other", {"class": "collections:OrderedDict"}) is collections.OrderedDict
+    assert registry.resolve("Other", {"class": "collections.Counter"}) is collections.Counter
+    with pytest.raises(ValueError, match="unknown class"):
+        registry.resolve("Other", {"class": "NotRegistered"})
+
+
+def test_register_works_as_a_decorator():
+    registry = AgentRegistry(Agent)
+
+    @registry.register("Decorated")
+    class Decorated(Agent):
+        pass
+
+    assert registry.create("Decorated", {"role": "r", "prompt_template": "t"}).__class__ is Decorated
+
+
+def test_agents_are_built_on_first_lookup_and_reused():
+    agents = LazyAgents(AgentRegistry(Agent), {"A": {"role": "a"}, "B": {"role": "b"}})
+    assert "A" in agents and list(agents) == ["A", "B"] and len(agents) == 2
+    assert agents.built() == []
+    assert agents["A"] is agents["A"]
+    assert agents.built() == ["A"]
+    assert agents.get("missing") is None
+    with pytest.raises(KeyError):
+        agents["missing"]
+
+
+def test_concurrent_lookups_build_one_agent():
+    built = []
+
+    class CountingAgent(Agent):
+        def __init__(self, *args):
+            built.append(args[0])
+            super().__init__(*args)
+
+    agents = LazyAgents(AgentRegistry(CountingAgent), {"A": {"role": "a"}})
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(agents["A"])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert built == ["A"] and all(agent is seen[0] for agent in seen)
+
+
+def test_assigned_agents_join_the_config():
+    agents = LazyAgents(AgentRegistry(Agent))
+    double = Agent("Stub", "stub role")
+    agents["Stub"] = double
+    assert "Stub" in agents and agents["Stub"] is double and agents.configs["Stub"] == {"role": "stub role"}
+
+
+def test_orchestrator_registry_maps_config_names_to_agent_classes():
+    assert mlace_main.AGENT_CLASSES.resolve("EvaluatorAgent", {}) is mlace_main.EvaluatorAgent
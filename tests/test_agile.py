@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import mlace_main_agile
+from mlace_main_agile import split_story_sections
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents_config_agile.json")
+ROLES = ["BusinessAnalystAgent", "SystemArchitectAgent", "DevTeamAgent"]
+
+
+def make_system(role_execution, dependencies):
+    system = mlace_main_agile.MultiAgentSystem(config_file=CONFIG_FILE, role_execution=role_execution,
+                                               trace_dir=None)
+    system.role_dependencies = dependencies
+    return system
+
+
+def test_declared_dependencies_are_kept_in_role_order():
+    system = make_system("parallel", {"BusinessAnalystAgent": [], "SystemArchitectAgent": [],
+                                      "DevTeamAgent": ["SystemArchitectAgent", "BusinessAnalystAgent", "Unknown"]})
+    assert system.resolve_role_dependencies(ROLES) == {
+        "BusinessAnalystAgent": [],
+        "SystemArchitectAgent": [],
+        "DevTeamAgent": ["BusinessAnalystAgent", "SystemArchitectAgent"],
+    }
+
+
+def test_undeclared_roles_wait_for_every_role_before_them():
+    system = make_system("parallel", {"BusinessAnalystAgent": [], "SystemArchitectAgent": None})
+    dependencies = system.resolve_role_dependencies(ROLES)
+    assert dependencies["SystemArchitectAgent"] == ["BusinessAnalystAgent"]
+    assert dependencies["DevTeamAgent"] == ["BusinessAnalystAgent", "SystemArchitectAgent"]
+
+
+def test_sequential_mode_ignores_declared_dependencies():
+    system = make_system("sequential", {name: [] for name in ROLES})
+    assert system.resolve_role_dependencies(ROLES)["DevTeamAgent"] == ["BusinessAnalystAgent", "SystemArchitectAgent"]
+
+
+def test_circular_dependencies_are_rejected():
+    system = make_system("parallel", {"BusinessAnalystAgent": ["DevTeamAgent"], "SystemArchitectAgent": [],
+                                      "DevTeamAgent": ["BusinessAnalystAgent"]})
+    with pytest.raises(ValueError, match="Circular"):
+        system.resolve_role_dependencies(ROLES)
+
+
+def test_split_story_sections():
+    response = "Intro\n### Story 1: Upload\nchunked upload\n## **Story 2**\nvirus scan\n### Story 1\nrepeat"
+    assert split_story_sections(response, 2) == ["chunked upload", "virus scan"]
+
+
+def test_split_story_sections_falls_back_to_the_whole_response():
+    response = "### Story 1\nonly one"
+    assert split_story_sections(response, 2) == [response, response]
@@ -0,0 +1,57 @@
+import json
+
+import mlace_batch
+from mlace_batch import load_completed_ids, load_records, percentile, solve
+
+
+def test_percentile_is_nearest_rank():
+    values = [10, 1, 9, 2, 8, 3, 7, 4, 6, 5]
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile(values, 100) == 10
+    assert percentile(values, 0) == 1
+
+
+def test_percentile_of_nothing_is_zero():
+    assert percentile([], 95) == 0.0
+
+
+def test_load_records_fills_defaults_and_skips_bad_lines(tmp_path):
+    path = tmp_path / "problems.jsonl"
+    path.write_text('{"problem": "bulb", "domain": "X"}\nnot json\n{"domain": "no problem"}\n\n'
+                    '{"id": 7, "problem": "bulb", "system": "agile"}\n')
+    records = load_records(str(path), "dreamteam")
+    assert [(r["system"], r["domain"]) for r in records] == [("dreamteam", "X"), ("agile", "General")]
+    assert records[1]["id"] == "7"
+    assert records[0]["id"] == load_records(str(path), "main")[0]["id"]  # stable across runs for resume
+
+
+def test_only_ok_results_count_as_completed(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"id": "a", "status": "ok"}) + "\n" + json.dumps({"id": "b", "status": "error"})
+                    + '\n{"id": "c", "sta')
+    assert load_completed_ids(str(path)) == {"a"}
+    assert load_completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+class ReportingSystem:
+    """Answers from run_with_report only, so solve can't fall back to state left on the system."""
+
+    def __init__(self):
+        self.calls = []
+
+    def run_with_report(self, problem, domain="General", deadline=None):
+        self.calls.append((problem, domain, deadline))
+        report = {"elapsed_s": 0.1, "met": True} if deadline is not None else None
+        return {"output": f"solved {problem}", "llm_usage": {"calls": 3}, "prescreen": None, "deadline": report}
+
+
+def test_solve_takes_the_run_metadata_from_the_report(monkeypatch):
+    system = ReportingSystem()
+    monkeypatch.setattr(mlace_batch._worker_state, "systems", {"dreamteam": system}, raising=False)
+    record = {"id": "1", "system": "dreamteam", "problem": "bulb", "domain": "X", "deadline_s": 5}
+    result = solve(record)
+    assert system.calls == [("bulb", "X", 5)]
+    assert (result["status"], result["result"], result["llm_usage"]) == ("ok", "solved bulb", {"calls": 3})
+    assert result["deadline"] == {"elapsed_s": 0.1, "met": True}
+    assert "deadline" not in solve(dict(record, deadline_s=None))
@@ -0,0 +1,31 @@
+import pytest
+
+from mlace_benchmark import busy_time, compare
+
+
+def test_busy_time_is_the_union_of_the_calls():
+    calls = [{"started": 0.0, "finished": 2.0}, {"started": 5.0, "finished": 6.0}, {"started": 1.0, "finished": 3.0}]
+    assert busy_time(calls) == pytest.approx(4.0)
+    assert busy_time([]) == 0.0
+
+
+def results(**totals):
+    base = {"calls": 10, "prompt_tokens": 100, "completion_tokens": 50, "wall_s": 1.0, "llm_busy_s": 0.8,
+            "peak_mem_mb": 2.0}
+    return {"scenarios": {"main": {"totals": dict(base, **totals)}}}
+
+
+def test_compare_flags_increases_beyond_the_tolerance():
+    assert compare(results(calls=11), results(), tolerance=0.10) == []
+    assert compare(results(calls=12), results(), tolerance=0.10) == [("main", "calls", 10, 12)]
+
+
+def test_compare_flags_any_increase_from_zero():
+    assert compare(results(calls=1), results(calls=0)) == [("main", "calls", 0, 1)]
+    assert compare(results(calls=0), results(calls=0)) == []
+
+
+def test_compare_skips_metrics_missing_from_the_baseline():
+    baseline = results()
+    del baseline["scenarios"]["main"]["totals"]["llm_busy_s"]
+    assert compare(results(llm_busy_s=5.0), baseline) == []
@@ -0,0 +1,44 @@
+import os
+
+from checkpoints import CheckpointStore, hash_inputs
+
+
+def test_recorded_stage_is_replayed_by_a_resumed_run(tmp_path):
+    input_hash = hash_inputs("refine", ["problem"])
+    store = CheckpointStore("session", str(tmp_path))
+    assert store.replay("refine", input_hash) is None
+    store.record("refine", input_hash, {"refined_problem": "better"})
+
+    resumed = CheckpointStore("session", str(tmp_path))
+    assert resumed.replay("refine", input_hash)["output"] == {"refined_problem": "better"}
+    assert resumed.report()["replayed"] == 1
+
+
+def test_changed_inputs_are_not_replayed(tmp_path):
+    store = CheckpointStore("session", str(tmp_path))
+    store.record("refine", hash_inputs("refine", ["problem"]), "better")
+    assert store.replay("refine", hash_inputs("refine", ["other problem"])) is None
+
+
+def test_record_without_save_only_counts(tmp_path):
+    store = CheckpointStore("session", str(tmp_path))
+    input_hash = hash_inputs("team", [])
+    store.record("team", input_hash, "cut short", save=False)
+    assert store.replay("team", input_hash) is None
+    assert store.report()["executed"] == 1
+
+
+def test_disabled_store_writes_nothing(tmp_path):
+    store = CheckpointStore("session", None)
+    store.record("refine", "hash", "output")
+    assert store.replay("refine", "hash") is None
+    assert store.report()["directory"] is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_path_sanitizes_role_names(tmp_path):
+    store = CheckpointStore("session", str(tmp_path))
+    assert os.path.basename(store.path("Risk Assessor/Lead")) == "Risk_Assessor_Lead.json"
+    long_name = store.path("Expert " * 40)
+    assert len(os.path.basename(long_name)) < 130
+    assert long_name != store.path("Expert " * 41)
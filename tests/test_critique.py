@@ -0,0 +1,36 @@
+import threading
+
+import pytest
+
+import mlace_dreamteam
+import mlace_main
+import mlace_main_agile
+import settings
+
+
+class RecordingInterface:
+    def __init__(self):
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def query(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        return f"refined {len(self.prompts)}"
+
+
+@pytest.mark.parametrize("module", [mlace_main, mlace_dreamteam, mlace_main_agile])
+def test_candidate_count_comes_from_config(module, monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"critique_candidates": 2})
+    critic = module.ResponseCritiqueAgent("ResponseCritiqueAgent", "critic", "")
+    critic.interface = RecordingInterface()
+    assert len(critic.critique_candidates("ResearchAgent", "draft")) == 2
+    assert len(critic.critique_candidates("ResearchAgent", "draft", k=4)) == 4
+
+
+def test_each_candidate_gets_its_own_focus():
+    critic = mlace_dreamteam.ResponseCritiqueAgent("ResponseCritiqueAgent", "critic", "")
+    critic.interface = RecordingInterface()
+    critic.critique_candidates("ResearchAgent", "draft", k=3)
+    for focus in mlace_dreamteam.CRITIQUE_FOCI:
+        assert sum(focus in prompt for prompt in critic.interface.prompts) == 1
@@ -0,0 +1,53 @@
+import llm_usage
+import deadline
+from deadline import Deadline
+
+
+def call(agent, wall_s, error=None):
+    return {"agent": agent, "wall_s": wall_s, "error": error}
+
+
+def test_allows_reserves_time_for_the_stages_ahead():
+    budget = Deadline(10, reserve_calls={"refine": 20, "team": 4}, call_seconds=1.0)
+    with llm_usage.stage("team.review"):
+        assert budget.allows("team.peer_review")
+    with llm_usage.stage("refine"):
+        assert not budget.allows("refine.attempt", detail="attempt 2")
+    assert [(entry["step"], entry["stage"], entry["detail"]) for entry in budget.degraded] == [
+        ("refine.attempt", "refine", "attempt 2")
+    ]
+
+
+def test_seconds_per_call_prefers_the_agents_own_calls():
+    usage = llm_usage.UsageLog()
+    for event in (call("Critic", 4.0), call("Critic", 6.0), call("Writer", 1.0), call("Writer", 9.0, error="timeout")):
+        usage.add(event)
+    budget = Deadline(60, call_seconds=30.0, usage=usage)
+    assert budget.seconds_per_call("Critic") == 5.0
+    assert budget.seconds_per_call("Writer") == 11.0 / 3  # one successful call: falls back to the run's average
+    assert Deadline(60, call_seconds=30.0).seconds_per_call("Critic") == 30.0
+
+
+def test_without_a_deadline_everything_is_allowed():
+    assert deadline.allows("refine.attempt", calls=1000)
+    assert deadline.degraded_count() == 0
+
+
+def test_degraded_count_filters_by_stage():
+    budget = Deadline(0, call_seconds=1.0)
+    with deadline.activate(budget):
+        for stage in ("team", "team.review", "teamwork", "evaluate"):
+            with llm_usage.stage(stage):
+                assert not deadline.allows("step")
+        assert deadline.degraded_count() == 4
+        assert deadline.degraded_count("team") == 2
+        assert deadline.degraded_count("evaluate") == 1
+    assert deadline.degraded_count() == 0
+
+
+def test_report_lists_skipped_steps():
+    budget = Deadline(0, call_seconds=1.0)
+    budget.allows("critique.iteration")
+    report = budget.report()
+    assert report["budget_s"] == 0 and [entry["step"] for entry in report["degraded"]] == ["critique.iteration"]
+    assert Deadline.for_run(None, {}, None) is None
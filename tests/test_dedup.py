@@ -0,0 +1,50 @@
+from mlace_dreamteam import deduplicate_contributions, estimate_jaccard, merge_similar_roles, minhash_signature, shingle_text
+
+SHARED = ("The filament should be made from a tungsten rhenium alloy so that it resists sagging and recrystallisation "
+          "at high operating temperatures over thousands of switching cycles.")
+REWORDED = SHARED.replace("thousands", "tens of thousands")
+DISTINCT = ("Market research shows buyers accept a twenty percent price premium for bulbs with a ten year warranty "
+            "when the packaging explains the expected savings clearly.")
+
+
+def test_minhash_estimates_similarity():
+    assert estimate_jaccard(minhash_signature(shingle_text(SHARED)), minhash_signature(shingle_text(REWORDED))) > 0.6
+    assert estimate_jaccard(minhash_signature(shingle_text(SHARED)), minhash_signature(shingle_text(DISTINCT))) < 0.2
+
+
+def test_later_near_duplicate_paragraphs_are_dropped():
+    outputs = {
+        "Materials Engineer": f"## Materials\n\n{SHARED}",
+        "Reliability Engineer": f"## Reliability\n\n{REWORDED}\n\n{DISTINCT}",
+    }
+    deduplicated, stats = deduplicate_contributions(outputs)
+    assert deduplicated["Materials Engineer"] == outputs["Materials Engineer"]
+    assert deduplicated["Reliability Engineer"] == f"## Reliability\n\n{DISTINCT}"
+    assert stats["paragraphs_removed"] == 1
+    assert stats["chars_before"] - stats["chars_after"] == len(REWORDED) + 2
+    assert 0 < stats["removed_ratio"] < 1
+
+
+def test_short_paragraphs_are_always_kept():
+    deduplicated, stats = deduplicate_contributions({"A": "## Summary", "B": "## Summary"})
+    assert deduplicated == {"A": "## Summary", "B": "## Summary"}
+    assert stats["paragraphs_removed"] == 0
+
+
+def test_similar_roles_are_merged_into_the_first():
+    definitions = {
+        "Financial Analyst": "Analyzes costs, revenue and financial risk of the product.",
+        "Finance Analyst": "Analyzes costs, revenue and financial risk of the launch.",
+        "Materials Scientist": "Selects filament and glass materials.",
+    }
+    roles, merged_definitions, merged = merge_similar_roles(list(definitions), definitions)
+    assert roles == ["Financial Analyst", "Materials Scientist"]
+    assert merged == {"Finance Analyst": "Financial Analyst"}
+    assert "Also covers the 'Finance Analyst' perspective" in merged_definitions["Financial Analyst"]
+    assert merged_definitions["Materials Scientist"] == definitions["Materials Scientist"]
+
+
+def test_distinct_roles_are_kept():
+    roles = ["Risk Assessor", "Market Researcher"]
+    definitions = {"Risk Assessor": "Assesses risk.", "Market Researcher": "Researches the market."}
+    assert merge_similar_roles(roles, definitions) == (roles, definitions, {})
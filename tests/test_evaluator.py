@@ -0,0 +1,54 @@
+import pytest
+
+import mlace_dreamteam
+import mlace_main
+import mlace_main_agile
+
+
+class CannedInterface:
+    def __init__(self, response):
+        self.response = response
+        self.prompts = []
+
+    def query(self, prompt):
+        self.prompts.append(prompt)
+        return self.response
+
+
+@pytest.mark.parametrize("module", [mlace_main, mlace_main_agile])
+def test_parse_score_map_reads_each_name(module):
+    evaluation = "**ResearchAgent Confidence Score:** 8/10\n**DirectorAgent Confidence Score: 6.5/10**"
+    assert module.EvaluatorAgent.parse_score_map(evaluation, ["ResearchAgent", "DirectorAgent"]) == {
+        "ResearchAgent": 80.0, "DirectorAgent": 65.0,
+    }
+
+
+@pytest.mark.parametrize("module", [mlace_main, mlace_main_agile])
+def test_parse_score_map_does_not_match_longer_names(module):
+    evaluation = "**ResearchAgentFinance Confidence Score:** 3/10\n**Candidate 10 Confidence Score:** 2/10"
+    scores = module.EvaluatorAgent.parse_score_map(evaluation, ["ResearchAgent", "ResearchAgentFinance",
+                                                                 "Candidate 1", "Candidate 10"])
+    assert scores == {"ResearchAgent": 50, "ResearchAgentFinance": 30.0, "Candidate 1": 50, "Candidate 10": 20.0}
+
+
+@pytest.mark.parametrize("module", [mlace_main, mlace_main_agile])
+def test_parse_score_map_ignores_scores_on_other_lines(module):
+    evaluation = "**ResearchAgent**\nSolid work.\n**DirectorAgent Confidence Score:** 9/10"
+    assert module.EvaluatorAgent.parse_score_map(evaluation, ["ResearchAgent"]) == {"ResearchAgent": 50}
+
+
+def test_evaluate_candidates_grades_all_candidates_in_one_call():
+    evaluator = mlace_main.EvaluatorAgent("EvaluatorAgent", "evaluator", "")
+    evaluator.interface = CannedInterface("**Candidate 2 Confidence Score:** 9/10\n**Candidate 1 Confidence Score:** 4/10")
+    scores, _ = evaluator.evaluate_candidates("ResearchAgent", ["first", "second"], "bulb")
+    assert scores == [40.0, 90.0]
+    assert len(evaluator.interface.prompts) == 1
+    assert "### Candidate 1" in evaluator.interface.prompts[0]
+
+
+def test_dreamteam_evaluate_many_reads_the_json_block():
+    evaluator = mlace_dreamteam.EvaluatorAgent("EvaluatorAgent", "evaluator", "")
+    evaluator.interface = CannedInterface('<<<JSON>>>{"Risk Assessor": "7/10", "Market Researcher": "n/a"}<<<END>>>')
+    scores, _ = evaluator.evaluate_many({"Risk Assessor": "a", "Market Researcher": "b", "Financial Analyst": "c"},
+                                        "bulb")
+    assert scores == {"Risk Assessor": 70.0, "Market Researcher": 50, "Financial Analyst": 50.0}
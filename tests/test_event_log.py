@@ -0,0 +1,51 @@
+import pytest
+
+import event_log
+import mlace_main
+
+
+class CannedInterface:
+    def __init__(self, response):
+        self.response = response
+
+    def query(self, prompt):
+        return self.response
+
+
+@pytest.fixture
+def console():
+    def configure(level):
+        event_log.configure(path=None, console=level)
+    yield configure
+    event_log.shutdown()
+
+
+def batched_evaluation(text):
+    evaluator = mlace_main.EvaluatorAgent("EvaluatorAgent", "evaluator", "")
+    evaluator.interface = CannedInterface(text)
+    return evaluator.evaluate_many({"ResearchAgent": "a", "DirectorAgent": "b"}, "problem")
+
+
+def test_batched_evaluation_logs_a_preview(console, capsys):
+    console("INFO")
+    text = "**ResearchAgent Confidence Score:** 8/10\n" + "x" * 1000
+    scores, _ = batched_evaluation(text)
+    event_log.flush()
+    output = capsys.readouterr().out
+    assert scores["ResearchAgent"] == 80
+    assert "[EvaluatorAgent] Evaluation for 2 agents:" in output
+    assert text[:event_log.PREVIEW_CHARS] in output
+    assert text not in output
+
+
+def test_raw_evaluation_text_only_at_debug(console, capsys):
+    console("DEBUG")
+    text = "**ResearchAgent Confidence Score:** 8/10\n" + "x" * 1000
+    batched_evaluation(text)
+    event_log.flush()
+    assert text in capsys.readouterr().out
+
+
+def test_preview_cuts_long_text():
+    assert event_log.preview("y" * 1000) == "y" * event_log.PREVIEW_CHARS
+    assert event_log.preview(None) == ""
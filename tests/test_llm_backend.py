@@ -0,0 +1,62 @@
+import pytest
+
+from llm_backend import MeteringBackend, RecordingBackend, ReplayBackend, parse_latency
+
+
+class ScriptedBackend:
+    """Answers with the next of its responses, whatever the prompt."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def chat(self, model, messages):
+        return {"message": {"content": self.responses.pop(0)}}
+
+
+def ask(backend, prompt, model="llama3.2"):
+    return backend.chat(model, [{"role": "user", "content": prompt}])["message"]["content"]
+
+
+def record(path, *pairs, **options):
+    recorder = RecordingBackend(str(path), ScriptedBackend(*[response for _, response in pairs]))
+    for prompt, _ in pairs:
+        ask(recorder, prompt)
+    return ReplayBackend(str(path), latency="none", **options)
+
+
+def test_repeated_prompts_replay_in_recording_order(tmp_path):
+    replay = record(tmp_path / "trace.jsonl", ("refine", "first"), ("evaluate", "score"), ("refine", "second"))
+    assert [ask(replay, "refine") for _ in range(3)] == ["first", "second", "first"]
+    assert ask(replay, "evaluate") == "score"
+    assert replay.report() == {"exact": 4, "prefix": 0, "fallback": 0}
+
+
+def test_changed_prompts_fall_back_to_the_prefix_then_to_any_recording(tmp_path):
+    replay = record(tmp_path / "trace.jsonl", ("Refine the bulb problem. Attempt 1", "refined"), ("Grade it", "7/10"),
+                    prefix_chars=20)
+    assert ask(replay, "Refine the bulb problem. Attempt 2") == "refined"
+    assert [ask(replay, "Something new") for _ in range(3)] == ["refined", "7/10", "refined"]
+    assert ask(replay, "Grade it", model="other-model") == "7/10"
+    assert replay.stats == {"exact": 0, "prefix": 1, "fallback": 4}
+
+
+def test_strict_replay_rejects_unknown_prompts(tmp_path):
+    replay = record(tmp_path / "trace.jsonl", ("refine", "first"), strict=True)
+    with pytest.raises(KeyError, match="not in trace"):
+        ask(replay, "evaluate")
+
+
+def test_metering_estimates_missing_token_counts():
+    metering = MeteringBackend(ScriptedBackend("x" * 40))
+    ask(metering, "y" * 80)
+    (call,) = metering.reset()
+    assert (call["prompt_tokens"], call["completion_tokens"], call["tokens_estimated"]) == (20, 10, True)
+    assert metering.calls == []
+
+
+def test_parse_latency():
+    assert parse_latency("none") == "none"
+    assert parse_latency("fixed:0.5") == ("fixed", 0.5)
+    assert parse_latency("lognormal:2:0.4") == ("lognormal", 2.0, 0.4)
+    with pytest.raises(ValueError):
+        parse_latency("fixed")
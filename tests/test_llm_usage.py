@@ -0,0 +1,42 @@
+import concurrent.futures
+from types import SimpleNamespace
+
+import llm_usage
+
+RESPONSE = {"prompt_eval_count": 120, "eval_count": 30, "prompt_eval_duration": 500_000_000,
+            "eval_duration": 1_500_000_000, "load_duration": 0}
+
+
+def test_record_is_a_no_op_outside_a_run():
+    assert llm_usage.record("Agent", "llama3.2", RESPONSE, 1.0) is None
+
+
+def test_calls_are_attributed_to_the_run_and_stage():
+    log = llm_usage.UsageLog("run-1")
+    with llm_usage.track(log):
+        with llm_usage.stage("refine"):
+            event = llm_usage.record("PromptRefinerAgent", "llama3.2", RESPONSE, 2.25)
+        llm_usage.record("EvaluatorAgent", "llama3.2", None, 0.5, error="timeout")
+    assert (event["run_id"], event["stage"], event["prompt_tokens"], event["eval_s"]) == ("run-1", "refine", 120, 1.5)
+    summary = log.summary()
+    assert (summary["calls"], summary["prompt_tokens"], summary["completion_tokens"]) == (2, 120, 30)
+    assert summary["llm_wall_s"] == 2.75
+    assert summary["by_agent"]["EvaluatorAgent"]["errors"] == 1
+    assert set(summary["by_stage"]) == {"refine", "-"}
+
+
+def test_object_responses_are_read_by_attribute():
+    log = llm_usage.UsageLog()
+    with llm_usage.track(log):
+        event = llm_usage.record("Agent", "llama3.2", SimpleNamespace(**RESPONSE), 1.0)
+    assert (event["completion_tokens"], event["prompt_eval_s"]) == (30, 0.5)
+
+
+def test_propagate_keeps_pool_work_in_the_callers_run():
+    log = llm_usage.UsageLog()
+    with llm_usage.track(log), llm_usage.stage("team"), concurrent.futures.ThreadPoolExecutor(2) as pool:
+        wrapped = llm_usage.propagate(lambda name: llm_usage.record(name, "llama3.2", RESPONSE, 1.0))
+        list(pool.map(wrapped, ["A", "B"]))
+        pool.submit(llm_usage.record, "C", "llama3.2", RESPONSE, 1.0).result()
+    assert sorted(event["agent"] for event in log.events) == ["A", "B"]
+    assert {event["stage"] for event in log.events} == {"team"}
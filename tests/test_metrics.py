@@ -0,0 +1,43 @@
+import pytest
+
+import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Test latency", ["model"], buckets=(1, 0.5, 5),
+                                  registry=metrics.Registry())
+    for value in (0.2, 0.7, 0.9, 3, 42):
+        histogram.labels(model="llama").observe(value)
+    assert histogram.render() == (
+        "# HELP test_seconds Test latency\n"
+        "# TYPE test_seconds histogram\n"
+        'test_seconds_bucket{model="llama",le="0.5"} 1\n'
+        'test_seconds_bucket{model="llama",le="1"} 3\n'
+        'test_seconds_bucket{model="llama",le="5"} 4\n'
+        'test_seconds_bucket{model="llama",le="+Inf"} 5\n'
+        'test_seconds_sum{model="llama"} 46.8\n'
+        'test_seconds_count{model="llama"} 5\n'
+    )
+
+
+def test_unlabelled_histogram_has_only_the_le_label():
+    histogram = metrics.Histogram("test_rounds", "Rounds", buckets=(1, 2), registry=metrics.Registry())
+    histogram.observe(2)
+    assert 'test_rounds_bucket{le="2"} 1\n' in histogram.render()
+    assert "test_rounds_sum 2\n" in histogram.render()
+
+
+def test_label_values_are_escaped_and_children_sorted():
+    registry = metrics.Registry()
+    counter = metrics.Counter("test_total", "Calls", ["agent"], registry=registry)
+    counter.labels(agent='b"\n').inc(2)
+    counter.labels(agent="a").inc()
+    lines = registry.render().splitlines()
+    assert lines[2:] == ['test_total{agent="a"} 1', 'test_total{agent="b\\"\\n"} 2']
+
+
+def test_names_register_once():
+    registry = metrics.Registry()
+    metrics.Gauge("test_gauge", "Gauge", registry=registry)
+    with pytest.raises(ValueError, match="already registered"):
+        metrics.Counter("test_gauge", "Again", registry=registry)
@@ -0,0 +1,45 @@
+import concurrent.futures
+
+import pytest
+
+from mock_ollama import MockOllama
+
+MESSAGES = [{"role": "user", "content": "Refine the bulb problem statement"}]
+
+
+def test_generate_reports_ollama_token_counts():
+    server = MockOllama(time_scale=0.0, completion_tokens=20)
+    assert server.admit()
+    response = server.generate("llama3.2", MESSAGES)
+    assert response["message"]["content"].startswith("Mock answer to: Refine the bulb problem statement")
+    assert response["prompt_eval_count"] == len(MESSAGES[0]["content"]) // 4
+    assert response["eval_count"] == len(response["message"]["content"]) // 4
+    assert server.report()["completed"] == 1
+
+
+def test_full_queue_rejects_requests():
+    server = MockOllama(max_queue=2)
+    assert [server.admit() for _ in range(3)] == [True, True, False]
+    assert server.report()["rejected"] == 1
+
+
+def test_at_most_parallel_requests_generate_at_once():
+    server = MockOllama(parallel=2, time_scale=0.2, completion_tokens=10)
+
+    def request():
+        assert server.admit()
+        return server.generate("llama3.2", MESSAGES)
+
+    with concurrent.futures.ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda _: request(), range(6)))
+    stats = server.report()
+    assert (stats["completed"], stats["max_busy"], stats["busy"], stats["queued"]) == (6, 2, 0, 0)
+
+
+def test_failed_generations_free_their_slot():
+    server = MockOllama(parallel=1, error_rate=1.0, time_scale=0.0)
+    for _ in range(2):
+        assert server.admit()
+        with pytest.raises(RuntimeError):
+            server.generate("llama3.2", MESSAGES)
+    assert server.report()["busy"] == 0
@@ -0,0 +1,47 @@
+import os
+import threading
+
+import mlace_dreamteam
+from mlace_dreamteam import PIPELINE_STAGES
+
+AGENTS_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents_config.json")
+
+
+def make_system(failing_problem=None):
+    system = mlace_dreamteam.MultiAgentSystem(AGENTS_CONFIG, checkpoint_dir=None, trace_dir=None)
+    system.clear_console_on_run = False
+    system.visits = []
+    lock = threading.Lock()
+
+    def run_stage(stage, job):
+        with lock:
+            system.visits.append((job["problem"], stage))
+        if stage == "team" and job["problem"] == failing_problem:
+            raise ValueError("no experts")
+        job.setdefault("path", []).append(stage)
+
+    system.run_stage = run_stage
+    return system
+
+
+def test_every_problem_passes_every_stage_in_order():
+    completed = []
+    system = make_system()
+    problems = ["bulb", ("battery", "Energy"), ("kettle", "Appliances", 60)]
+    results = system.run_pipeline(problems, stage_workers={"team": 3},
+                                  on_complete=lambda index, job: completed.append(index))
+    assert [job["problem"] for job in results] == ["bulb", "battery", "kettle"]
+    assert [job["domain"] for job in results] == ["General", "Energy", "Appliances"]
+    assert all(job["path"] == PIPELINE_STAGES for job in results)
+    assert sorted(completed) == [0, 1, 2]
+    assert results[0]["deadline_report"] is None and results[2]["deadline_report"]["budget_s"] == 60
+    assert len({id(job["pre_evaluator"]) for job in results}) == 3
+
+
+def test_a_failed_problem_skips_its_remaining_stages_only():
+    system = make_system(failing_problem="bulb")
+    failed, other = system.run_pipeline(["bulb", "battery"])
+    assert failed["error"] == "team: ValueError: no experts"
+    assert [stage for problem, stage in system.visits if problem == "bulb"] == ["refine", "team"]
+    assert set(failed["stage_times"]) == {"refine", "team"}
+    assert "error" not in other and other["path"] == PIPELINE_STAGES
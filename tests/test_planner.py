@@ -0,0 +1,52 @@
+import pytest
+
+import planner
+
+
+def make_plan():
+    """Stage "a" then "b"; "c" also only waits for "a", so it runs next to "b"."""
+    plan = planner.Plan("test", "", planner.CostModel())
+    plan.stage("a").add("A", 2, worst=3).add("B", 4, parallel=2)
+    plan.stage("b").add("C", 1)
+    plan.stage("c", depends_on=["a"]).add("D", 2)
+    return plan
+
+
+def test_stage_totals_use_round_trips_for_parallel_calls():
+    seconds = planner.DEFAULT_CALL["seconds"]
+    tokens = planner.DEFAULT_CALL["prompt_tokens"] + planner.DEFAULT_CALL["completion_tokens"]
+    totals = make_plan().stage_totals(make_plan().stages[0])
+    assert totals["calls"] == 6
+    assert totals["worst_calls"] == 7
+    assert totals["tokens"] == pytest.approx(6 * tokens)
+    assert totals["seconds"] == pytest.approx((2 + 2) * seconds)
+    assert totals["worst_seconds"] == pytest.approx((3 + 2) * seconds)
+
+
+def test_total_seconds_follow_the_longest_dependency_chain():
+    seconds = planner.DEFAULT_CALL["seconds"]
+    total = make_plan().as_dict()["total"]
+    assert total["calls"] == 9
+    assert total["llm_seconds"] == pytest.approx(7 * seconds)
+    assert total["seconds"] == pytest.approx(6 * seconds)  # a, then c (longer than b)
+
+
+def test_expected_calls_never_exceed_the_worst_case():
+    plan = planner.Plan("test", "", planner.CostModel()).stage("a").add("A", 5, worst=3)
+    assert plan.stages[0]["steps"][0]["calls"] == 3
+
+
+def test_rounds():
+    assert planner.Plan.rounds(3, 1) == 3
+    assert planner.Plan.rounds(3, 2) == 2
+    assert planner.Plan.rounds(1.5, 3) == pytest.approx(0.5)
+
+
+def test_recommend_picks_the_first_plan_that_fits():
+    slow = {"total": {"seconds": 400, "worst_seconds": 500, "calls": 30}}
+    fast = {"total": {"seconds": 200, "worst_seconds": 260, "calls": 15}}
+    candidates = [({"peer_review": True}, slow), ({"peer_review": False}, fast)]
+    assert planner.recommend(candidates, 300) == {"peer_review": False, "seconds": 200, "worst_seconds": 260,
+                                                  "calls": 15, "fits": True}
+    assert planner.recommend(candidates, 100)["fits"] is False
+    assert planner.recommend(candidates, 100)["peer_review"] is False
@@ -0,0 +1,52 @@
+from pre_evaluator import BORDERLINE, FAIL, PASS, HeuristicPreEvaluator
+
+OBJECTIVE = "Design a durable incandescent bulb filament with tungsten alloys and thermal testing"
+ON_TOPIC = "The durable incandescent bulb uses a tungsten alloy filament, validated through thermal testing. "
+
+
+def make_screen(**options):
+    return HeuristicPreEvaluator(min_length=50, pass_length=400, **options)
+
+
+def test_empty_and_error_outputs_fail():
+    screen = make_screen()
+    assert screen.screen("", OBJECTIVE)[:2] == (FAIL, 0)
+    verdict, _, reasons = screen.screen("ERROR: connection refused", OBJECTIVE)
+    assert verdict == FAIL and "LLM backend returned ERROR" in reasons
+    verdict, _, reasons = screen.screen(ON_TOPIC + "Traceback (most recent call last)", OBJECTIVE)
+    assert verdict == FAIL and any("error marker" in reason for reason in reasons)
+
+
+def test_short_and_off_topic_outputs_fail():
+    screen = make_screen()
+    assert screen.screen("Bulb ok.", OBJECTIVE)[0] == FAIL
+    verdict, _, reasons = screen.screen("Quarterly revenue forecasts for a retail chain. " * 3, OBJECTIVE)
+    assert verdict == FAIL and any(reason.startswith("off-topic") for reason in reasons)
+
+
+def test_long_on_topic_output_passes_with_the_pass_score():
+    assert make_screen(pass_score=90).screen(ON_TOPIC * 5, OBJECTIVE)[:2] == (PASS, 90)
+
+
+def test_missing_sections_and_middling_outputs_go_to_the_llm():
+    verdict, score, reasons = make_screen(required_sections=["Risks"]).screen(ON_TOPIC * 5, OBJECTIVE)
+    assert (verdict, score) == (BORDERLINE, None)
+    assert "missing sections ['Risks']" in reasons
+    assert make_screen().screen(ON_TOPIC, OBJECTIVE)[:2] == (BORDERLINE, None)
+
+
+def test_disabled_screen_sends_everything_to_the_llm():
+    screen = make_screen(enabled=False)
+    assert screen.screen("", OBJECTIVE)[0] == BORDERLINE
+    assert screen.stats["screened"] == 0
+
+
+def test_skip_rate_counts_local_decisions():
+    screen = make_screen()
+    for response in ("", ON_TOPIC * 5, ON_TOPIC, ON_TOPIC):
+        screen.screen(response, OBJECTIVE)
+    assert screen.stats == {"screened": 4, PASS: 1, FAIL: 1, BORDERLINE: 2}
+    assert screen.skip_rate() == 0.5
+    assert screen.report()["skip_rate"] == 0.5
+    screen.reset_stats()
+    assert screen.skip_rate() == 0.0
@@ -0,0 +1,59 @@
+import threading
+
+import mlace_dreamteam
+import mlace_main
+import mlace_main_agile
+import settings
+
+
+class ScriptedInterface:
+    """Answers each refinement prompt by the focus it asks for."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def query(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        return next((answer for focus, answer in self.answers.items() if focus in prompt), "ERROR")
+
+
+def text_answers(foci):
+    return {
+        foci[0]: "Refined Problem Statement: Short bulb.\nConfidence Score: 80%",
+        foci[1]: "Refined Problem Statement: A bulb with a tungsten filament.\nConfidence Score: 80%",
+        foci[2]: "Refined Problem Statement: Best bulb.\nConfidence Score: 40%",
+    }
+
+
+def test_best_of_n_keeps_the_highest_confidence_and_breaks_ties_by_detail(monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"refinement_candidates": 4})
+    refiner = mlace_main.PromptRefinerAgent("PromptRefinerAgent", "refiner", "")
+    refiner.interface = ScriptedInterface(text_answers(mlace_main.REFINEMENT_FOCI))
+    refined, confidence = refiner.refine_problem_statement_best_of_n("bulb")
+    assert (refined, confidence) == ("Refined Problem Statement: A bulb with a tungsten filament.", 80)
+    assert [sum(focus in prompt for prompt in refiner.interface.prompts) for focus in mlace_main.REFINEMENT_FOCI] == [1, 1, 1, 1]
+
+
+def test_agile_best_of_n_uses_the_product_owner_prompts():
+    owner = mlace_main_agile.ProductOwnerAgent("ProductOwnerAgent", "owner", "")
+    owner.interface = ScriptedInterface({mlace_main_agile.REFINEMENT_FOCI[1]: "Upload files in chunks.\nConfidence Score: 90%"})
+    assert owner.refine_backlog_item_best_of_n("upload files", n_candidates=3) == ("Upload files in chunks.", 90)
+    assert all("Product Owner" in prompt for prompt in owner.interface.prompts)
+
+
+def test_dream_team_best_of_n_reads_json_candidates():
+    refiner = mlace_dreamteam.PromptRefinerAgent("PromptRefinerAgent", "refiner", "")
+    refiner.interface = ScriptedInterface({
+        mlace_dreamteam.REFINEMENT_FOCI[0]: '<<<JSON>>>{"Refined Objective": "Durable bulb", "Confidence Score": "70%"}<<<END>>>',
+        mlace_dreamteam.REFINEMENT_FOCI[1]: '<<<JSON>>>{"Refined Objective": "Testable bulb", "Confidence Score": "88%"}<<<END>>>',
+    })
+    assert refiner.refine_problem_statement_best_of_n("bulb", n_candidates=3) == ("Testable bulb", 88)
+
+
+def test_best_of_n_without_usable_candidates_keeps_the_original():
+    refiner = mlace_main.PromptRefinerAgent("PromptRefinerAgent", "refiner", "")
+    refiner.interface = ScriptedInterface({})
+    assert refiner.refine_problem_statement_best_of_n("bulb", n_candidates=2) == ("bulb", 50)
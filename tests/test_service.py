@@ -0,0 +1,59 @@
+import sys
+import threading
+
+import pytest
+
+import mlace_service
+from mlace_service import DONE, MLACEService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    release = threading.Event()
+    solved = []
+
+    def fake_solve(record):
+        release.wait(5)
+        solved.append(record["problem"])
+        return {"status": "ok", "result": f"solved {record['problem']}", "latency_s": 0.0}
+
+    monkeypatch.setattr(mlace_service, "solve", fake_solve)
+    stdout = sys.stdout
+    service = MLACEService(workers=1)
+    service.release, service.solved = release, solved
+    yield service
+    release.set()
+    service.close(timeout=5)
+    assert sys.stdout is stdout
+
+
+def wait_until_done(job):
+    with job.changed:
+        assert job.changed.wait_for(lambda: job.status == DONE, timeout=5)
+
+
+def test_identical_problems_share_one_execution(service):
+    job, coalesced = service.submit("Design a  durable bulb", "Engineering")
+    again, again_coalesced = service.submit("design a durable BULB ", "Engineering")
+    assert (coalesced, again_coalesced) == (False, True)
+    assert again is job and job.subscribers == 2
+    service.release.set()
+    wait_until_done(job)
+    assert service.solved == ["Design a  durable bulb"]
+    assert job.to_dict()["result"] == "solved Design a  durable bulb"
+    assert [event["message"].split(" ")[0] for event in job.events] == ["Queued", "Started", "Finished"]
+
+
+def test_other_domains_systems_and_finished_jobs_are_not_coalesced(service):
+    job, _ = service.submit("bulb", "Engineering")
+    assert service.submit("bulb", "Finance")[0] is not job
+    assert service.submit("bulb", "Engineering", system="main")[0] is not job
+    service.release.set()
+    wait_until_done(job)
+    rerun, coalesced = service.submit("bulb", "Engineering")
+    assert rerun is not job and not coalesced
+
+
+def test_unknown_systems_are_rejected(service):
+    with pytest.raises(ValueError, match="Unknown system"):
+        service.submit("bulb", system="nonexistent")
@@ -0,0 +1,69 @@
+import os
+import threading
+
+import mlace_dreamteam
+import settings
+
+AGENTS_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents_config.json")
+
+
+def test_explicit_arguments_win_over_the_config(monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"critique_mode": "tournament", "trace_dir": "traces"})
+    assert settings.value("critique_mode", "sequential") == "sequential"
+    assert settings.value("trace_dir", None) is None  # None is an explicit choice, not "unset"
+
+
+def test_config_then_defaults(monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"critique_mode": "tournament"})
+    assert settings.value("critique_mode") == "tournament"
+    assert settings.value("confidence_threshold") == settings.DEFAULTS["confidence_threshold"]
+    assert settings.value("no_such_key") is None
+
+
+def test_refinement_candidates_fall_back_to_max_attempts(monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"max_refinement_attempts": 6})
+    assert settings.value("refinement_candidates") == 6
+    monkeypatch.setattr(settings, "_settings", {"max_refinement_attempts": 6, "refinement_candidates": 2})
+    assert settings.value("refinement_candidates") == 2
+
+
+def test_config_is_read_on_first_use(monkeypatch, tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text('{"critique_candidates": 5}')
+    monkeypatch.setenv("MLACE_CONFIG", str(path))
+    monkeypatch.setattr(settings, "_settings", None)
+    assert settings.value("critique_candidates") == 5
+
+
+def test_dream_team_modes_come_from_the_config(monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"refinement_mode": "best_of_n", "critique_mode": "tournament",
+                                                "synthesis_mode": "tree", "synthesis_fan_in": 3,
+                                                "checkpoint_dir": None, "trace_dir": None})
+    system = mlace_dreamteam.MultiAgentSystem(AGENTS_CONFIG)
+    assert (system.refinement_mode, system.critique_mode, system.synthesis_mode) == ("best_of_n", "tournament", "tree")
+    assert (system.synthesis_fan_in, system.synthesis_max_depth) == (3, None)
+    assert (system.checkpoint_dir, system.trace_dir) == (None, None)
+    assert mlace_dreamteam.MultiAgentSystem(AGENTS_CONFIG, synthesis_mode="single", checkpoint_dir=None).synthesis_mode == "single"
+
+
+class CountingInterface:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def query(self, prompt):
+        with self.lock:
+            self.calls += 1
+        return self.response
+
+
+def test_dream_team_refinement_budget_comes_from_the_config(monkeypatch):
+    monkeypatch.setattr(settings, "_settings", {"max_refinement_attempts": 2, "refinement_candidates": 3,
+                                                "confidence_threshold": 95})
+    refiner = mlace_dreamteam.PromptRefinerAgent("PromptRefinerAgent", "refiner", "")
+    refiner.interface = CountingInterface('<<<JSON>>>{"Refined Objective": "bulb", "Confidence Score": "90%"}<<<END>>>')
+    assert refiner.refine_problem_statement("bulb") == ("bulb", 90)
+    assert refiner.interface.calls == 2  # 90% is below the configured threshold, so every attempt runs
+    refiner.refine_problem_statement_best_of_n("bulb")
+    assert refiner.interface.calls == 5
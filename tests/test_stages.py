@@ -0,0 +1,52 @@
+import deadline
+import stages
+import tracing
+from checkpoints import CheckpointStore
+
+
+def counting(output):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return output
+    return compute, calls
+
+
+def test_unchanged_inputs_are_replayed_after_a_restart(tmp_path):
+    compute, calls = counting({"refined_problem": "better"})
+    assert stages.cached(CheckpointStore("s", str(tmp_path)), "refine", ["problem"], compute) == {"refined_problem": "better"}
+    assert stages.cached(CheckpointStore("s", str(tmp_path)), "refine", ["problem"], compute) == {"refined_problem": "better"}
+    assert len(calls) == 1
+    stages.cached(CheckpointStore("s", str(tmp_path)), "refine", ["other problem"], compute)
+    assert len(calls) == 2
+
+
+def test_stage_cut_short_by_the_deadline_is_not_saved(tmp_path):
+    def compute():
+        deadline.allows("team.peer_review")  # no time left: skipped inside this stage
+        return "partial"
+
+    with deadline.activate(deadline.Deadline(0, call_seconds=1.0)):
+        stages.cached(CheckpointStore("s", str(tmp_path)), "team", [], compute)
+    assert CheckpointStore("s", str(tmp_path)).report()["replayed"] == 0
+    assert not (tmp_path / "s" / "team.json").exists()
+
+
+def test_skips_in_other_stages_do_not_block_saving(tmp_path):
+    budget = deadline.Deadline(60)
+
+    def compute():
+        budget.degraded.append({"step": "team.peer_review", "stage": "team"})  # a stage running alongside
+        return "complete"
+
+    with deadline.activate(budget):
+        stages.cached(CheckpointStore("s", str(tmp_path)), "evaluate", [], compute)
+    assert (tmp_path / "s" / "evaluate.json").exists()
+
+
+def test_each_stage_gets_a_span():
+    tracer = tracing.Tracer("run")
+    with tracing.activate(tracer.root):
+        stages.cached(CheckpointStore("s", None), "refine", [], lambda: "out")
+    assert [span.name for span in tracer.spans] == ["run", "refine"]
@@ -0,0 +1,65 @@
+import re
+import threading
+
+import pytest
+
+from mlace_dreamteam import SynthesizerAgent
+
+
+class MergingInterface:
+    """Answers a merge prompt with the labels it was given and remembers every prompt."""
+    def __init__(self):
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def query(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        return "merged " + " ".join(re.findall(r"^--- (.+?) ---$", prompt, re.MULTILINE))
+
+
+def team_output(sizes):
+    return "".join(f"\n--- Role: Expert {i} ---\n{'word ' * (size // 5)}\n" for i, size in enumerate(sizes, 1))
+
+
+def make_synthesizer():
+    synthesizer = SynthesizerAgent()
+    synthesizer.interface = MergingInterface()
+    return synthesizer
+
+
+def test_merge_levels():
+    assert SynthesizerAgent.merge_levels(2, 2) == []
+    assert SynthesizerAgent.merge_levels(8, 2) == [(4, 4), (2, 2)]
+    assert SynthesizerAgent.merge_levels(5, 2) == [(2, 3), (1, 2)]  # the odd one out is carried, not merged
+    assert SynthesizerAgent.merge_levels(9, 3) == [(3, 3)]
+
+
+def test_oversized_pieces_are_split_without_losing_text():
+    text = "\n\n".join(f"Recommendation {i}: " + "detail " * 30 for i in range(20))
+    parts = SynthesizerAgent.split_oversized([("Risk Assessor", text)], 500)
+    assert len(parts) > 1
+    assert all(len(part) <= 500 for _, part in parts)
+    assert parts[0][0] == f"Risk Assessor (part 1/{len(parts)})"
+    assert " ".join(part for _, part in parts).split() == text.split()
+
+
+def test_tree_keeps_every_prompt_bounded():
+    synthesizer = make_synthesizer()
+    synthesizer.synthesize_tree("objective", team_output([300, 2500, 300, 300]), fan_in=2, max_input_chars=1000)
+    prompts = synthesizer.interface.prompts
+    assert all(len(prompt) < 2 * 1000 + 1000 for prompt in prompts)
+    assert "Expert 2 (part 3/3)" in "".join(prompts)  # the long contribution became three leaves
+
+
+def test_shallow_max_depth_is_rejected_before_any_merge_call():
+    synthesizer = make_synthesizer()
+    with pytest.raises(ValueError, match="too shallow"):
+        synthesizer.synthesize_tree("objective", team_output([100] * 8), fan_in=2, max_depth=1)
+    assert synthesizer.interface.prompts == []
+
+
+def test_sufficient_max_depth_runs_every_level():
+    synthesizer = make_synthesizer()
+    synthesizer.synthesize_tree("objective", team_output([100] * 8), fan_in=2, max_depth=2)
+    assert len(synthesizer.interface.prompts) == 4 + 2 + 1  # two merge levels, then the final synthesis
@@ -0,0 +1,47 @@
+import pytest
+
+import tracing
+
+
+def make_trace():
+    """
+    run   [0, 10]
+      A   [0, 3.5]  with an LLM call [1, 3]
+      B   [3, 8.5]  with an LLM call [5, 8]
+    """
+    tracer = tracing.Tracer("test")
+    tracer.root.start = 0.0
+    a = tracer.start("A", "stage", tracer.root, {}, start=0.0)
+    tracer.start("llm A", "llm", a, {}, start=1.0).finish(3.0)
+    a.finish(3.5)
+    b = tracer.start("B", "stage", tracer.root, {}, start=3.0)
+    tracer.start("llm B", "llm", b, {}, start=5.0).finish(8.0)
+    b.finish(8.5)
+    tracer.root.finish(10.0)
+    return tracer
+
+
+def test_critical_path_follows_the_last_finishing_child():
+    path = [(depth, span.name, on_path, own) for depth, span, on_path, own in tracing.critical_path(make_trace())]
+    assert path == [
+        (0, "run", pytest.approx(10.0), pytest.approx(4.5)),
+        (1, "B", pytest.approx(5.5), pytest.approx(2.5)),
+        (2, "llm B", pytest.approx(3.0), pytest.approx(3.0)),
+    ]
+
+
+def test_idle_gaps_name_the_deepest_active_span():
+    gaps = tracing.idle_gaps(make_trace())
+    assert [(start, length, where) for start, length, where in gaps] == [
+        (pytest.approx(0.0), pytest.approx(1.0), "A"),
+        (pytest.approx(3.0), pytest.approx(2.0), "B"),
+        (pytest.approx(8.0), pytest.approx(2.0), "run"),
+    ]
+
+
+def test_idle_gaps_ignore_short_gaps():
+    assert [where for _, _, where in tracing.idle_gaps(make_trace(), min_gap=1.5)] == ["B", "run"]
+
+
+def test_merge_intervals():
+    assert tracing.merge_intervals([(5, 6), (0, 2), (1, 3), (3, 4)]) == [[0, 4], [5, 6]]
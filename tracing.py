@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Hierarchical spans for one run: run → stage → agent / sub-stage → LLM call.
+
+A run owns a Tracer whose root span is the run itself. Code opens child spans with
+`with tracing.span("evaluate.iteration.1"):`; stages.cached opens one per
+checkpointed stage and OllamaInterface.query adds one per LLM call. The active span lives
+in a contextvar, so work handed to a thread pool through llm_usage.propagate() stays
+attached to its parent, and overlapping spans show up on different threads.
+
+Traces are exported in the Chrome trace event format (chrome://tracing, Perfetto, speedscope).
+Analyze a saved trace with:
+    python tracing.py traces/session_123.trace.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import itertools
+import contextlib
+import contextvars
+from colorama import Fore, Style
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Span:
+    def __init__(self, tracer, span_id, name, kind, parent_id, attrs, start=None):
+        self.tracer = tracer
+        self.span_id = span_id
+        self.name = name
+        self.kind = kind
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.thread = threading.current_thread().name
+
+    def finish(self, end=None):
+        if self.end is None:
+            self.end = time.time() if end is None else end
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.time()) - self.start
+
+
+class Tracer:
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.spans = []
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.root = self.start("run", "run", None, {"run_id": run_id})
+
+    def start(self, name, kind, parent, attrs, start=None):
+        with self.lock:
+            span = Span(self, next(self.ids), name, kind, parent.span_id if parent else None, attrs, start)
+            self.spans.append(span)
+        return span
+
+    def finish(self):
+        """Ends the run span; spans left open (e.g. by an exception) end with it."""
+        self.root.finish()
+        for span in self.spans:
+            span.finish(self.root.end)
+
+    def to_chrome(self):
+        threads = {}
+        events = []
+        t0 = self.root.start
+        for span in self.spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            end = span.end if span.end is not None else time.time()
+            events.append({
+                "name": span.name, "cat": span.kind, "ph": "X", "pid": 1, "tid": tid,
+                "ts": round((span.start - t0) * 1e6, 1), "dur": round((end - span.start) * 1e6, 1),
+                "args": dict(span.attrs, span_id=span.span_id, parent_id=span.parent_id),
+            })
+        for thread, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread}})
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"run_id": self.run_id, "started_at": t0}}
+
+    def export(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.trace.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f, default=str)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Rebuilds a Tracer from a trace file written by export()."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        tracer = cls.__new__(cls)
+        tracer.run_id = data.get("otherData", {}).get("run_id", os.path.basename(path))
+        tracer.lock = threading.Lock()
+        tracer.spans = []
+        names = {e["tid"]: e["args"]["name"] for e in data["traceEvents"] if e.get("ph") == "M"}
+        t0 = data.get("otherData", {}).get("started_at", 0.0)
+        for event in data["traceEvents"]:
+            if event.get("ph") != "X":
+                continue
+            args = dict(event.get("args", {}))
+            span = Span(tracer, args.pop("span_id"), event["name"], event.get("cat", ""), args.pop("parent_id"),
+                        args, start=t0 + event["ts"] / 1e6)
+            span.end = span.start + event["dur"] / 1e6
+            span.thread = names.get(event["tid"], str(event["tid"]))
+            tracer.spans.append(span)
+        tracer.ids = itertools.count(max((s.span_id for s in tracer.spans), default=0) + 1)
+        tracer.root = next(s for s in tracer.spans if s.parent_id is None)
+        return tracer
+
+
+@contextlib.contextmanager
+def activate(span):
+    """Makes span (typically a tracer's root) the parent of spans opened in this block."""
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(name, kind="stage", **attrs):
+    """Child span of the active span; a no-op outside a traced run."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.tracer.start(name, kind, parent, attrs)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def annotate(**attrs):
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def add_span(name, started, finished=None, kind="llm", **attrs):
+    """Records an already finished span (e.g. an LLM call) under the active span."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    child = parent.tracer.start(name, kind, parent, attrs, start=started)
+    child.finish(finished)
+    return child
+
+
+# --- Analysis ---
+
+def children_by_parent(tracer):
+    children = {}
+    for s in tracer.spans:
+        children.setdefault(s.parent_id, []).append(s)
+    return children
+
+
+def critical_path(tracer):
+    """
+    Walks back from the end of the run: within each span the child that finished last is on
+    the critical path, then the child that finished last before that one started, and so on.
+    Returns [(depth, span, seconds on the path, seconds spent in the span itself)] in time order.
+    """
+    children = children_by_parent(tracer)
+    path = []
+
+    def walk(span, depth, bound):
+        end = min(span.end, bound)
+        cursor, on_path = end, []
+        candidates = sorted(children.get(span.span_id, []), key=lambda s: s.end, reverse=True)
+        while True:
+            step = next((c for c in candidates if c.end <= cursor + 1e-6 and c.start >= span.start - 1e-6
+                         and c.start < cursor), None)
+            if step is None:
+                break
+            on_path.append((step, cursor))
+            cursor = step.start
+        entry = [depth, span, end - span.start, 0.0]
+        path.append(entry)
+        covered = 0.0
+        for step, step_bound in reversed(on_path):
+            covered += min(step.end, step_bound) - step.start
+            walk(step, depth + 1, step_bound)
+        entry[3] = max(0.0, (end - span.start) - covered)
+
+    walk(tracer.root, 0, tracer.root.end)
+    return [tuple(entry) for entry in path]
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def idle_gaps(tracer, min_gap=0.05):
+    """Stretches of the run with no LLM call in flight, with the deepest span active at the time."""
+    llm = merge_intervals([(s.start, s.end) for s in tracer.spans if s.kind == "llm"])
+    root = tracer.root
+    gaps, cursor = [], root.start
+    for start, end in llm + [[root.end, root.end]]:
+        if start - cursor >= min_gap:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    depth = {}
+    by_id = {s.span_id: s for s in tracer.spans}
+    for s in tracer.spans:
+        d, parent = 0, s.parent_id
+        while parent is not None:
+            d, parent = d + 1, by_id[parent].parent_id if parent in by_id else None
+        depth[s.span_id] = d
+    result = []
+    for start, end in gaps:
+        middle = (start + end) / 2
+        active = [s for s in tracer.spans if s.kind != "llm" and s.start <= middle <= s.end]
+        where = max(active, key=lambda s: depth[s.span_id]).name if active else "run"
+        result.append((start - root.start, end - start, where))
+    return result
+
+
+def concurrency(tracer):
+    """Per top-level stage: wall time, summed LLM time and their ratio (>1 means calls overlapped)."""
+    children = children_by_parent(tracer)
+    llm_spans = [s for s in tracer.spans if s.kind == "llm"]
+    stages = []
+    for stage in sorted(children.get(tracer.root.span_id, []), key=lambda s: s.start):
+        inside = [s for s in llm_spans if s.start >= stage.start - 1e-6 and s.end <= stage.end + 1e-6]
+        busy = sum(s.duration for s in inside)
+        events = sorted([(s.start, 1) for s in inside] + [(s.end, -1) for s in inside])
+        peak = current = 0
+        for _, delta in events:
+            current += delta
+            peak = max(peak, current)
+        stages.append({"stage": stage.name, "wall_s": stage.duration, "llm_s": busy, "calls": len(inside),
+                       "parallelism": busy / stage.duration if stage.duration else 0.0, "max_in_flight": peak})
+    return stages
+
+
+def analyze(tracer, min_share=0.01, min_gap=0.05):
+    """Prints the critical path, idle gaps and per-stage overlap; returns them as a dict."""
+    total = tracer.root.duration or 1e-9
+    path = critical_path(tracer)
+    print(f"{Fore.CYAN}[Trace] Critical path of run {tracer.run_id} ({total:.2f}s, {len(tracer.spans)} spans){Style.RESET_ALL}")
+    # Consecutive LLM calls of one agent at the same level are printed as one line
+    rows = []
+    for depth, s, seconds, own in path:
+        if rows and s.kind == "llm" and rows[-1][1].kind == "llm" and rows[-1][1].name == s.name and rows[-1][0] == depth:
+            rows[-1][2] += seconds
+            rows[-1][4] += 1
+        else:
+            rows.append([depth, s, seconds, own, 1])
+    for depth, s, seconds, own, count in rows:
+        if seconds / total < min_share:
+            continue
+        colour = Fore.MAGENTA if s.kind == "llm" else Fore.YELLOW if seconds / total >= 0.25 else ""
+        name = f"{s.name} ×{count}" if count > 1 else s.name
+        own_note = f"  (own {own:.2f}s)" if s.kind != "llm" and own / total >= min_share else ""
+        print(f"{colour}{'  ' * depth}{name[:60]:<{62 - 2 * depth}} {seconds:8.2f}s {seconds / total:6.1%}{own_note}"
+              f"{Style.RESET_ALL if colour else ''}")
+
+    gaps = idle_gaps(tracer, min_gap)
+    idle = sum(duration for _, duration, _ in gaps)
+    print(f"{Fore.CYAN}[Trace] {len(gaps)} idle gaps ≥ {min_gap:g}s without an LLM call in flight, {idle:.2f}s in total{Style.RESET_ALL}")
+    for offset, duration, where in sorted(gaps, key=lambda g: g[1], reverse=True)[:10]:
+        print(f"  +{offset:7.2f}s  {duration:6.2f}s idle in {where}")
+
+    stages = concurrency(tracer)
+    for stage in stages:
+        print(f"  {stage['stage'][:40]:<40} {stage['wall_s']:7.2f}s wall {stage['calls']:4d} calls "
+              f"{stage['llm_s']:7.2f}s LLM  parallelism {stage['parallelism']:.2f} (max {stage['max_in_flight']} in flight)")
+    return {
+        "run_s": total,
+        "critical_path": [{"depth": d, "name": s.name, "kind": s.kind, "seconds": round(seconds, 4), "own_s": round(own, 4)}
+                          for d, s, seconds, own in path],
+        "idle_gaps": [{"offset_s": round(o, 4), "seconds": round(d, 4), "where": w} for o, d, w in gaps],
+        "stages": stages,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Critical path and idle gaps of an exported MLACE trace.")
+    parser.add_argument("trace", help="*.trace.json written by a run")
+    parser.add_argument("--min-share", type=float, default=0.01, help="hide critical-path spans below this share of the run")
+    parser.add_argument("--min-gap", type=float, default=0.05, help="smallest idle gap reported, in seconds")
+    args = parser.parse_args(argv)
+    analyze(Tracer.load(args.trace), args.min_share, args.min_gap)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())